@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -21,6 +22,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'demoucron.middleware.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -69,14 +71,102 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Résultats de l'algorithme de Demoucron (LRU borné en nombre d'entrées).
+    # Pour partager le cache entre plusieurs workers, utiliser
+    # 'django.core.cache.backends.filebased.FileBasedCache' avec un LOCATION sur disque.
+    'demoucron': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'demoucron-results',
+        'TIMEOUT': 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 256,
+        },
+    },
+    # Compteurs de succès et d'échecs du cache 'demoucron' (cache/stats/) : quelques entrées sans expiration,
+    # séparées des résultats pour ne jamais être évincées par eux. À partager entre workers comme 'demoucron'
+    'demoucron-stats': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'demoucron-stats',
+        'TIMEOUT': None,
+    },
+    # État et résultats des tâches asynchrones (jobs/<id>/). Avec plusieurs workers, ce cache doit être partagé
+    # (FileBasedCache, Redis...) pour qu'une tâche puisse être suivie depuis n'importe lequel d'entre eux.
+    # Les entrées expirent d'elles-mêmes (DEMOUCRON_JOB_RESULT_TTL) : aucune limite en nombre n'est fixée.
+    'demoucron-jobs': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'demoucron-jobs',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+
+# Taille maximale d'une entrée du cache 'demoucron', estimée comme la réponse JSON (ou .npz) correspondante :
+# un résultat plus volumineux n'est pas mis en cache. La mémoire du cache reste ainsi de l'ordre de
+# MAX_ENTRIES × DEMOUCRON_CACHE_MAX_ENTRY_BYTES
+DEMOUCRON_CACHE_MAX_ENTRY_BYTES = 2 * 1024 * 1024
+
+# Moteur 'auto' sans trace demandée : un graphe d'au moins DEMOUCRON_SPARSE_MIN_NODES sommets dont la densité
+# (arcs / n²) ne dépasse pas DEMOUCRON_SPARSE_MAX_DENSITY est traité par le moteur creux (Dijkstra / Bellman-Ford)
+DEMOUCRON_SPARSE_MIN_NODES = 200
+DEMOUCRON_SPARSE_MAX_DENSITY = 0.05
+
+# Mode asynchrone (run_demoucron/jobs/, matrix_demoucron/jobs/) : processus de calcul, nombre maximal de tâches
+# en attente ou en cours par processus serveur, durée maximale d'exécution d'une tâche (hors attente dans la file)
+# et durée de conservation des résultats (en secondes)
+DEMOUCRON_JOB_WORKERS = 2
+DEMOUCRON_JOB_MAX_QUEUE = 8
+DEMOUCRON_JOB_TIMEOUT = 600
+DEMOUCRON_JOB_RESULT_TTL = 3600
+
+# Traitement par lots (matrix_demoucron/batch/) : nombre maximal d'éléments, taille maximale des matrices relaxées
+# ensemble en pile 3-D, processus de calcul et volume de travail (somme des n³) à partir duquel le lot est réparti
+DEMOUCRON_BATCH_MAX_ITEMS = 1000
+DEMOUCRON_BATCH_STACK_MAX_NODES = 64
+DEMOUCRON_BATCH_WORKERS = os.cpu_count() or 1
+DEMOUCRON_BATCH_PARALLEL_MIN_WORK = 20_000_000
+
+# Contrôle d'admission (estimations à partir de n et E, avant calcul) : relaxations élémentaires (n³) au-delà
+# desquelles un calcul synchrone est refusé (422), volume estimé d'une réponse (ou d'un flux NDJSON) au-delà duquel
+# la trace est allégée ou la requête refusée (413)
+DEMOUCRON_MAX_RELAX_OPS = 8_000_000_000
+DEMOUCRON_MAX_RESPONSE_BYTES = 200 * 1024 * 1024
+DEMOUCRON_MAX_STREAM_BYTES = 2 * 1024 * 1024 * 1024
+# Calculs lourds (au moins DEMOUCRON_HEAVY_RUN_OPS relaxations ou DEMOUCRON_HEAVY_RUN_BYTES de réponse) : au plus
+# DEMOUCRON_MAX_HEAVY_RUNS simultanés par processus ; au-delà de DEMOUCRON_HEAVY_RUN_WAIT secondes d'attente, 503
+DEMOUCRON_HEAVY_RUN_OPS = 125_000_000
+DEMOUCRON_HEAVY_RUN_BYTES = 32 * 1024 * 1024
+DEMOUCRON_MAX_HEAVY_RUNS = 2
+DEMOUCRON_HEAVY_RUN_WAIT = 10
+
+# Noyau par tuiles (trace 'none') : à partir de DEMOUCRON_RELAX_PARALLEL_MIN_NODES sommets, les bandes de lignes
+# de chaque bloc sont relaxées par DEMOUCRON_RELAX_WORKERS threads (1 : calcul sur un seul thread). Chaque calcul
+# lourd, chaque tâche asynchrone en cours peut en occuper autant
+DEMOUCRON_RELAX_WORKERS = os.cpu_count() or 1
+DEMOUCRON_RELAX_PARALLEL_MIN_NODES = 512
+
+# Documentation (docs/) : durée de cache du schéma OpenAPI généré, et schéma préconstruit au déploiement
+# (manage.py build_openapi_schema), servi tel quel par docs/openapi.json lorsqu'il existe. Désactivé par défaut :
+# le fichier doit être régénéré à chaque déploiement, sans quoi la documentation ne suit plus le code
+# (par exemple BASE_DIR / 'openapi.json', ignoré par git)
+DEMOUCRON_SCHEMA_CACHE_TIMEOUT = 24 * 3600
+DEMOUCRON_OPENAPI_FILE = None
+
+# Une matrice 1000 × 1000 fait 8 Mo en float64 (.npy / .npz) et davantage en JSON
+DATA_UPLOAD_MAX_MEMORY_SIZE = 32 * 1024 * 1024
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    # Rendu JSON rapide (orjson si installé) ; l'API navigable, coûteuse à rendre, seulement en développement
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
-    ],
+        'demoucron.renderers.FastJSONRenderer',
+    ] + (['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
 }
 
 LANGUAGE_CODE = 'fr-FR'
@@ -116,6 +206,12 @@ CORS_ALLOW_HEADERS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Lisibles par le frontend : détail des durées par phase et nombre de requêtes SQL
+CORS_EXPOSE_HEADERS = [
+    'server-timing',
+    'x-query-count',
+]
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Bearer': {
@@ -126,5 +222,6 @@ SWAGGER_SETTINGS = {
         }
     },
     'USE_SESSION_AUTH': False,
-    'DEFAULT_INFO': 'demoucron.urls.swagger_info',
+    'DEFAULT_INFO': 'demoucron.docs.swagger_info',
+    'SPEC_URL': 'schema-json',
 }
\ No newline at end of file
@@ -0,0 +1,202 @@
+import math
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Contrôle d'admission des calculs coûteux : avant d'exécuter, le coût (relaxations élémentaires) et le volume de la
+# réponse sont estimés à partir de n et E seulement. Au-delà des budgets (réglages DEMOUCRON_MAX_*), la trace est
+# allégée ou la requête refusée ; un sémaphore limite le nombre de calculs lourds simultanés dans le processus
+
+# Octets approximatifs par élément sérialisé en JSON (mesurés sur des graphes générés par bench_demoucron).
+# Les estimations supposent une fermeture dense (toutes les cases finies) : ce sont des majorants
+CELL_BYTES = 6
+SUMMARY_STEP_BYTES = 40
+EDGE_BYTES = 40
+CHANGE_BYTES = 40
+CALCULATION_BYTES = 85
+BINARY_CELL_BYTES = 8
+DAG_NODE_BYTES = 60
+
+# Niveaux essayés, du plus détaillé au plus léger, lorsqu'une trace doit être allégée
+DOWNGRADES = (('full', 'full'), ('full', 'delta'), ('steps', 'full'), ('steps', 'delta'), ('summary', 'full'), ('none', 'full'))
+
+
+class ResponseTooLarge(Exception):
+    # Réponse estimée au-delà du budget, sans trace plus légère autorisée (413)
+    def __init__(self, estimated_bytes, max_bytes, suggestion):
+        super().__init__(estimated_bytes)
+        self.estimated_bytes = estimated_bytes
+        self.max_bytes = max_bytes
+        self.suggestion = suggestion
+
+
+class RunTooExpensive(Exception):
+    # Calcul synchrone estimé au-delà du budget (422)
+    def __init__(self, relax_ops, max_relax_ops):
+        super().__init__(relax_ops)
+        self.relax_ops = relax_ops
+        self.max_relax_ops = max_relax_ops
+
+
+class Busy(Exception):
+    # Trop de calculs lourds en cours (503)
+    pass
+
+
+def relax_ops(n, arc_count, engine='matrix'):
+    # Demoucron : n étapes de n² cases ; moteur 'sparse' : Dijkstra en O((n + E) log n) ; moteur 'dag' : O(n + E)
+    if engine == 'sparse':
+        return int((n + arc_count) * math.log2(n + 1))
+    if engine == 'dag':
+        return n + arc_count
+    return n ** 3
+
+
+def response_bytes(n, trace, encoding='full', binary=False):
+    if binary:
+        # .npz : matrice finale, plus le nombre de cases modifiées ('summary') ou la pile des n + 1 matrices ('steps')
+        size = n * n * BINARY_CELL_BYTES
+        if trace == 'summary':
+            size += n * BINARY_CELL_BYTES
+        elif trace in ('steps', 'full'):
+            size += (n + 1) * n * n * BINARY_CELL_BYTES
+        return size
+    size = n * n * CELL_BYTES
+    if trace == 'none':
+        return size
+    if trace == 'summary':
+        return size + n * SUMMARY_STEP_BYTES
+    if encoding == 'delta':
+        # Matrice de base, puis les cases modifiées : chaque case s'améliore en moyenne O(log n) fois
+        size += n * n * (CELL_BYTES + EDGE_BYTES) + n * n * math.log2(n + 1) * (CHANGE_BYTES + EDGE_BYTES)
+    else:
+        # n + 1 matrices complètes et leurs arcs
+        size += (n + 1) * n * n * (CELL_BYTES + EDGE_BYTES)
+    if trace == 'full':
+        # Au plus n² calculs par étape
+        size += n ** 3 * CALCULATION_BYTES
+    return int(size)
+
+
+def estimate(n, arc_count, engine, options, binary=False, all_pairs=False):
+    if engine == 'sparse':
+        return {'relax_ops': relax_ops(n, arc_count, engine), 'response_bytes': n * CELL_BYTES}
+    if engine == 'dag':
+        # Chemin, niveaux et dates au plus tôt / au plus tard de chaque sommet ; avec all_pairs, la matrice de
+        # toutes les paires en plus (une relaxation des arcs par sommet de départ)
+        if all_pairs:
+            return {'relax_ops': n * relax_ops(n, arc_count, engine),
+                    'response_bytes': n * DAG_NODE_BYTES + n * n * CELL_BYTES}
+        return {'relax_ops': relax_ops(n, arc_count, engine), 'response_bytes': n * DAG_NODE_BYTES}
+    return {
+        'relax_ops': relax_ops(n, arc_count, engine),
+        'response_bytes': response_bytes(n, options['trace'], options['encoding'], binary),
+    }
+
+
+def admit(n, arc_count, engine, options, downgrade, streaming=False, binary=False, synchronous=True, all_pairs=False):
+    # Renvoie les options retenues (éventuellement allégées) et leur estimation ;
+    # lève RunTooExpensive ou ResponseTooLarge si la requête ne peut pas être servie
+    result = estimate(n, arc_count, engine, options, binary, all_pairs)
+    if synchronous and result['relax_ops'] > settings.DEMOUCRON_MAX_RELAX_OPS:
+        raise RunTooExpensive(result['relax_ops'], settings.DEMOUCRON_MAX_RELAX_OPS)
+    max_bytes = settings.DEMOUCRON_MAX_STREAM_BYTES if streaming else settings.DEMOUCRON_MAX_RESPONSE_BYTES
+    if result['response_bytes'] <= max_bytes:
+        return options, result
+
+    requested = (options['trace'], options['encoding'])
+    lighter = DOWNGRADES[DOWNGRADES.index(requested) + 1:] if requested in DOWNGRADES else DOWNGRADES
+    for trace, encoding in lighter:
+        candidate = {'trace': trace, 'encoding': encoding}
+        candidate_estimate = estimate(n, arc_count, engine, candidate, binary, all_pairs)
+        if candidate_estimate['response_bytes'] <= max_bytes:
+            if downgrade:
+                return candidate, candidate_estimate
+            raise ResponseTooLarge(result['response_bytes'], max_bytes, candidate)
+    raise ResponseTooLarge(result['response_bytes'], max_bytes, None)
+
+
+def admit_batch(sizes):
+    # Lot de matrices (trace 'none') : les budgets portent sur la somme des coûts et des réponses
+    result = {
+        'relax_ops': sum(relax_ops(n, 0) for n in sizes),
+        'response_bytes': sum(response_bytes(n, 'none') for n in sizes),
+    }
+    if result['relax_ops'] > settings.DEMOUCRON_MAX_RELAX_OPS:
+        raise RunTooExpensive(result['relax_ops'], settings.DEMOUCRON_MAX_RELAX_OPS)
+    if result['response_bytes'] > settings.DEMOUCRON_MAX_RESPONSE_BYTES:
+        raise ResponseTooLarge(result['response_bytes'], settings.DEMOUCRON_MAX_RESPONSE_BYTES, None)
+    return result
+
+
+_heavy_runs = None
+_heavy_runs_lock = threading.Lock()
+
+
+def _semaphore():
+    global _heavy_runs
+    with _heavy_runs_lock:
+        if _heavy_runs is None:
+            _heavy_runs = threading.BoundedSemaphore(settings.DEMOUCRON_MAX_HEAVY_RUNS)
+        return _heavy_runs
+
+
+def is_heavy(run_estimate):
+    return (run_estimate['relax_ops'] >= settings.DEMOUCRON_HEAVY_RUN_OPS
+            or run_estimate['response_bytes'] >= settings.DEMOUCRON_HEAVY_RUN_BYTES)
+
+
+def acquire(run_estimate):
+    # Réserve une place pour un calcul lourd (attente bornée) ; renvoie la fonction qui la libère.
+    # Les calculs légers (ou sans estimation) passent sans attendre et ne sont jamais bloqués par les lourds
+    if run_estimate is None or not is_heavy(run_estimate):
+        return lambda: None
+    semaphore = _semaphore()
+    if not semaphore.acquire(timeout=settings.DEMOUCRON_HEAVY_RUN_WAIT):
+        raise Busy()
+    released = [False]
+
+    def release():
+        if not released[0]:
+            released[0] = True
+            semaphore.release()
+    return release
+
+
+def relax_workers(n):
+    # Threads du noyau par tuiles : sous le seuil, la synchronisation à chaque bloc coûte plus qu'elle ne rapporte
+    if n < settings.DEMOUCRON_RELAX_PARALLEL_MIN_NODES:
+        return 1
+    return max(1, settings.DEMOUCRON_RELAX_WORKERS)
+
+
+@contextmanager
+def heavy_slot(run_estimate):
+    release = acquire(run_estimate)
+    try:
+        yield
+    finally:
+        release()
+
+
+class HeldStream:
+    # Flux NDJSON calculé pendant l'envoi : la place est conservée jusqu'à la fermeture de la réponse
+    # (StreamingHttpResponse appelle close(), même si le flux n'a pas été parcouru)
+    def __init__(self, lines, release):
+        self.lines = iter(lines)
+        self.release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.lines)
+
+    def close(self):
+        try:
+            close = getattr(self.lines, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self.release()
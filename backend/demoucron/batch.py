@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from helper import batch_demoucron
+
+# Traitement par lots : les éléments sont regroupés par (taille, méthode), chaque groupe est découpé en
+# paquets relaxés ensemble (pile 3-D), et les paquets sont répartis sur un pool de processus dédié,
+# distinct de celui des tâches asynchrones pour ne pas attendre derrière un long calcul
+
+_lock = threading.Lock()
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=settings.DEMOUCRON_BATCH_WORKERS)
+        return _executor
+
+
+def _chunks(indices, count):
+    size = -(-len(indices) // count)
+    return [indices[start:start + size] for start in range(0, len(indices), size)]
+
+
+def run_batch(items):
+    # items : liste de (matrice numpy, noms des nœuds, méthode) ; renvoie les résultats dans l'ordre d'entrée
+    groups = {}
+    for index, (matrix, node_names, method) in enumerate(items):
+        groups.setdefault((len(node_names), method), []).append(index)
+
+    # Petit lot : le coût d'envoi aux processus dépasserait celui du calcul, tout est traité sur place
+    work = sum(len(node_names) ** 3 for _, node_names, _ in items)
+    parallel = work >= settings.DEMOUCRON_BATCH_PARALLEL_MIN_WORK and settings.DEMOUCRON_BATCH_WORKERS > 1
+    tasks = []
+    for (_, method), indices in groups.items():
+        for chunk in (_chunks(indices, settings.DEMOUCRON_BATCH_WORKERS) if parallel else [indices]):
+            tasks.append((chunk, [items[i][0] for i in chunk], [items[i][1] for i in chunk], method))
+
+    if parallel:
+        executor = _get_executor()
+        futures = [executor.submit(batch_demoucron, matrices, names, method, settings.DEMOUCRON_BATCH_STACK_MAX_NODES)
+                   for _, matrices, names, method in tasks]
+        outputs = [future.result() for future in futures]
+    else:
+        outputs = [batch_demoucron(matrices, names, method, settings.DEMOUCRON_BATCH_STACK_MAX_NODES)
+                   for _, matrices, names, method in tasks]
+
+    results = [None] * len(items)
+    for (chunk, _, _, method), output in zip(tasks, outputs):
+        for index, result in zip(chunk, output):
+            results[index] = {**result, 'methode': method}
+    return results
@@ -0,0 +1,72 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+
+from helper import to_working_matrix
+from timing import phase
+from . import admission
+
+RESULT_CACHE_ALIAS = 'demoucron'
+STATS_CACHE_ALIAS = 'demoucron-stats'
+
+def result_cache():
+    return caches[RESULT_CACHE_ALIAS]
+
+def stats_cache():
+    # Cache distinct : les compteurs ne sont pas soumis à l'éviction des résultats (MAX_ENTRIES)
+    return caches[STATS_CACHE_ALIAS]
+
+def result_key(matrix, node_names, method, options):
+    # Empreinte canonique : matrice normalisée (None -> absence d'arc), ordre des nœuds, méthode et options
+    working = to_working_matrix(matrix, method)
+    digest = hashlib.sha256()
+    digest.update(json.dumps([list(node_names), method, sorted(options.items())]).encode('utf-8'))
+    digest.update(str(working.shape).encode('ascii'))
+    digest.update(working.tobytes())
+    return f'demoucron:result:{digest.hexdigest()}'
+
+def graph_result_key(graph_id, revision, options):
+    # La révision du graphe change à chaque modification : les anciennes entrées ne sont plus atteintes
+    suffix = ':'.join(f'{name}={value}' for name, value in sorted(options.items()))
+    return f'demoucron:graph:{graph_id}:r{revision}:{suffix}'
+
+def graph_state_key(graph_id, revision):
+    # Distances et prédécesseurs de toutes les paires (tableaux numpy) pour les requêtes de chemins
+    return f'demoucron:state:{graph_id}:r{revision}'
+
+def is_cacheable(n, options, binary=False):
+    # Le cache est borné en nombre d'entrées : chaque entrée l'est aussi en taille, estimée comme la réponse
+    # (les traces 'steps' et 'full' grossissent en O(n³))
+    size = admission.response_bytes(n, options.get('trace', 'full'), options.get('encoding', 'full'), binary)
+    return size <= getattr(settings, 'DEMOUCRON_CACHE_MAX_ENTRY_BYTES', 2 * 1024 * 1024)
+
+def _count(kind, outcome):
+    cache = stats_cache()
+    key = f'demoucron:stats:{kind}:{outcome}'
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+def get_cached(key, kind):
+    with phase('cache'):
+        value = result_cache().get(key)
+    _count(kind, 'hits' if value is not None else 'misses')
+    return value
+
+def set_cached(key, value):
+    with phase('cache'):
+        result_cache().set(key, value)
+
+def cache_stats():
+    cache = stats_cache()
+    stats = {}
+    for kind in ('graph', 'result', 'state'):
+        stats[kind] = {
+            outcome: cache.get(f'demoucron:stats:{kind}:{outcome}', 0)
+            for outcome in ('hits', 'misses')
+        }
+    return stats
@@ -0,0 +1,49 @@
+import os
+
+from django.conf import settings
+from django.http import FileResponse
+from drf_yasg import openapi
+
+# Documentation OpenAPI. drf_yasg.views entraîne le validateur de schémas (jsonschema, swagger_spec_validator) :
+# il n'est importé qu'à la première consultation de docs/, pas au chargement des URL par chaque processus.
+# drf_yasg.openapi et drf_yasg.utils restent chargés avec les vues (swagger_auto_schema et les schémas sont évalués
+# à la définition des classes), de même que numpy, utilisé au niveau module par helper et les renderers.
+# Le schéma est généré une fois puis mis en cache (DEMOUCRON_SCHEMA_CACHE_TIMEOUT), ou préconstruit au
+# déploiement par `manage.py build_openapi_schema` et servi tel quel depuis DEMOUCRON_OPENAPI_FILE s'il est défini
+
+swagger_info = openapi.Info(
+    title="Demoucron API",
+    default_version='v1',
+    description="API pour gérer des graphes et exécuter l'algorithme de Demoucron pour calculer les chemins minimaux et maximaux.",
+    terms_of_service="https://www.example.com/terms/",
+    contact=openapi.Contact(email="contact@example.com"),
+    license=openapi.License(name="MIT License"),
+)
+
+_views = {}
+
+
+def _cached_view(name):
+    view = _views.get(name)
+    if view is None:
+        from drf_yasg.views import get_schema_view
+        from rest_framework import permissions
+
+        schema_view = get_schema_view(swagger_info, public=True, permission_classes=(permissions.AllowAny,))
+        timeout = settings.DEMOUCRON_SCHEMA_CACHE_TIMEOUT
+        _views['ui'] = schema_view.with_ui('swagger', cache_timeout=timeout)
+        _views['json'] = schema_view.without_ui(cache_timeout=timeout)
+        view = _views[name]
+    return view
+
+
+def swagger_ui(request):
+    # L'interface charge le schéma depuis docs/openapi.json (SWAGGER_SETTINGS['SPEC_URL'])
+    return _cached_view('ui')(request)
+
+
+def openapi_schema(request):
+    path = settings.DEMOUCRON_OPENAPI_FILE
+    if path and os.path.exists(path):
+        return FileResponse(open(path, 'rb'), content_type='application/json')
+    return _cached_view('json')(request, format='json')
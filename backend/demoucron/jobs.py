@@ -0,0 +1,196 @@
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from multiprocessing import Manager
+
+from django.conf import settings
+from django.core.cache import caches
+
+from helper import demoucron_algorithm
+
+from . import admission
+
+# Exécution asynchrone sans courtier : les tâches tournent dans un ProcessPoolExecutor local au processus serveur
+# qui les a reçues. Un fil de surveillance par tâche recopie son état (progression, résultat, erreur) dans le cache
+# JOB_CACHE_ALIAS, lu par GET/DELETE jobs/<id>/ : avec un cache partagé, n'importe quel worker peut suivre ou
+# annuler la tâche. La progression et les demandes d'annulation passent entre le pool et le fil de surveillance
+# par des dictionnaires partagés d'un Manager multiprocessing.
+
+JOB_CACHE_ALIAS = 'demoucron-jobs'
+
+# Intervalle (en secondes) de recopie de la progression et de lecture des demandes d'annulation
+POLL_INTERVAL = 0.2
+
+class JobCancelled(Exception):
+    pass
+
+class QueueFull(Exception):
+    pass
+
+_lock = threading.RLock()
+_active = set()
+_pool = None
+
+
+def job_cache():
+    return caches[JOB_CACHE_ALIAS]
+
+def job_key(job_id):
+    return f'demoucron:job:{job_id}'
+
+def cancel_key(job_id):
+    return f'demoucron:job:{job_id}:cancel'
+
+
+def _get_pool():
+    # Créés à la première soumission : aucun processus supplémentaire tant que le mode asynchrone n'est pas utilisé
+    global _pool
+    with _lock:
+        if _pool is not None:
+            return _pool
+        manager = Manager()
+        _pool = {
+            'executor': ProcessPoolExecutor(max_workers=settings.DEMOUCRON_JOB_WORKERS),
+            'progress': manager.dict(),
+            'cancelled': manager.dict(),
+        }
+        return _pool
+
+
+def _run(job_id, matrix, node_names, method, options, progress, cancelled, workers):
+    # Exécuté dans un processus du pool ; l'annulation (demandée ou après dépassement du délai) est vérifiée
+    # après chaque étape k
+    progress[job_id] = 0
+
+    def on_step(step, total):
+        progress[job_id] = step
+        if cancelled.get(job_id):
+            raise JobCancelled()
+
+    steps, paths, final_matrix = demoucron_algorithm(
+        matrix, node_names, method=method, on_step=on_step, workers=workers, **options
+    )
+    return {'steps': steps, 'paths': paths, 'matrix': final_matrix}
+
+
+def _save(job_id, job, timeout):
+    job_cache().set(job_key(job_id), job, timeout=timeout)
+
+
+def _stop(job_id, future):
+    # Une tâche en attente est retirée de la file ; une tâche en cours s'arrête à la fin de l'étape courante,
+    # son état final est publié sans l'attendre
+    if not future.cancel():
+        _get_pool()['cancelled'][job_id] = True
+
+
+def _release(job_id):
+    pool = _get_pool()
+    pool['progress'].pop(job_id, None)
+    pool['cancelled'].pop(job_id, None)
+
+
+def _watch(job_id, job, future, timeout):
+    # Le délai DEMOUCRON_JOB_TIMEOUT court à partir du démarrage effectif de la tâche (hors attente dans la file)
+    # et est imposé par future.result(timeout=...), indépendamment de la durée d'une étape
+    pool = _get_pool()
+    deadline = None
+    while True:
+        wait = POLL_INTERVAL if deadline is None else max(0.0, min(POLL_INTERVAL, deadline - time.monotonic()))
+        try:
+            result = future.result(timeout=wait)
+        except FutureTimeout:
+            # Le pool réserve d'avance quelques tâches : seule la présence d'une progression indique un vrai démarrage
+            step = pool['progress'].get(job_id)
+            if step is not None:
+                if deadline is None:
+                    deadline = time.monotonic() + timeout
+                job.update(status='running', step=step)
+            if deadline is not None and time.monotonic() >= deadline:
+                _stop(job_id, future)
+                job.update(status='timeout', error=f"Durée maximale dépassée ({timeout} s)")
+            elif job_cache().get(cancel_key(job_id)):
+                _stop(job_id, future)
+                job['status'] = 'cancelled'
+            else:
+                # Les tâches actives restent dans le cache tant que leur fil de surveillance les rafraîchit
+                _save(job_id, job, settings.DEMOUCRON_JOB_RESULT_TTL)
+                continue
+        except (CancelledError, JobCancelled):
+            job['status'] = 'cancelled'
+        except Exception as exc:
+            job.update(status='failed', error=str(exc) or exc.__class__.__name__)
+        else:
+            job.update(status='done', step=job['total'], result=result)
+        break
+    # Les résultats des tâches terminées sont conservés DEMOUCRON_JOB_RESULT_TTL secondes
+    job['finished'] = True
+    _save(job_id, job, settings.DEMOUCRON_JOB_RESULT_TTL)
+    job_cache().delete(cancel_key(job_id))
+    with _lock:
+        _active.discard(job_id)
+
+
+def submit(matrix, node_names, method, options, extra=None):
+    # extra : champs ajoutés tels quels au résultat (sommets et arcs du graphe, moteur, options)
+    pool = _get_pool()
+    with _lock:
+        # La file est celle du pool local : la limite porte sur les tâches de ce processus
+        if len(_active) >= settings.DEMOUCRON_JOB_MAX_QUEUE:
+            raise QueueFull()
+        job_id = uuid.uuid4().hex
+        job = {
+            'status': 'queued',
+            'step': 0,
+            'total': len(node_names),
+            'extra': extra or {},
+            'result': None,
+            'error': None,
+            'finished': False,
+        }
+        _save(job_id, job, settings.DEMOUCRON_JOB_RESULT_TTL)
+        future = pool['executor'].submit(
+            _run, job_id, matrix, node_names, method, options,
+            pool['progress'], pool['cancelled'], admission.relax_workers(len(node_names))
+        )
+        _active.add(job_id)
+    future.add_done_callback(lambda done: _release(job_id))
+    threading.Thread(
+        target=_watch, args=(job_id, dict(job), future, settings.DEMOUCRON_JOB_TIMEOUT), daemon=True
+    ).start()
+    return job_id
+
+
+def get(job_id):
+    # Renvoie l'état public de la tâche, ou None si elle est inconnue ou expirée
+    job = job_cache().get(job_key(job_id))
+    if job is None:
+        return None
+    status = job['status']
+    if not job['finished'] and job_cache().get(cancel_key(job_id)):
+        status = 'cancelling'
+    data = {
+        'id': job_id,
+        'status': status,
+        'progress': {'step': job['step'], 'total': job['total']},
+    }
+    if status == 'done':
+        data['result'] = {**job['result'], **job['extra']}
+    elif job['error']:
+        data['error'] = job['error']
+    return data
+
+
+def cancel(job_id):
+    # L'annulation d'une tâche active est relayée par son fil de surveillance, quel que soit le worker qui la reçoit.
+    # Une tâche terminée est simplement oubliée. Renvoie False si la tâche est inconnue.
+    cache = job_cache()
+    job = cache.get(job_key(job_id))
+    if job is None:
+        return False
+    if job['finished']:
+        cache.delete(job_key(job_id))
+    else:
+        cache.set(cancel_key(job_id), True, timeout=settings.DEMOUCRON_JOB_RESULT_TTL)
+    return True
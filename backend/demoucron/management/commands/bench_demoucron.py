@@ -0,0 +1,315 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from demoucron.cache import result_cache
+from demoucron.models import Graph, Sommet, Arc
+from demoucron.renderers import FastJSONRenderer
+from helper import (
+    build_adjacency_matrix, demoucron_algorithm, arcs_to_adjacency_lists, matrix_to_arcs, query_arcs,
+    topological_levels, dag_paths
+)
+
+KINDS = ('sparse', 'dense', 'dag', 'negative')
+DEFAULT_SIZES = '10,50,200,500,1000,2000'
+# Une comparaison sur moins d'exécutions mesurées ne distingue pas une régression du bruit de mesure
+MIN_COMPARE_REPEAT = 3
+
+
+class Rollback(Exception):
+    pass
+
+
+def generate_graph(kind, n, seed):
+    # Graphe synthétique reproductible (matrice n × n, inf pour l'absence d'arc). Le nœud 0 est initial
+    # (aucun arc entrant) et le nœud n - 1 final (aucun arc sortant), comme l'imposent les modèles.
+    # 'negative' : poids réduits w + p(u) - p(v) d'un graphe à poids positifs, donc des arcs négatifs
+    # sans circuit absorbant
+    rng = np.random.default_rng(seed)
+    if kind == 'dense':
+        mask = rng.random((n, n)) < 0.5
+    elif kind == 'dag':
+        mask = np.triu(rng.random((n, n)) < min(1.0, 8 / max(n, 1)), k=1)
+    else:
+        mask = rng.random((n, n)) < min(1.0, 4 / max(n, 1))
+    np.fill_diagonal(mask, False)
+    mask[:, 0] = False
+    mask[n - 1, :] = False
+    # Un chemin initial -> final garanti
+    chain = np.arange(n - 1)
+    mask[chain, chain + 1] = True
+
+    weights = rng.integers(1, 20, (n, n)).astype(float)
+    if kind == 'negative':
+        potential = rng.integers(0, 10, n).astype(float)
+        weights = weights + potential[:, None] - potential[None, :]
+    matrix = np.where(mask, weights, np.inf)
+    np.fill_diagonal(matrix, 0)
+    return matrix
+
+
+def triple_loop_min(matrix):
+    # Référence naïve : trois boucles Python imbriquées sur des listes, sans numpy
+    distances = matrix.tolist()
+    n = len(distances)
+    for k in range(n):
+        row_k = distances[k]
+        for i in range(n):
+            row_i = distances[i]
+            d_ik = row_i[k]
+            for j in range(n):
+                candidate = d_ik + row_k[j]
+                if candidate < row_i[j]:
+                    row_i[j] = candidate
+    return distances
+
+
+def measure(function, repeat):
+    # Durées (meilleure et médiane) sur `repeat` exécutions, puis pic mémoire sur une exécution supplémentaire
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'seconds_min': min(durations),
+        'seconds_median': statistics.median(durations),
+        'peak_bytes': peak,
+    }, result
+
+
+def store_graph(kind, n, matrix):
+    graph = Graph.objects.create(name=f'bench-{kind}-{n}')
+    types = ['initial'] + ['normal'] * (n - 2) + ['final'] if n > 1 else ['initial']
+    sommets = Sommet.objects.bulk_create(
+        Sommet(graph=graph, name=f'N{i}', type=node_type) for i, node_type in enumerate(types)
+    )
+    rows, cols = np.nonzero(np.isfinite(matrix) & ~np.eye(n, dtype=bool))
+    Arc.objects.bulk_create(
+        (Arc(graph=graph, source=sommets[i], target=sommets[j], weight=matrix[i, j])
+         for i, j in zip(rows.tolist(), cols.tolist())),
+        batch_size=5000
+    )
+    # Comme l'import en masse : une révision et son instantané pour l'ensemble des créations
+    Graph.bump_revision(graph.id)
+    graph.refresh_from_db(fields=['revision'])
+    return graph
+
+
+class Command(BaseCommand):
+    help = ("Mesure les performances de l'algorithme de Demoucron et des points d'accès sur des graphes synthétiques "
+            "reproductibles ; écrit les résultats en JSON et peut les comparer à une exécution de référence.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                            help=f"Nombres de nœuds, séparés par des virgules (défaut : {DEFAULT_SIZES})")
+        parser.add_argument('--kinds', default=','.join(KINDS),
+                            help=f"Familles de graphes parmi {', '.join(KINDS)}")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=3,
+                            help=f"Exécutions mesurées par cas (meilleure et médiane) ; au moins {MIN_COMPARE_REPEAT} "
+                                 "avec --compare")
+        parser.add_argument('--max-trace-nodes', type=int, default=50,
+                            help="Taille maximale pour les traces complètes, dont le volume croît en O(n³)")
+        parser.add_argument('--max-stepwise-nodes', type=int, default=1000,
+                            help="Taille maximale pour la relaxation étape par étape sans tuiles (comparaison avec algorithm_min)")
+        parser.add_argument('--max-loop-nodes', type=int, default=100,
+                            help="Taille maximale pour la triple boucle Python de référence, en O(n³) opérations interprétées")
+        parser.add_argument('--max-http-nodes', type=int, default=1000,
+                            help="Taille maximale pour les mesures de bout en bout (base de données et HTTP)")
+        parser.add_argument('--workers', type=int, default=settings.DEMOUCRON_RELAX_WORKERS,
+                            help="Threads du noyau par tuiles pour algorithm_min_parallel (ignoré si 1)")
+        parser.add_argument('--output', help="Fichier JSON où écrire les résultats")
+        parser.add_argument('--compare', help="Fichier JSON de référence : signale les régressions")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Ralentissement relatif des médianes toléré avant de signaler une régression (défaut : 0.2)")
+        parser.add_argument('--min-seconds', type=float, default=0.001,
+                            help="Plancher de bruit : durées de référence en dessous desquelles la comparaison est ignorée, "
+                                 "et écart absolu des médianes en dessous duquel aucune régression n'est signalée")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size]
+        except ValueError:
+            raise CommandError('--sizes doit être une liste d\'entiers séparés par des virgules')
+        kinds = [kind for kind in options['kinds'].split(',') if kind]
+        unknown = set(kinds) - set(KINDS)
+        if unknown:
+            raise CommandError(f"Familles inconnues : {', '.join(sorted(unknown))}")
+        if any(size < 2 for size in sizes):
+            raise CommandError('Les graphes doivent avoir au moins 2 nœuds')
+        if options['compare'] and options['repeat'] < MIN_COMPARE_REPEAT:
+            raise CommandError(f'--compare demande au moins --repeat {MIN_COMPARE_REPEAT}')
+
+        results = []
+        for kind in kinds:
+            for n in sizes:
+                results.extend(self.bench_graph(kind, n, options))
+
+        report = {
+            'meta': {
+                'seed': options['seed'],
+                'sizes': sizes,
+                'kinds': kinds,
+                'repeat': options['repeat'],
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'machine': platform.machine(),
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Résultats écrits dans {options['output']}")
+        if options['compare']:
+            self.compare(results, options)
+
+    def record(self, results, kind, n, arcs, benchmark, metrics, **extra):
+        entry = {'kind': kind, 'n': n, 'arcs': arcs, 'benchmark': benchmark, **metrics, **extra}
+        results.append(entry)
+        details = ''.join(f' {key}={value}' for key, value in extra.items())
+        self.stdout.write(
+            f"{kind:>8} n={n:<5} {benchmark:<24} {metrics['seconds_min'] * 1000:10.2f} ms "
+            f"(médiane {metrics['seconds_median'] * 1000:.2f} ms, pic {metrics['peak_bytes'] / 1e6:.1f} Mo){details}"
+        )
+
+    def bench_graph(self, kind, n, options):
+        repeat = options['repeat']
+        matrix = generate_graph(kind, n, options['seed'])
+        node_names = [f'N{i}' for i in range(n)]
+        arcs = int((np.isfinite(matrix) & ~np.eye(n, dtype=bool)).sum())
+        results = []
+
+        metrics, _ = measure(lambda: demoucron_algorithm(matrix, node_names, method='min', trace='none'), repeat)
+        self.record(results, kind, n, arcs, 'algorithm_min', metrics)
+        metrics, _ = measure(
+            lambda: demoucron_algorithm(matrix, node_names, method='min', trace='none', dtype='float32'), repeat
+        )
+        self.record(results, kind, n, arcs, 'algorithm_min_float32', metrics)
+        if options['workers'] > 1:
+            metrics, _ = measure(
+                lambda: demoucron_algorithm(matrix, node_names, method='min', trace='none', workers=options['workers']),
+                repeat
+            )
+            self.record(results, kind, n, arcs, 'algorithm_min_parallel', metrics, workers=options['workers'])
+        # Relaxation vectorisée étape par étape, une diffusion de toute la matrice par étape (trace 'summary' :
+        # sans noyau par tuiles)
+        if n <= options['max_stepwise_nodes']:
+            metrics, _ = measure(lambda: demoucron_algorithm(matrix, node_names, method='min', trace='summary'), repeat)
+            self.record(results, kind, n, arcs, 'stepwise_min', metrics)
+        if n <= options['max_loop_nodes']:
+            metrics, _ = measure(lambda: triple_loop_min(matrix), repeat)
+            self.record(results, kind, n, arcs, 'triple_loop_min', metrics)
+        # La méthode max n'a de sens que sans circuit (sinon les chemins croissent sans borne)
+        if kind == 'dag':
+            max_matrix = np.where(np.isinf(matrix), -np.inf, matrix)
+            metrics, _ = measure(lambda: demoucron_algorithm(max_matrix, node_names, method='max', trace='none'), repeat)
+            self.record(results, kind, n, arcs, 'algorithm_max', metrics)
+            # Moteur 'dag' : niveaux et chemin critique en O(V + E)
+            adjacency = arcs_to_adjacency_lists(n, matrix_to_arcs(matrix))
+            metrics, _ = measure(
+                lambda: dag_paths(adjacency, node_names, topological_levels(adjacency), method='max'), repeat
+            )
+            self.record(results, kind, n, arcs, 'dag_max', metrics)
+
+        if n <= options['max_trace_nodes']:
+            renderer = FastJSONRenderer()
+            for encoding in ('full', 'delta'):
+                metrics, (steps, _, _) = measure(
+                    lambda: demoucron_algorithm(matrix, node_names, method='min', trace='full', encoding=encoding), repeat
+                )
+                self.record(results, kind, n, arcs, f'algorithm_trace_{encoding}', metrics)
+                metrics, payload = measure(lambda: renderer.render({'steps': steps}), repeat)
+                self.record(results, kind, n, arcs, f'serialize_steps_{encoding}', metrics, bytes=len(payload))
+
+        if n <= options['max_http_nodes']:
+            results.extend(self.bench_database(kind, n, arcs, matrix, options))
+        return results
+
+    def bench_database(self, kind, n, arcs, matrix, options):
+        # Le graphe est enregistré dans une transaction annulée à la fin : la base n'est pas modifiée
+        results = []
+        try:
+            with transaction.atomic():
+                graph = store_graph(kind, n, matrix)
+
+                # Premier appel compté à part, puis la moyenne des appels suivants
+                with CaptureQueriesContext(connection) as first:
+                    build_adjacency_matrix(graph)
+                with CaptureQueriesContext(connection) as queries:
+                    metrics, _ = measure(lambda: build_adjacency_matrix(graph), options['repeat'])
+                self.record(results, kind, n, arcs, 'build_adjacency_matrix', metrics,
+                            queries_first=len(first), queries=len(queries) // (options['repeat'] + 1))
+                # Chargement depuis les tables, sans instantané
+                with CaptureQueriesContext(connection) as queries:
+                    metrics, _ = measure(lambda: query_arcs(graph), options['repeat'])
+                self.record(results, kind, n, arcs, 'query_arcs', metrics,
+                            queries=len(queries) // (options['repeat'] + 1))
+
+                client = Client(HTTP_HOST='localhost')
+                trace = 'full' if n <= options['max_trace_nodes'] else 'none'
+                url = f'/api/graphs/{graph.id}/run_demoucron/?trace={trace}&engine=matrix'
+
+                def run():
+                    # Sans le cache des résultats, chaque requête refait le calcul complet
+                    result_cache().clear()
+                    response = client.get(url)
+                    if response.status_code != 200:
+                        raise CommandError(f'{url} : HTTP {response.status_code} {response.content[:200]!r}')
+                    return response
+
+                with CaptureQueriesContext(connection) as first:
+                    run()
+                with CaptureQueriesContext(connection) as queries:
+                    metrics, response = measure(run, options['repeat'])
+                self.record(results, kind, n, arcs, f'http_run_demoucron_{trace}', metrics, queries_first=len(first),
+                            queries=len(queries) // (options['repeat'] + 1), bytes=len(response.content))
+                raise Rollback()
+        except Rollback:
+            pass
+        return results
+
+    def compare(self, results, options):
+        with open(options['compare'], encoding='utf-8') as baseline_file:
+            report = json.load(baseline_file)
+        if report['meta']['repeat'] < MIN_COMPARE_REPEAT:
+            raise CommandError(f"La référence {options['compare']} a été mesurée avec --repeat "
+                               f"{report['meta']['repeat']} (au moins {MIN_COMPARE_REPEAT} requis)")
+        baseline = {(entry['kind'], entry['n'], entry['benchmark']): entry for entry in report['results']}
+        regressions = []
+        for entry in results:
+            reference = baseline.get((entry['kind'], entry['n'], entry['benchmark']))
+            if reference is None:
+                continue
+            label = f"{entry['kind']} n={entry['n']} {entry['benchmark']}"
+            # Médianes plutôt que meilleures durées ; un écart sous le plancher de bruit n'est jamais une régression
+            if reference['seconds_median'] >= options['min_seconds']:
+                ratio = entry['seconds_median'] / reference['seconds_median']
+                self.stdout.write(f'{label:<48} x{ratio:.2f}')
+                slower = entry['seconds_median'] - reference['seconds_median']
+                if ratio > 1 + options['threshold'] and slower > options['min_seconds']:
+                    regressions.append(f'{label} : {ratio:.2f} fois plus lent (médiane)')
+            for field in ('queries_first', 'queries'):
+                if field in entry and field in reference and entry[field] > reference[field]:
+                    regressions.append(f"{label} : {reference[field]} -> {entry[field]} requêtes ({field})")
+        if regressions:
+            raise CommandError('Régressions détectées :\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Aucune régression par rapport à la référence'))
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ("Génère le schéma OpenAPI une fois pour toutes (à chaque déploiement) : avec DEMOUCRON_OPENAPI_FILE, "
+            "docs/openapi.json sert ensuite ce fichier tel quel au lieu de parcourir les vues à chaque processus")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Fichier JSON à écrire (défaut : DEMOUCRON_OPENAPI_FILE)")
+
+    def handle(self, *args, **options):
+        from drf_yasg.codecs import OpenAPICodecJson
+        from drf_yasg.generators import OpenAPISchemaGenerator
+
+        from demoucron.docs import swagger_info
+
+        output = options['output'] or settings.DEMOUCRON_OPENAPI_FILE
+        if not output:
+            raise CommandError("Aucun fichier de sortie : passez --output ou définissez DEMOUCRON_OPENAPI_FILE")
+        # Sans requête, le schéma ne fixe ni hôte ni schéma d'URL : l'interface utilise ceux de la page
+        schema = OpenAPISchemaGenerator(swagger_info).get_schema(request=None, public=True)
+        content = OpenAPICodecJson(validators=[]).encode(schema)
+        with open(output, 'wb') as schema_file:
+            schema_file.write(content)
+        self.stdout.write(f"Schéma OpenAPI écrit dans {output} ({len(content)} octets)")
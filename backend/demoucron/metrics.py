@@ -0,0 +1,72 @@
+import bisect
+import threading
+
+# Histogrammes agrégés en mémoire (par processus serveur) et exposés au format texte Prometheus
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+NODE_BUCKETS = (10, 50, 100, 200, 500, 1000, 2000, 5000)
+ARC_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+
+METRICS = {
+    'demoucron_request_duration_seconds': ('Durée des requêtes par point d\'accès', DURATION_BUCKETS),
+    'demoucron_phase_duration_seconds': ('Durée de chaque phase (orm, matrix, relax, snapshot, render...)', DURATION_BUCKETS),
+    'demoucron_request_queries': ('Nombre de requêtes SQL par requête HTTP', QUERY_BUCKETS),
+    'demoucron_graph_nodes': ('Nombre de sommets (n) des graphes traités', NODE_BUCKETS),
+    'demoucron_graph_arcs': ('Nombre d\'arcs (E) des graphes traités', ARC_BUCKETS),
+}
+
+_lock = threading.Lock()
+# nom -> labels (tuple trié de paires) -> [compteurs par seau, somme, nombre]
+_histograms = {name: {} for name in METRICS}
+
+
+def observe(name, value, **labels):
+    buckets = METRICS[name][1]
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        histogram = _histograms[name].get(key)
+        if histogram is None:
+            histogram = _histograms[name][key] = [[0] * (len(buckets) + 1), 0.0, 0]
+        histogram[0][bisect.bisect_left(buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def record_request(endpoint, method, status_code, duration, queries, timings):
+    observe('demoucron_request_duration_seconds', duration, endpoint=endpoint, method=method, status=str(status_code))
+    observe('demoucron_request_queries', queries, endpoint=endpoint)
+    for phase_name, seconds in timings.phases.items():
+        observe('demoucron_phase_duration_seconds', seconds, endpoint=endpoint, phase=phase_name)
+    if timings.nodes is not None:
+        observe('demoucron_graph_nodes', timings.nodes, endpoint=endpoint)
+        observe('demoucron_graph_arcs', timings.arcs, endpoint=endpoint)
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    lines = []
+    with _lock:
+        for name, (description, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, (counts, total, count) in sorted(_histograms[name].items()):
+                cumulative = 0
+                for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                    cumulative += bucket_count
+                    le = bound if bound == '+Inf' else _format_number(bound)
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", le)])} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(total)}')
+                lines.append(f'{name}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,81 @@
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+import timing
+from .metrics import record_request
+
+
+class TimingMiddleware:
+    # Mesure chaque requête : durée totale, durée par phase (timing.phase), nombre de requêtes SQL.
+    # Ajoute les en-têtes Server-Timing et X-Query-Count et alimente les histogrammes de metrics/.
+    # Réponses en flux (StreamingHttpResponse) : les en-têtes partent avant que le corps ne soit produit, ils sont
+    # donc omis ; les mesures, corps compris, sont enregistrées dans metrics/ à la fin (ou à l'abandon) du flux
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = timing.Timings()
+        queries = [0]
+        started = time.perf_counter()
+        with self.measuring(timings, queries):
+            response = self.get_response(request)
+
+        if response.streaming:
+            response.streaming_content = self.measured_stream(
+                response.streaming_content, request, response, timings, queries, started
+            )
+            return response
+
+        duration = time.perf_counter() - started
+        entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.phases.items()]
+        entries.append(f'total;dur={duration * 1000:.2f}')
+        response['Server-Timing'] = ', '.join(entries)
+        response['X-Query-Count'] = str(queries[0])
+        self.record(request, response, duration, queries, timings)
+        return response
+
+    @contextmanager
+    def measuring(self, timings, queries):
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        token = timing.resume(timings)
+        try:
+            with connection.execute_wrapper(count_queries):
+                yield
+        finally:
+            timing.stop(token)
+
+    def measured_stream(self, content, request, response, timings, queries, started):
+        # Chaque morceau est produit avec les mesures de la requête actives (phases et requêtes SQL du corps)
+        iterator = iter(content)
+        try:
+            while True:
+                with self.measuring(timings, queries):
+                    chunk = next(iterator, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            self.record(request, response, time.perf_counter() - started, queries, timings)
+
+    def record(self, request, response, duration, queries, timings):
+        match = request.resolver_match
+        endpoint = match.url_name if match is not None and match.url_name else 'unmatched'
+        record_request(endpoint, request.method, response.status_code, duration, queries[0], timings)
+
+    def process_template_response(self, request, response):
+        # Les réponses DRF sont rendues après la vue : le rendu (JSON, NDJSON, npz) devient la phase 'render'
+        render = response.render
+
+        def timed_render():
+            # Retiré avant le rendu : une réponse mise en cache (cache_page) doit rester sérialisable par pickle
+            del response.render
+            with timing.phase('render'):
+                return render()
+
+        response.render = timed_render
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demoucron', '0002_sommet_x_sommet_y_alter_arc_weight'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='graph',
+            name='revision',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demoucron', '0003_graph_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='graph',
+            name='snapshot',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='graph',
+            name='snapshot_revision',
+            field=models.PositiveIntegerField(null=True),
+        ),
+    ]
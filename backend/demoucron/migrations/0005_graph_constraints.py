@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:35
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    # Données antérieures aux contraintes : des arcs parallèles (seul le dernier créé comptait) et, par import
+    # en masse, plusieurs nœuds initiaux ou finaux (le premier créé est conservé, les autres deviennent normaux)
+    Graph = apps.get_model('demoucron', 'Graph')
+    Sommet = apps.get_model('demoucron', 'Sommet')
+    Arc = apps.get_model('demoucron', 'Arc')
+    changed = set()
+
+    parallel = (Arc.objects.values('graph', 'source', 'target')
+                .annotate(last=Max('id'), count=Count('id')).filter(count__gt=1))
+    for row in parallel:
+        Arc.objects.filter(graph=row['graph'], source=row['source'], target=row['target']).exclude(pk=row['last']).delete()
+        changed.add(row['graph'])
+
+    for node_type in ('initial', 'final'):
+        duplicates = (Sommet.objects.filter(type=node_type).values('graph')
+                      .annotate(first=Min('id'), count=Count('id')).filter(count__gt=1))
+        for row in duplicates:
+            Sommet.objects.filter(graph=row['graph'], type=node_type).exclude(pk=row['first']).update(type='normal')
+            changed.add(row['graph'])
+
+    # Nouvelle révision : ETags, caches et instantanés des graphes modifiés sont invalidés
+    Graph.objects.filter(pk__in=changed).update(revision=F('revision') + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demoucron', '0004_graph_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='sommet',
+            index=models.Index(fields=['graph', 'type'], name='sommet_graph_type_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='arc',
+            constraint=models.UniqueConstraint(fields=('graph', 'source', 'target'), name='arc_unique_pair'),
+        ),
+        migrations.AddConstraint(
+            model_name='sommet',
+            constraint=models.UniqueConstraint(condition=models.Q(('type', 'initial')), fields=('graph',), name='sommet_single_initial'),
+        ),
+        migrations.AddConstraint(
+            model_name='sommet',
+            constraint=models.UniqueConstraint(condition=models.Q(('type', 'final')), fields=('graph',), name='sommet_single_final'),
+        ),
+    ]
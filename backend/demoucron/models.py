@@ -1,10 +1,66 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q, Case, When, Value, Count, OuterRef, Subquery, Prefetch
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 
+from helper import encode_snapshot, query_arcs
+from timing import phase
+
+# Ordre des sommets dans la matrice : initial, puis normaux, puis final
+SOMMET_TYPE_RANK = Case(
+    When(type='initial', then=Value(0)),
+    When(type='final', then=Value(2)),
+    default=Value(1),
+)
+
+def _count_subquery(model):
+    counts = model.objects.filter(graph=OuterRef('pk')).order_by().values('graph').annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts), 0)
+
+class GraphQuerySet(models.QuerySet):
+    def with_counts(self):
+        # Sous-requêtes corrélées : évite le produit sommets × arcs de deux jointures
+        return self.annotate(sommet_count=_count_subquery(Sommet), arc_count=_count_subquery(Arc))
+
+    def with_contents(self):
+        # Sommets triés par type en une requête, arcs avec leurs extrémités en une autre
+        return self.prefetch_related(
+            Prefetch('sommets', queryset=Sommet.objects.order_by(SOMMET_TYPE_RANK, 'id'), to_attr='ordered_sommets'),
+            Prefetch('arcs', queryset=Arc.objects.select_related('source', 'target').order_by('id')),
+        )
+
+class GraphManager(models.Manager.from_queryset(GraphQuerySet)):
+    def get_queryset(self):
+        # L'instantané binaire peut peser plusieurs Mo : il n'est lu que par Graph.read_snapshot
+        return super().get_queryset().defer('snapshot')
+
 # Models
 class Graph(models.Model):
     name = models.CharField(max_length=100, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Incrémentée à chaque modification des sommets ou des arcs (sert d'ETag et de clé de cache)
+    revision = models.PositiveIntegerField(default=0)
+    # Sommets et arcs au format CSR (helper.encode_snapshot), valable tant que snapshot_revision == revision :
+    # reconstruit par bump_revision, dans la transaction de chaque modification
+    snapshot = models.BinaryField(null=True)
+    snapshot_revision = models.PositiveIntegerField(null=True)
+
+    objects = GraphManager()
+
+    @staticmethod
+    def bump_revision(graph_id):
+        # Appelée dans la transaction de chaque modification des sommets ou des arcs : l'instantané est reconstruit
+        # pour la nouvelle révision (deux requêtes de lecture et une écriture), les lectures n'écrivent jamais
+        Graph.objects.filter(pk=graph_id).update(revision=F('revision') + 1)
+        node_names, node_types, arcs, arc_count = query_arcs(Graph(pk=graph_id))
+        with phase('snapshot_store'):
+            data = encode_snapshot(node_names, node_types, arcs, arc_count)
+        Graph.objects.filter(pk=graph_id).update(snapshot=data, snapshot_revision=F('revision'))
+
+    def read_snapshot(self):
+        # Instantané de la révision courante (en base), ou None s'il est absent ou périmé
+        return (Graph.objects.filter(pk=self.pk, snapshot_revision=F('revision'))
+                .values_list('snapshot', flat=True).first())
 
     def __str__(self):
         return self.name
@@ -23,21 +79,39 @@ class Sommet(models.Model):
     x = models.FloatField(default=0.0)  # Position x
     y = models.FloatField(default=0.0)  # Position y
 
-    def clean(self):
-        if self.type == 'initial':
-            if Sommet.objects.filter(graph=self.graph, type='initial').exclude(pk=self.pk).exists():
-                raise ValidationError("Un graphe ne peut avoir qu'un seul nœud initial.")
-        if self.type == 'final':
-            if Sommet.objects.filter(graph=self.graph, type='final').exclude(pk=self.pk).exists():
-                raise ValidationError("Un graphe ne peut avoir qu'un seul nœud final.")
-
     def save(self, *args, **kwargs):
-        self.clean()
-        super().save(*args, **kwargs)
+        # Un seul nœud initial et un seul nœud final par graphe, noms uniques : vérifiés par les contraintes
+        # de la base, sans requête préalable ; la cause n'est recherchée qu'en cas d'échec
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                Graph.bump_revision(self.graph_id)
+        except IntegrityError as exc:
+            raise ValidationError(self._violation_message()) from exc
+
+    def _violation_message(self):
+        if Sommet.objects.filter(graph_id=self.graph_id, name=self.name).exclude(pk=self.pk).exists():
+            return f"Le nom '{self.name}' existe déjà dans le graphe."
+        if self.type in ('initial', 'final'):
+            return f"Un graphe ne peut avoir qu'un seul nœud {self.type}."
+        return "Sommet incompatible avec le graphe."
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Graph.bump_revision(self.graph_id)
+        return result
 
     class Meta:
         db_table = "sommet"
         unique_together = ('graph', 'name')
+        indexes = [
+            models.Index(fields=['graph', 'type'], name='sommet_graph_type_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['graph'], condition=Q(type='initial'), name='sommet_single_initial'),
+            models.UniqueConstraint(fields=['graph'], condition=Q(type='final'), name='sommet_single_final'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.type})"
@@ -49,21 +123,37 @@ class Arc(models.Model):
     weight = models.FloatField(default=1.0)
 
     def clean(self):
+        # Vérifications en mémoire sur les sommets déjà chargés, sans requête
         if self.target.type == 'initial':
             raise ValidationError("Un nœud initial ne peut pas avoir d'arêtes entrantes.")
         if self.source.type == 'final':
             raise ValidationError("Un nœud final ne peut pas avoir d'arêtes sortantes.")
-        if self.source.graph != self.graph or self.target.graph != self.graph:
+        if self.source.graph_id != self.graph_id or self.target.graph_id != self.graph_id:
             raise ValidationError("La source et la cible doivent appartenir au même graphe.")
-        if self.source == self.target:
+        if self.source_id == self.target_id:
             raise ValidationError("La source et la cible ne peuvent pas être le même nœud.")
 
     def save(self, *args, **kwargs):
         self.clean()
-        super().save(*args, **kwargs)
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                Graph.bump_revision(self.graph_id)
+        except IntegrityError as exc:
+            raise ValidationError("Un arc relie déjà ces deux sommets.") from exc
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Graph.bump_revision(self.graph_id)
+        return result
 
     def __str__(self):
         return f"{self.source.name} -> {self.target.name} ({self.weight})"
 
     class Meta:
-        db_table = "arc"
\ No newline at end of file
+        db_table = "arc"
+        # Un arc au plus par couple (source, cible) ; l'index unique sert aussi aux recherches par extrémités
+        constraints = [
+            models.UniqueConstraint(fields=['graph', 'source', 'target'], name='arc_unique_pair'),
+        ]
\ No newline at end of file
@@ -0,0 +1,53 @@
+import io
+
+import numpy as np
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+NPY_MAGIC = b'\x93NUMPY'
+NPZ_MAGIC = b'PK'
+
+
+def _load(stream, magic, extension):
+    # magic : signature attendue en tête du corps (tableau .npy ou archive zip .npz)
+    content = stream.read()
+    if not content.startswith(magic):
+        raise ParseError(f"Le corps n'est pas au format {extension}")
+    try:
+        return np.load(io.BytesIO(content), allow_pickle=False)
+    except (ValueError, OSError) as exc:
+        raise ParseError(f'Fichier numpy invalide : {exc}')
+
+
+class NPZParser(BaseParser):
+    # Archive .npz (np.savez) : 'matrix' (float64, NaN ou inf pour l'absence d'arc), 'node_names' et,
+    # facultativement, 'method' ; les données ont la même forme que le corps JSON
+    media_type = 'application/x-npz'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        archive = _load(stream, NPZ_MAGIC, '.npz')
+        if 'matrix' not in archive.files or 'node_names' not in archive.files:
+            raise ParseError("L'archive doit contenir les tableaux 'matrix' et 'node_names'")
+        data = {
+            'matrix': archive['matrix'],
+            'node_names': [str(name) for name in archive['node_names'].tolist()],
+        }
+        if 'method' in archive.files:
+            data['method'] = str(archive['method'])
+        return data
+
+
+class NPYParser(BaseParser):
+    # Tableau .npy (np.save) contenant seulement la matrice ; les noms des nœuds ('node_names=A,B,C')
+    # et la méthode sont passés dans l'URL
+    media_type = 'application/x-npy'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        matrix = _load(stream, NPY_MAGIC, '.npy')
+        query_params = parser_context['request'].query_params
+        node_names = [name for name in query_params.get('node_names', '').split(',') if name]
+        return {
+            'matrix': matrix,
+            'node_names': node_names,
+            'method': query_params.get('method', 'min'),
+        }
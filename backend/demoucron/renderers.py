@@ -0,0 +1,113 @@
+import io
+import json
+import math
+
+import numpy as np
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    # Sans orjson, les réponses passent par l'encodeur de la bibliothèque standard (plus lent, même résultat)
+    orjson = None
+
+# Tableaux numpy sérialisés nativement ; inf et NaN deviennent null, sans passer par un tableau d'objets
+ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+
+class NumpyJSONEncoder(JSONEncoder):
+    # Encodeur de repli : les tableaux deviennent des listes, inf et NaN des None
+    def default(self, obj):
+        if isinstance(obj, np.ndarray):
+            if obj.dtype.kind == 'f':
+                return np.where(np.isfinite(obj), obj, None).tolist()
+            return obj.tolist()
+        return super().default(obj)
+
+
+_fallback_encoder = NumpyJSONEncoder()
+
+
+def _finite_or_none(data):
+    # Pour les encodeurs de la bibliothèque standard (allow_nan=False) : les flottants inf et NaN hors tableaux
+    # numpy deviennent None, comme avec orjson
+    if isinstance(data, float):
+        return data if math.isfinite(data) else None
+    if isinstance(data, dict):
+        return {key: _finite_or_none(value) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [_finite_or_none(value) for value in data]
+    return data
+
+
+def _orjson_default(obj):
+    # orjson n'accepte que les tableaux contigus de nombres ou de booléens (vues transposées, tranches de colonnes...)
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind in 'biuf':
+            return np.ascontiguousarray(obj)
+        return obj.tolist()
+    return _fallback_encoder.default(obj)
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=_orjson_default, option=ORJSON_OPTIONS)
+    return json.dumps(_finite_or_none(data), cls=NumpyJSONEncoder, ensure_ascii=False, allow_nan=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def ndjson_line(data):
+    return dumps(data) + b'\n'
+
+
+class FastJSONRenderer(JSONRenderer):
+    # Renderer JSON par défaut : les vues renvoient les matrices sous forme de tableaux numpy, converties ici en une
+    # passe par orjson. Avec une indentation demandée (API navigable, 'application/json; indent=4'), repli sur
+    # l'encodeur de DRF étendu aux tableaux
+    encoder_class = NumpyJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(_finite_or_none(data), accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class NDJSONRenderer(BaseRenderer):
+    # Les exécutions en flux sont envoyées directement par les vues (StreamingHttpResponse) ;
+    # ce renderer sert à la négociation du format et aux réponses d'erreur (une seule ligne)
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return ndjson_line(data)
+
+
+class NPZRenderer(BaseRenderer):
+    # Archive .npz non compressée : les tableaux numpy sont écrits tels quels (float64, inf pour l'absence d'arc),
+    # les autres valeurs (chaînes, dictionnaires d'erreurs) sous forme de chaîne JSON
+    media_type = 'application/x-npz'
+    format = 'npz'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        arrays = {}
+        for key, value in data.items():
+            if isinstance(value, np.ndarray):
+                arrays[key] = value
+            elif isinstance(value, str):
+                arrays[key] = np.array(value)
+            else:
+                arrays[key] = np.array(json.dumps(value, cls=NumpyJSONEncoder, ensure_ascii=False))
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return buffer.getvalue()
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Graph, Sommet, Arc
+from rest_framework.fields import empty
+from .models import Graph, Sommet, Arc, SOMMET_TYPE_RANK
 
 class SommetSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,13 +20,116 @@ class GraphSerializer(serializers.ModelSerializer):
     arcs = ArcSerializer(many=True, read_only=True)
 
     def get_sommets(self, obj):
-        sommets = obj.sommets.all()
-        initial = sommets.filter(type='initial')
-        normal = sommets.filter(type='normal')
-        final = sommets.filter(type='final')
-        ordered_sommets = list(initial) + list(normal) + list(final)
+        # Utilise les sommets préchargés par Graph.objects.with_contents() quand ils existent
+        ordered_sommets = getattr(obj, 'ordered_sommets', None)
+        if ordered_sommets is None:
+            ordered_sommets = obj.sommets.order_by(SOMMET_TYPE_RANK, 'id')
         return SommetSerializer(ordered_sommets, many=True).data
 
     class Meta:
         model = Graph
-        fields = ['id', 'name', 'sommets', 'arcs']
\ No newline at end of file
+        fields = ['id', 'name', 'sommets', 'arcs']
+
+class GraphSummarySerializer(serializers.ModelSerializer):
+    sommet_count = serializers.IntegerField(read_only=True)
+    arc_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Graph
+        fields = ['id', 'name', 'created_at', 'revision', 'sommet_count', 'arc_count']
+
+class BulkRowsField(serializers.Field):
+    # Liste d'objets validés champ par champ, sans instancier un sérialiseur imbriqué par élément :
+    # pour des milliers d'arcs, c'est l'essentiel du temps de validation
+    default_error_messages = {
+        'not_a_list': "Une liste d'objets est attendue.",
+    }
+
+    def __init__(self, row_fields, **kwargs):
+        self.row_fields = row_fields
+        super().__init__(**kwargs)
+
+    def bind(self, field_name, parent):
+        super().bind(field_name, parent)
+        for name, field in self.row_fields.items():
+            field.bind(name, self)
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            self.fail('not_a_list')
+        rows = []
+        errors = {}
+        for index, item in enumerate(data):
+            if not isinstance(item, dict):
+                errors[index] = [self.error_messages['not_a_list']]
+                continue
+            row = {}
+            for name, field in self.row_fields.items():
+                try:
+                    row[name] = field.run_validation(item.get(name, empty))
+                except serializers.ValidationError as exc:
+                    errors.setdefault(index, {})[name] = exc.detail
+            rows.append(row)
+        if errors:
+            raise serializers.ValidationError(errors)
+        return rows
+
+    def to_representation(self, value):
+        return value
+
+class GraphBulkSerializer(serializers.Serializer):
+    sommets = BulkRowsField({
+        'name': serializers.CharField(max_length=50),
+        'type': serializers.ChoiceField(choices=['normal', 'initial', 'final']),
+        'x': serializers.FloatField(default=0.0),
+        'y': serializers.FloatField(default=0.0),
+    }, default=list)
+    arcs = BulkRowsField({
+        'source': serializers.CharField(max_length=50),
+        'target': serializers.CharField(max_length=50),
+        'weight': serializers.FloatField(default=1.0),
+    }, default=list)
+    replace = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        # Mêmes règles que les contraintes de Sommet et Arc.clean(), vérifiées en mémoire sur tout le lot
+        # contre les sommets déjà présents (contexte 'existing' : {nom: type})
+        existing = {} if data['replace'] else self.context['existing']
+        types = dict(existing)
+
+        # Un sommet déjà présent avec le même type est repris tel quel (coordonnées mises à jour) : réimporter
+        # le même contenu ne crée aucun doublon
+        sommet_errors = []
+        listed = set()
+        for index, sommet in enumerate(data['sommets']):
+            name = sommet['name']
+            if name in listed:
+                sommet_errors.append(f"Sommet {index} : le nom '{name}' apparaît plusieurs fois dans le lot.")
+                continue
+            listed.add(name)
+            if name in existing and existing[name] != sommet['type']:
+                sommet_errors.append(f"Sommet {index} : le nom '{name}' existe déjà dans le graphe "
+                                     f"avec le type '{existing[name]}'.")
+                continue
+            types[name] = sommet['type']
+        for node_type, label in (('initial', 'initial'), ('final', 'final')):
+            if list(types.values()).count(node_type) > 1:
+                sommet_errors.append(f"Un graphe ne peut avoir qu'un seul nœud {label}.")
+        if sommet_errors:
+            raise serializers.ValidationError({'sommets': sommet_errors})
+
+        arc_errors = []
+        for index, arc in enumerate(data['arcs']):
+            source_type = types.get(arc['source'])
+            target_type = types.get(arc['target'])
+            if source_type is None or target_type is None:
+                arc_errors.append(f"Arc {index} : sommet source ou cible introuvable.")
+            elif target_type == 'initial':
+                arc_errors.append(f"Arc {index} : un nœud initial ne peut pas avoir d'arêtes entrantes.")
+            elif source_type == 'final':
+                arc_errors.append(f"Arc {index} : un nœud final ne peut pas avoir d'arêtes sortantes.")
+            elif arc['source'] == arc['target']:
+                arc_errors.append(f"Arc {index} : la source et la cible ne peuvent pas être le même nœud.")
+        if arc_errors:
+            raise serializers.ValidationError({'arcs': arc_errors})
+        return data
@@ -1,3 +1,1024 @@
-from django.test import TestCase
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from helper import (
+    NegativeCycleError, all_pairs, arcs_to_adjacency_lists, blocked_all_pairs, dag_all_pairs, dag_paths,
+    decode_delta_steps, demoucron_algorithm, demoucron_arrays, has_negative_cycle_between, insert_arc, load_arcs,
+    matrix_to_arcs, matrix_to_list, query_arcs, shortest_path, topological_levels
+)
+from .cache import graph_state_key, is_cacheable, result_cache, stats_cache
+from . import admission, jobs, renderers
+from .models import Arc, Graph, Sommet
+from .views import get_graph_state
+
+
+def reference_demoucron(matrix, method='min'):
+    # Boucle de Demoucron d'origine (trois boucles imbriquées, diagonale jamais relaxée) : référence des noyaux
+    absent = np.inf if method == 'min' else -np.inf
+    current = [[absent if value is None else float(value) for value in row] for row in matrix]
+    n = len(current)
+    predecessors = [[i if current[i][j] != np.inf and i != j else -1 for j in range(n)] for i in range(n)]
+    for k in range(n):
+        for i in range(n):
+            for j in range(n):
+                if i == j or current[i][k] == np.inf or current[k][j] == np.inf:
+                    continue
+                candidate = current[i][k] + current[k][j]
+                if method == 'min':
+                    improved = candidate < current[i][j]
+                else:
+                    improved = candidate > current[i][j] and candidate != np.inf
+                if improved:
+                    current[i][j] = candidate
+                    predecessors[i][j] = predecessors[k][j]
+    return np.array(current), np.array(predecessors)
+
+
+def random_matrix(rng, n, method='min', density=0.4, low=-2, high=6):
+    # Poids entiers sur un petit intervalle (beaucoup d'égalités), arcs négatifs, sommets isolés possibles
+    matrix = [[None] * n for _ in range(n)]
+    for i in range(n):
+        matrix[i][i] = 0
+        for j in range(n):
+            if i != j and rng.random() < density:
+                matrix[i][j] = int(rng.integers(low, high))
+    return matrix
+
+
+def random_dag_matrix(rng, n, density=0.4, low=-2, high=6):
+    # Arcs uniquement de i vers j > i : aucun circuit, donc aucun circuit absorbant en min comme en max
+    matrix = [[None] * n for _ in range(n)]
+    for i in range(n):
+        matrix[i][i] = 0
+        for j in range(i + 1, n):
+            if rng.random() < density:
+                matrix[i][j] = int(rng.integers(low, high))
+    return matrix
+
+
+def to_float_matrix(matrix):
+    return np.array([[np.inf if value is None else value for value in row] for row in matrix], dtype=float)
+
+
+def reference_path(distances, predecessors, node_names, start, end):
+    if distances[start][end] == np.inf or predecessors[start][end] == -1:
+        return []
+    path = [node_names[end]]
+    current = end
+    while current != start:
+        current = predecessors[start][current]
+        path.append(node_names[current])
+    path.reverse()
+    return path
+
+
+def assert_paths_have_length(test, matrix, distances, predecessors):
+    # Chaque chemin reconstruit depuis les prédécesseurs a la longueur de la distance calculée
+    n = len(matrix)
+    for i in range(n):
+        for j in range(n):
+            if i == j or not np.isfinite(distances[i][j]):
+                continue
+            path = [j]
+            while path[-1] != i:
+                path.append(predecessors[i][path[-1]])
+                test.assertLessEqual(len(path), n)
+            path.reverse()
+            test.assertEqual(sum(matrix[a][b] for a, b in zip(path, path[1:])), distances[i][j])
+
+
+class KernelEquivalenceTests(TestCase):
+    def test_vectorized_kernel_matches_reference(self):
+        # Même arithmétique que la boucle d'origine : distances et prédécesseurs identiques, y compris
+        # avec égalités, arcs négatifs (et circuits négatifs) et sommets inaccessibles
+        rng = np.random.default_rng(1)
+        for method in ('min', 'max'):
+            for n in (1, 2, 5, 9, 14):
+                for density in (0.15, 0.5):
+                    matrix = random_matrix(rng, n, method, density)
+                    expected, expected_predecessors = reference_demoucron(matrix, method)
+                    distances, predecessors, _, _ = demoucron_arrays(matrix, method, trace='summary')
+                    np.testing.assert_array_equal(distances, expected)
+                    np.testing.assert_array_equal(predecessors, expected_predecessors)
+
+    def test_traced_run_matches_reference(self):
+        rng = np.random.default_rng(2)
+        for method in ('min', 'max'):
+            for trace in ('summary', 'steps', 'full'):
+                matrix = random_dag_matrix(rng, 8) if method == 'max' else random_matrix(rng, 8, low=0)
+                node_names = [f'S{i}' for i in range(8)]
+                expected, expected_predecessors = reference_demoucron(matrix, method)
+                steps, paths, final_matrix = demoucron_algorithm(matrix, node_names, method, trace=trace)
+                np.testing.assert_array_equal(final_matrix, expected)
+                self.assertEqual(len(steps), 8 if trace == 'summary' else 9)
+                path = reference_path(expected, expected_predecessors, node_names, 0, 7)
+                self.assertEqual(paths, {'S0-S7': path} if path else {})
+
+    def test_untraced_run_matches_reference_distances(self):
+        # Sans trace (noyau par tuiles), l'ordre des relaxations change : distances identiques, et le chemin
+        # renvoyé a bien la longueur optimale
+        rng = np.random.default_rng(3)
+        for method in ('min', 'max'):
+            for n in (3, 7, 12):
+                matrix = random_dag_matrix(rng, n) if method == 'max' else random_matrix(rng, n, low=0)
+                node_names = [f'S{i}' for i in range(n)]
+                expected, _ = reference_demoucron(matrix, method)
+                _, paths, final_matrix = demoucron_algorithm(matrix, node_names, method, trace='none')
+                np.testing.assert_array_equal(final_matrix, expected)
+                path = paths.get(f'S0-S{n - 1}')
+                if path and np.isfinite(expected[0][n - 1]):
+                    indices = [node_names.index(name) for name in path]
+                    self.assertEqual(sum(matrix[a][b] for a, b in zip(indices, indices[1:])), expected[0][n - 1])
+
+    def test_blocked_kernel_matches_reference(self):
+        # Petits blocs et petites bandes pour traverser tous les cas du découpage ; poids entiers, donc float32 exact
+        rng = np.random.default_rng(6)
+        for method in ('min', 'max'):
+            for n in (1, 5, 13, 30):
+                for dtype in (np.float64, np.float32):
+                    if method == 'min' and n % 2:
+                        matrix = random_matrix(rng, n, low=0)
+                    else:
+                        matrix = random_dag_matrix(rng, n)
+                    expected, _ = reference_demoucron(matrix, method)
+                    result = blocked_all_pairs(matrix, method, dtype, block=4, cache_bytes=n * 40)
+                    self.assertIsNotNone(result)
+                    distances, predecessors = result
+                    self.assertEqual(distances.dtype, dtype)
+                    np.testing.assert_array_equal(distances, expected)
+                    assert_paths_have_length(self, matrix, distances, predecessors)
+
+        # Circuit absorbant : le noyau par tuiles refuse, la boucle de référence est utilisée
+        self.assertIsNone(blocked_all_pairs([[0, 1], [-2, 0]], 'min'))
+        self.assertIsNone(blocked_all_pairs([[0, 1], [2, 0]], 'max'))
+
+    def test_threaded_kernel_identical_to_serial(self):
+        # Chaque case n'est modifiée que par un thread, dans le même ordre des k : résultat identique, bit à bit
+        rng = np.random.default_rng(7)
+        for method in ('min', 'max'):
+            for n in (17, 40):
+                matrix = random_matrix(rng, n, density=0.2, low=0) if method == 'min' else random_dag_matrix(rng, n, 0.2)
+                serial = blocked_all_pairs(matrix, method, block=4, cache_bytes=n * 40)
+                for workers in (2, 4):
+                    threaded = blocked_all_pairs(matrix, method, block=4, cache_bytes=n * 40, workers=workers)
+                    np.testing.assert_array_equal(threaded[0], serial[0])
+                    np.testing.assert_array_equal(threaded[1], serial[1])
+                _, _, final_matrix = demoucron_algorithm(matrix, [f'S{i}' for i in range(n)], method, trace='none',
+                                                         workers=4)
+                np.testing.assert_array_equal(final_matrix, reference_demoucron(matrix, method)[0])
+
+    def test_delta_steps_decode_to_full_steps(self):
+        # L'encodage en différence ne perd rien : décodé, il redonne les étapes complètes (matrices avec cases
+        # infinies et poids négatifs, arcs, calculs), en min comme en max
+        rng = np.random.default_rng(8)
+        for method in ('min', 'max'):
+            for trace in ('steps', 'full'):
+                for n in (1, 4, 9):
+                    matrix = random_matrix(rng, n, method, 0.3)
+                    node_names = [f'S{i}' for i in range(n)]
+                    full, _, _ = demoucron_algorithm(matrix, node_names, method, trace=trace)
+                    delta, _, _ = demoucron_algorithm(matrix, node_names, method, trace=trace, encoding='delta')
+                    self.assertEqual(list(decode_delta_steps(delta, node_names)),
+                                     [{**step, 'matrix': matrix_to_list(step['matrix'])} for step in full])
+
+    def test_incremental_arc_insertion_matches_full_run(self):
+        # Ajouts d'arcs et baisses de poids successifs : l'état mis à jour en O(n²) a les distances d'un calcul complet
+        rng = np.random.default_rng(4)
+        for _ in range(5):
+            n = 10
+            matrix = random_matrix(rng, n, density=0.2, low=1, high=9)
+            distances, predecessors = all_pairs(matrix)
+            for _ in range(15):
+                u, v = rng.choice(n, 2, replace=False)
+                weight = int(rng.integers(0, 9))
+                if matrix[u][v] is not None and weight > matrix[u][v]:
+                    continue
+                matrix[u][v] = weight
+                self.assertTrue(insert_arc(distances, predecessors, u, v, weight))
+                np.testing.assert_array_equal(distances, all_pairs(matrix)[0])
+                assert_paths_have_length(self, matrix, distances, predecessors)
+
+    def test_dag_engine_matches_reference(self):
+        # Moteur DAG en O(V + E) : même distance initial -> final que la boucle de référence, niveaux compatibles
+        # avec les arcs, dates au plus tôt égales aux plus longs chemins depuis le nœud initial
+        rng = np.random.default_rng(5)
+        for n in (2, 6, 11, 17):
+            for density in (0.15, 0.5):
+                matrix = random_dag_matrix(rng, n, density)
+                node_names = [f'S{i}' for i in range(n)]
+                adjacency = arcs_to_adjacency_lists(n, matrix_to_arcs(to_float_matrix(matrix)))
+                levels = topological_levels(adjacency)
+                self.assertIsNotNone(levels)
+                level_of = {name: depth for depth, level in enumerate(levels) for name in level.tolist()}
+                sources, targets, _ = matrix_to_arcs(to_float_matrix(matrix))
+                self.assertTrue(all(level_of[a] < level_of[b] for a, b in zip(sources, targets)))
+                longest, _ = reference_demoucron(matrix, 'max')
+                for method in ('min', 'max'):
+                    expected, _ = reference_demoucron(matrix, method)
+                    result = dag_paths(adjacency, node_names, levels, method)
+                    distance = expected[0][n - 1]
+                    self.assertEqual(result['distance'], distance if np.isfinite(distance) else None)
+                    path = result['paths'].get(f'S0-S{n - 1}')
+                    self.assertEqual(path is not None, bool(np.isfinite(distance)))
+                    if path:
+                        indices = [node_names.index(name) for name in path]
+                        self.assertEqual(sum(matrix[a][b] for a, b in zip(indices, indices[1:])), distance)
+                    self.assertEqual(list(result['earliest'].values()),
+                                     [value if np.isfinite(value) else None for value in longest[0]])
+
+    def test_dag_all_pairs_matches_reference(self):
+        # Matrice de toutes les paires d'un DAG, sommets dans un ordre quelconque (pas nécessairement topologique)
+        rng = np.random.default_rng(10)
+        for method in ('min', 'max'):
+            for n in (1, 2, 8, 19):
+                for dtype in (np.float64, np.float32):
+                    dag = random_dag_matrix(rng, n, 0.3)
+                    order = rng.permutation(n)
+                    matrix = [[dag[i][j] for j in order] for i in order]
+                    adjacency = arcs_to_adjacency_lists(n, matrix_to_arcs(to_float_matrix(matrix)))
+                    distances = dag_all_pairs(adjacency, topological_levels(adjacency), method, dtype)
+                    self.assertEqual(distances.dtype, dtype)
+                    np.testing.assert_array_equal(distances, reference_demoucron(matrix, method)[0])
+
+        # Un circuit : pas de niveaux, le moteur matriciel reste utilisé
+        matrix = [[0, 1, None], [None, 0, 1], [1, None, 0]]
+        self.assertIsNone(topological_levels(arcs_to_adjacency_lists(3, matrix_to_arcs(to_float_matrix(matrix)))))
+
+    def test_sparse_engine_matches_reference(self):
+        # Dijkstra (poids positifs) et Bellman-Ford (arcs négatifs, circuits de poids positif) : même distance
+        # initial -> final que la boucle de référence, et un chemin de cette longueur
+        rng = np.random.default_rng(9)
+        for negative in (False, True):
+            for n in (2, 7, 15):
+                for density in (0.1, 0.3):
+                    matrix = random_dag_matrix(rng, n, density, low=-3 if negative else 0)
+                    # Arcs « retour » assez lourds pour que tout circuit reste de poids positif
+                    for i in range(n):
+                        for j in range(i):
+                            if rng.random() < density / 2:
+                                matrix[i][j] = int(rng.integers(3 * n, 4 * n))
+                    node_names = [f'S{i}' for i in range(n)]
+                    expected, _ = reference_demoucron(matrix, 'min')
+                    adjacency = arcs_to_adjacency_lists(n, matrix_to_arcs(to_float_matrix(matrix)))
+                    paths, distance, algorithm = shortest_path(adjacency, node_names)
+                    has_negative = any(value is not None and value < 0 for row in matrix for value in row)
+                    self.assertEqual(algorithm, 'bellman-ford' if has_negative else 'dijkstra')
+                    target = expected[0][n - 1]
+                    self.assertEqual(distance, target if np.isfinite(target) else None)
+                    path = paths.get(f'S0-S{n - 1}')
+                    self.assertEqual(path is not None, bool(np.isfinite(target)))
+                    if path:
+                        indices = [node_names.index(name) for name in path]
+                        self.assertEqual(sum(matrix[a][b] for a, b in zip(indices, indices[1:])), target)
+
+    def test_negative_cycle_flagged_only_between_initial_and_final(self):
+        # S0 -> S1 -> S3 ; circuit absorbant S1 <-> S2 : accessible depuis S0, mais ne mène à S3 que s'il passe par S1
+        matrix = [[0, 1, None, None], [None, 0, 1, 2], [None, -3, 0, None], [None, None, None, 0]]
+        adjacency = arcs_to_adjacency_lists(4, matrix_to_arcs(to_float_matrix(matrix)))
+        distances = reference_demoucron(matrix)[0]
+        with self.assertRaises(NegativeCycleError):
+            shortest_path(adjacency, ['S0', 'S1', 'S2', 'S3'])
+        self.assertTrue(has_negative_cycle_between(distances, 0, 3))
+
+        # Circuit S1 <-> S2 qui ne mène plus au nœud final : ignoré par les deux moteurs
+        matrix = [[0, 1, None, 5], [None, 0, 1, None], [None, -3, 0, None], [None, None, None, 0]]
+        adjacency = arcs_to_adjacency_lists(4, matrix_to_arcs(to_float_matrix(matrix)))
+        distances = reference_demoucron(matrix)[0]
+        self.assertEqual(shortest_path(adjacency, ['S0', 'S1', 'S2', 'S3'])[:2], ({'S0-S3': ['S0', 'S3']}, 5))
+        self.assertFalse(has_negative_cycle_between(distances, 0, 3))
+        self.assertEqual(distances[0][3], 5)
+
+
+class ConstraintTests(TestCase):
+    def setUp(self):
+        self.graph = Graph.objects.create(name='g')
+        self.a = Sommet.objects.create(graph=self.graph, name='A', type='initial')
+        self.b = Sommet.objects.create(graph=self.graph, name='B', type='final')
+
+    def test_single_initial_and_final(self):
+        for node_type in ('initial', 'final'):
+            with self.assertRaisesMessage(ValidationError, f"un seul nœud {node_type}"):
+                Sommet.objects.create(graph=self.graph, name=f'X{node_type}', type=node_type)
+        with self.assertRaisesMessage(ValidationError, "existe déjà"):
+            Sommet.objects.create(graph=self.graph, name='A', type='normal')
+        # Les contraintes sont propres à chaque graphe ; les sommets normaux ne sont pas limités
+        other = Graph.objects.create(name='h')
+        Sommet.objects.create(graph=other, name='A', type='initial')
+        Sommet.objects.create(graph=self.graph, name='C', type='normal')
+        Sommet.objects.create(graph=self.graph, name='D', type='normal')
+
+    def test_single_arc_per_pair(self):
+        Arc.objects.create(graph=self.graph, source=self.a, target=self.b, weight=2)
+        revision = Graph.objects.get(pk=self.graph.pk).revision
+        with self.assertRaisesMessage(ValidationError, "Un arc relie déjà"):
+            Arc.objects.create(graph=self.graph, source=self.a, target=self.b, weight=5)
+        # L'échec n'a laissé ni arc ni nouvelle révision
+        self.assertEqual(list(self.graph.arcs.values_list('weight', flat=True)), [2])
+        self.assertEqual(Graph.objects.get(pk=self.graph.pk).revision, revision)
+
+
+class LoadArcsTests(TestCase):
+    def test_arcs_indexed_by_graph_nodes(self):
+        # Sommets de deux graphes entrelacés, dont un identifiant très grand : les arcs sont indexés d'après
+        # les seuls sommets du graphe, sans tableau dimensionné par le plus grand identifiant de la table
+        graph, other = Graph.objects.create(name='g'), Graph.objects.create(name='h')
+        c = Sommet.objects.create(graph=graph, name='C', type='final')
+        Sommet.objects.create(graph=other, name='X', type='initial')
+        b = Sommet.objects.create(id=10 ** 12, graph=graph, name='B', type='normal')
+        a = Sommet.objects.create(graph=graph, name='A', type='initial')
+        Arc.objects.create(graph=graph, source=a, target=b, weight=2.5)
+        Arc.objects.create(graph=graph, source=b, target=c, weight=-1)
+        Arc.objects.create(graph=graph, source=a, target=c, weight=4)
+
+        node_names, node_types, (sources, targets, weights), arc_count = load_arcs(Graph.objects.get(pk=graph.pk))
+        self.assertEqual(node_names, ['A', 'B', 'C'])
+        self.assertEqual(node_types, ['initial', 'normal', 'final'])
+        self.assertEqual(arc_count, 3)
+        self.assertEqual(sources.dtype, np.int64)
+        self.assertEqual(sorted(zip(sources.tolist(), targets.tolist(), weights.tolist())),
+                         [(0, 1, 2.5), (0, 2, 4.0), (1, 2, -1.0)])
+        # Même résultat directement depuis les tables
+        node_names, _, (sources, targets, weights), _ = query_arcs(graph)
+        self.assertEqual(sorted(zip(sources.tolist(), targets.tolist(), weights.tolist())),
+                         [(0, 1, 2.5), (0, 2, 4.0), (1, 2, -1.0)])
+
+    def test_snapshot_refreshed_on_write_and_never_by_reads(self):
+        graph = Graph.objects.create(name='g')
+        a = Sommet.objects.create(graph=graph, name='A', type='initial')
+        b = Sommet.objects.create(graph=graph, name='B', type='final')
+        arc = Arc.objects.create(graph=graph, source=a, target=b, weight=2)
+        graph.refresh_from_db()
+        self.assertEqual(graph.snapshot_revision, graph.revision)
+
+        # Instantané à jour : une seule requête, aucune écriture
+        with self.assertNumQueries(1):
+            self.assertEqual(load_arcs(graph)[2][2].tolist(), [2.0])
+
+        # Écriture faite ailleurs sans passer par save() : l'instantané périmé est ignoré, les tables sont relues
+        # et la lecture ne reconstruit rien
+        Arc.objects.filter(pk=arc.pk).update(weight=7)
+        Graph.objects.filter(pk=graph.pk).update(revision=F('revision') + 1)
+        graph.refresh_from_db()
+        with self.assertNumQueries(3):
+            self.assertEqual(load_arcs(graph)[2][2].tolist(), [7.0])
+        graph.refresh_from_db()
+        self.assertEqual(graph.snapshot_revision, graph.revision - 1)
+
+        # La modification suivante reconstruit l'instantané
+        arc.weight = 5
+        arc.save()
+        graph.refresh_from_db()
+        self.assertEqual(graph.snapshot_revision, graph.revision)
+        with self.assertNumQueries(1):
+            self.assertEqual(load_arcs(graph)[2][2].tolist(), [5.0])
+
+
+class RendererTests(TestCase):
+    def test_non_finite_values_render_as_null(self):
+        # Tableaux numpy (float64, float32, vues non contiguës) et flottants isolés, avec et sans orjson
+        data = {
+            'matrix': np.array([[0, np.inf], [np.nan, -np.inf]]),
+            'column': np.array([[1, np.inf], [2, np.nan]], dtype=np.float32)[:, 1],
+            'distance': float('inf'),
+            'delta': np.float64('nan'),
+            'values': [1.5, float('-inf'), (np.nan, 2)],
+        }
+        expected = {'matrix': [[0, None], [None, None]], 'column': [None, None], 'distance': None, 'delta': None,
+                    'values': [1.5, None, [None, 2]]}
+        for disabled in (False, True):
+            with mock.patch.object(renderers, 'orjson', None if disabled else renderers.orjson):
+                self.assertEqual(json.loads(renderers.FastJSONRenderer().render(data)), expected)
+                self.assertEqual(json.loads(renderers.FastJSONRenderer().render(data, 'application/json; indent=4')),
+                                 expected)
+                line = renderers.NDJSONRenderer().render(data)
+                self.assertTrue(line.endswith(b'\n'))
+                self.assertEqual(json.loads(line), expected)
+
+
+class EndpointTests(TestCase):
+    def setUp(self):
+        result_cache().clear()
+
+    def create_graph(self, nodes, arcs, name='g'):
+        graph_id = self.client.post('/api/graphs/create/', {'name': name}, content_type='application/json').json()['id']
+        for name, node_type in nodes:
+            self.assertEqual(self.add_sommet(graph_id, name, node_type).status_code, 201)
+        for source, target, weight in arcs:
+            self.assertEqual(self.add_arc(graph_id, source, target, weight).status_code, 201)
+        return graph_id
+
+    def add_sommet(self, graph_id, name, node_type):
+        return self.client.post(f'/api/graphs/{graph_id}/add_sommet/', {'name': name, 'type': node_type},
+                                content_type='application/json')
+
+    def add_arc(self, graph_id, source, target, weight):
+        return self.client.post(f'/api/graphs/{graph_id}/add_arc/', {'source': source, 'target': target, 'weight': weight},
+                                content_type='application/json')
+
+    def expected_matrix(self, names, arcs, method='min'):
+        index = {name: i for i, name in enumerate(names)}
+        matrix = [[0 if i == j else None for j in range(len(names))] for i in range(len(names))]
+        for source, target, weight in arcs:
+            matrix[index[source]][index[target]] = weight
+        return matrix_to_list(reference_demoucron(matrix, method)[0])
+
+    def test_run_demoucron_matches_reference(self):
+        arcs = [('A', 'B', 3), ('A', 'C', 1), ('C', 'B', 1), ('B', 'D', 2), ('C', 'D', 5), ('B', 'C', 2)]
+        graph_id = self.create_graph([('A', 'initial'), ('B', 'normal'), ('C', 'normal'), ('E', 'normal'),
+                                      ('D', 'final')], arcs)
+        for trace in ('none', 'summary', 'full'):
+            response = self.client.get(f'/api/graphs/{graph_id}/run_demoucron/?engine=matrix&trace={trace}')
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            node_order = ['A', 'B', 'C', 'E', 'D']
+            self.assertEqual(data['matrix'], self.expected_matrix(node_order, arcs))
+            self.assertEqual(data['paths'], {'A-D': ['A', 'C', 'B', 'D']})
+
+    def test_paths_and_add_arc(self):
+        graph_id = self.create_graph([('A', 'initial'), ('B', 'normal'), ('C', 'final')], [('A', 'B', 3), ('B', 'C', 4)])
+        response = self.client.get(f'/api/graphs/{graph_id}/paths/?pairs=A-C,C-A')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['paths'], {'A-C': ['A', 'B', 'C'], 'C-A': []})
+        self.assertEqual(response.json()['distances'], {'A-C': 7.0, 'C-A': None})
+
+        # Un arc plus court met à jour l'état conservé : même résultat qu'un calcul complet
+        self.assertEqual(self.add_arc(graph_id, 'A', 'C', 5).status_code, 201)
+        response = self.client.get(f'/api/graphs/{graph_id}/paths/?pairs=A-C,C-A')
+        self.assertEqual(response.json()['paths'], {'A-C': ['A', 'C'], 'C-A': []})
+        self.assertEqual(response.json()['distances'], {'A-C': 5.0, 'C-A': None})
+
+    @override_settings(DEMOUCRON_CACHE_MAX_ENTRY_BYTES=64 * 1024)
+    def test_cache_admits_entries_by_estimated_size(self):
+        self.assertTrue(is_cacheable(100, {'trace': 'none'}))
+        self.assertFalse(is_cacheable(100, {'trace': 'full'}))
+        self.assertTrue(is_cacheable(6, {'trace': 'full'}))
+        self.assertFalse(is_cacheable(100, {'trace': 'steps'}, binary=True))
+
+        # Une trace n'est gardée qu'une fois, dans le cache des résultats, pas dans celui du graphe
+        graph_id = self.create_graph([('A', 'initial'), ('B', 'normal'), ('C', 'final')], [('A', 'B', 3), ('B', 'C', 4)])
+        self.assertEqual(self.client.get(f'/api/graphs/{graph_id}/run_demoucron/?engine=matrix').status_code, 200)
+        keys = list(result_cache()._cache)
+        self.assertFalse([key for key in keys if ':demoucron:graph:' in key])
+        self.assertEqual(len([key for key in keys if ':demoucron:result:' in key]), 1)
+
+    def test_graph_state_not_cached_for_stale_revision(self):
+        graph_id = self.create_graph([('A', 'initial'), ('B', 'normal'), ('C', 'final')], [('A', 'B', 3)])
+        graph = Graph.objects.get(pk=graph_id)
+        # Modification concurrente entre la lecture de la révision et le chargement des arcs
+        self.assertEqual(self.add_arc(graph_id, 'B', 'C', 4).status_code, 201)
+        state = get_graph_state(graph)
+        self.assertEqual(state['distances'][0][2], 7)
+        self.assertIsNone(result_cache().get(graph_state_key(graph_id, graph.revision)))
+
+        graph.refresh_from_db()
+        get_graph_state(graph)
+        self.assertIsNotNone(result_cache().get(graph_state_key(graph_id, graph.revision)))
+
+    def test_dag_engine_selected_for_acyclic_graph(self):
+        graph_id = self.create_graph([('A', 'initial'), ('B', 'normal'), ('C', 'normal'), ('D', 'final')],
+                                     [('A', 'B', 3), ('A', 'C', 2), ('B', 'D', 5), ('C', 'D', 1), ('C', 'B', 2)])
+        data = self.client.get(f'/api/graphs/{graph_id}/run_demoucron/?trace=none').json()
+        self.assertEqual(data['engine'], 'dag')
+        self.assertEqual(data['paths'], {'A-D': ['A', 'C', 'D']})
+        self.assertEqual(data['distance'], 3)
+        self.assertEqual(data['earliest'], {'A': 0, 'B': 4, 'C': 2, 'D': 9})
+        self.assertEqual(data['levels'], [['A'], ['C'], ['B'], ['D']])
+
+        data = self.client.get(f'/api/graphs/{graph_id}/run_demoucron/?trace=none&engine=matrix').json()
+        self.assertEqual(data['matrix'][0][3], 3)
+
+    trace_body = {'matrix': [[0, 1, 4], [None, 0, 2], [None, None, 0]], 'node_names': ['A', 'B', 'C'], 'method': 'min'}
+    trace_matrix = [[0, 1, 3], [None, 0, 2], [None, None, 0]]
+
+    def run_trace(self, trace):
+        response = self.client.post(f'/api/matrix_demoucron/?trace={trace}&engine=matrix', self.trace_body,
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['trace'], trace)
+        self.assertEqual(data['matrix'], self.trace_matrix)
+        self.assertEqual(data['paths'], {'A-C': ['A', 'B', 'C']})
+        return data
+
+    def test_trace_none(self):
+        # Matrice finale et chemins seulement
+        data = self.run_trace('none')
+        self.assertNotIn('steps', data)
+        self.assertNotIn('edges', data)
+
+    def test_trace_summary(self):
+        # Une entrée par étape k avec le nombre de cases améliorées, sans matrice
+        data = self.run_trace('summary')
+        self.assertEqual(data['steps'], [{'step': 1, 'intermediate_node': 'A', 'changed': 0},
+                                         {'step': 2, 'intermediate_node': 'B', 'changed': 1},
+                                         {'step': 3, 'intermediate_node': 'C', 'changed': 0}])
+
+    def test_trace_steps(self):
+        # Matrice initiale puis une matrice et ses arcs par étape, sans le détail des calculs
+        data = self.run_trace('steps')
+        self.assertEqual([step['step'] for step in data['steps']], [0, 1, 2, 3])
+        self.assertEqual([step['intermediate_node'] for step in data['steps']], [None, 'A', 'B', 'C'])
+        self.assertEqual(data['steps'][0]['matrix'], [[0, 1, 4], [None, 0, 2], [None, None, 0]])
+        self.assertEqual(data['steps'][-1]['matrix'], self.trace_matrix)
+        self.assertIn({'source': 'A', 'target': 'C', 'weight': 3}, data['steps'][2]['edges'])
+        self.assertTrue(all('calculations' not in step for step in data['steps']))
+
+    def test_trace_full(self):
+        # Les étapes de 'steps', plus les calculs de chaque étape
+        data = self.run_trace('full')
+        self.assertTrue(all(isinstance(step['calculations'], list) for step in data['steps']))
+        self.assertEqual(data['steps'][0]['calculations'], [])
+        self.assertTrue(data['steps'][2]['calculations'])
+        without_calculations = [{key: value for key, value in step.items() if key != 'calculations'}
+                                for step in data['steps']]
+        self.assertEqual(without_calculations, self.run_trace('steps')['steps'])
+
+    def test_matrix_engines_return_same_keys(self):
+        # Sans trace, 'auto', 'dag' et 'matrix' renvoient les mêmes clés et les mêmes valeurs (hors moteur et algorithme)
+        acyclic = [[0, 3, 2, None], [None, 0, None, 5], [None, 2, 0, 1], [None, None, None, 0]]
+        for method in ('min', 'max'):
+            body = {'matrix': acyclic, 'node_names': ['A', 'B', 'C', 'D'], 'method': method}
+            responses = {}
+            for engine in ('auto', 'dag', 'matrix'):
+                for dtype in ('float64', 'float32'):
+                    response = self.client.post(f'/api/matrix_demoucron/?trace=none&engine={engine}&dtype={dtype}', body,
+                                                content_type='application/json')
+                    self.assertEqual(response.status_code, 200)
+                    responses[engine, dtype] = response.json()
+            self.assertEqual(responses['auto', 'float64']['engine'], 'dag')
+            expected = self.expected_matrix(['A', 'B', 'C', 'D'], [('A', 'B', 3), ('A', 'C', 2), ('B', 'D', 5),
+                                                                   ('C', 'D', 1), ('C', 'B', 2)], method)
+            reference = {key: value for key, value in responses['matrix', 'float64'].items()
+                         if key not in ('engine', 'algorithm')}
+            self.assertEqual(reference['matrix'], expected)
+            self.assertEqual(reference['levels'], [['A'], ['C'], ['B'], ['D']])
+            for (engine, dtype), data in responses.items():
+                self.assertEqual(set(data), set(reference) | {'engine', 'algorithm'} | ({'dtype'} if dtype != 'float64' else set()))
+                self.assertEqual({key: value for key, value in data.items() if key not in ('engine', 'algorithm', 'dtype')},
+                                 reference)
+                if dtype != 'float64':
+                    self.assertEqual(data['dtype'], dtype)
+
+        # Avec un circuit : moteur 'matrix', mêmes clés, niveaux et dates à null ; 'dag' explicite refusé
+        cyclic = [[0, 1, None], [None, 0, 1], [None, 1, 0]]
+        body = {'matrix': cyclic, 'node_names': ['A', 'B', 'C'], 'method': 'min'}
+        data = self.client.post('/api/matrix_demoucron/?trace=none', body, content_type='application/json').json()
+        self.assertEqual(data['engine'], 'matrix')
+        self.assertEqual(set(data), set(reference) | {'engine', 'algorithm'})
+        self.assertEqual((data['distance'], data['levels'], data['earliest']), (2, None, None))
+        response = self.client.post('/api/matrix_demoucron/?trace=none&engine=dag', body, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cache_stats_survive_result_eviction(self):
+        stats_cache().clear()
+        body = {'matrix': [[0, 1], [None, 0]], 'node_names': ['A', 'B'], 'method': 'min'}
+        for _ in range(3):
+            self.client.post('/api/matrix_demoucron/?trace=summary&engine=matrix', body, content_type='application/json')
+        expected = {'hits': 2, 'misses': 1}
+        self.assertEqual(self.client.get('/api/cache/stats/').json()['result'], expected)
+
+        # Plus d'entrées que MAX_ENTRIES dans le cache des résultats, puis vidage : les compteurs sont intacts
+        for index in range(300):
+            result_cache().set(f'demoucron:test:{index}', index)
+        self.assertEqual(self.client.get('/api/cache/stats/').json()['result'], expected)
+        result_cache().clear()
+        self.assertEqual(self.client.get('/api/cache/stats/').json()['result'], expected)
+
+    def store_graphs(self, count, n, prefix):
+        # count graphes en chaîne de n sommets, créés directement en base
+        for index in range(count):
+            graph = Graph.objects.create(name=f'{prefix}{index}')
+            types = ['initial'] + ['normal'] * (n - 2) + ['final']
+            sommets = Sommet.objects.bulk_create(
+                Sommet(graph=graph, name=f'N{i}', type=node_type) for i, node_type in enumerate(types)
+            )
+            Arc.objects.bulk_create(Arc(graph=graph, source=source, target=target, weight=1)
+                                    for source, target in zip(sommets, sommets[1:]))
+            Graph.bump_revision(graph.id)
+
+    def test_graph_list_pagination_and_query_count(self):
+        # Même nombre de requêtes pour 7 petits graphes que pour 7 de plus, dix fois plus grands
+        for count, n, prefix in ((7, 3, 'small'), (7, 30, 'large')):
+            self.store_graphs(count, n, prefix)
+            total = Graph.objects.count()
+            with self.assertNumQueries(2):
+                page = self.client.get('/api/graphs/?page_size=5').json()
+            self.assertEqual(page['count'], total)
+            self.assertEqual(len(page['results']), 5)
+            self.assertEqual(set(page['results'][0]), {'id', 'name', 'created_at', 'revision', 'sommet_count', 'arc_count'})
+            self.assertIn('page=2', page['next'])
+            self.assertIn('page_size=5', page['next'])
+            self.assertIsNone(page['previous'])
+
+            with self.assertNumQueries(2):
+                last = self.client.get(page['next'].replace('page=2', f'page={(total + 4) // 5}')).json()
+            self.assertIsNone(last['next'])
+            self.assertEqual(len(last['results']), total - 5 * ((total - 1) // 5))
+            self.assertEqual((last['results'][-1]['sommet_count'], last['results'][-1]['arc_count']), (n, n - 1))
+
+            with self.assertNumQueries(5):
+                expanded = self.client.get('/api/graphs/?page_size=5&expand=1').json()
+            self.assertEqual(len(expanded['results']), 5)
+            self.assertTrue(all('sommets' in graph and 'arcs' in graph for graph in expanded['results']))
+
+            # ETag, graphe avec sommets et arcs, instantané pour la matrice d'adjacence
+            with self.assertNumQueries(5):
+                detail = self.client.get(f"/api/graphs/{last['results'][-1]['id']}/").json()
+            self.assertEqual(len(detail['arcs']), n - 1)
+
+        # Taille de page bornée par max_page_size
+        self.assertEqual(len(self.client.get('/api/graphs/?page_size=100000').json()['results']), 14)
+
+    def test_bulk_import_twice(self):
+        graph_id = self.client.post('/api/graphs/create/', {'name': 'g'}, content_type='application/json').json()['id']
+        payload = {
+            'sommets': [{'name': 'A', 'type': 'initial'}, {'name': 'B', 'type': 'normal', 'x': 1, 'y': 2},
+                        {'name': 'C', 'type': 'final'}],
+            'arcs': [{'source': 'A', 'target': 'B', 'weight': 1}, {'source': 'B', 'target': 'C', 'weight': 2},
+                     {'source': 'A', 'target': 'C', 'weight': 5}],
+        }
+        url = f'/api/graphs/{graph_id}/bulk/'
+        first = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((first.json()['sommets'], first.json()['arcs']), (3, 3))
+
+        # Même contenu, poids et coordonnées modifiés : aucun doublon, les valeurs sont remplacées
+        payload['sommets'][1].update(x=5, y=6)
+        payload['arcs'][0]['weight'] = 4
+        payload['arcs'][2]['weight'] = -1
+        second = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json()['revision'], first.json()['revision'] + 1)
+        self.assertEqual((Sommet.objects.filter(graph_id=graph_id).count(), Arc.objects.filter(graph_id=graph_id).count()),
+                         (3, 3))
+        weights = {(source, target): weight for source, target, weight in
+                   Arc.objects.filter(graph_id=graph_id).values_list('source__name', 'target__name', 'weight')}
+        self.assertEqual(weights, {('A', 'B'): 4.0, ('B', 'C'): 2.0, ('A', 'C'): -1.0})
+        self.assertEqual(Sommet.objects.filter(graph_id=graph_id, name='B').values_list('x', 'y').get(), (5.0, 6.0))
+        # Le calcul suit les nouveaux poids (révision et instantané à jour)
+        self.assertEqual(self.client.get(f'/api/graphs/{graph_id}/run_demoucron/?trace=none&engine=matrix')
+                         .json()['paths'], {'A-C': ['A', 'C']})
+
+        # Un nom existant avec un autre type, ou répété dans le lot, reste refusé
+        retyped = {'sommets': [{'name': 'B', 'type': 'final'}]}
+        self.assertEqual(self.client.post(url, retyped, content_type='application/json').status_code, 400)
+        repeated = {'sommets': [{'name': 'D', 'type': 'normal'}, {'name': 'D', 'type': 'normal'}]}
+        self.assertEqual(self.client.post(url, repeated, content_type='application/json').status_code, 400)
+        self.assertEqual(Sommet.objects.filter(graph_id=graph_id).count(), 3)
+
+    def test_admission_errors(self):
+        body = {'matrix': [[0, 1, None], [None, 0, 2], [None, None, 0]], 'node_names': ['A', 'B', 'C'], 'method': 'min'}
+
+        def post(query):
+            return self.client.post(f'/api/matrix_demoucron/?{query}', body, content_type='application/json')
+
+        # 413 : réponse trop volumineuse pour la trace demandée, avec la trace suggérée ; réessayer n'y changerait rien
+        with override_settings(DEMOUCRON_MAX_RESPONSE_BYTES=200):
+            response = post('trace=full&engine=matrix&on_limit=reject')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()['suggested'], {'trace': 'summary', 'encoding': 'full'})
+        self.assertNotIn('Retry-After', response)
+
+        # 422 : calcul synchrone trop coûteux
+        with override_settings(DEMOUCRON_MAX_RELAX_OPS=26):
+            response = post('trace=summary&engine=matrix')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual((response.json()['estimated_relax_ops'], response.json()['max_relax_ops']), (27, 26))
+        self.assertNotIn('Retry-After', response)
+
+        # 503 : toutes les places de calcul lourd sont occupées ; Retry-After d'au moins une seconde
+        with override_settings(DEMOUCRON_HEAVY_RUN_OPS=0, DEMOUCRON_HEAVY_RUN_WAIT=0.01):
+            heavy = {'relax_ops': 1, 'response_bytes': 0}
+            releases = [admission.acquire(heavy) for _ in range(settings.DEMOUCRON_MAX_HEAVY_RUNS)]
+            try:
+                response = post('trace=summary&engine=matrix')
+            finally:
+                for release in releases:
+                    release()
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '1')
+            self.assertEqual(post('trace=summary&engine=matrix').status_code, 200)
+
+    def test_binary_matrix_with_infinite_missing_arcs(self):
+        # .npz / .npy : NaN, +inf et -inf hors diagonale marquent l'absence d'arc, quelle que soit la méthode
+        for marker in (np.nan, np.inf, -np.inf):
+            matrix = np.full((4, 4), marker)
+            np.fill_diagonal(matrix, 0)
+            matrix[0, 1], matrix[0, 2], matrix[1, 3], matrix[2, 3] = 3, 2, 5, 1
+            for method, path, distance in (('max', ['A', 'B', 'D'], 8), ('min', ['A', 'C', 'D'], 3)):
+                body = io.BytesIO()
+                np.savez(body, matrix=matrix, node_names=np.array(['A', 'B', 'C', 'D']), method=np.array(method))
+                response = self.client.post('/api/matrix_demoucron/?trace=none&engine=matrix', body.getvalue(),
+                                            content_type='application/x-npz')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['paths'], {'A-D': path})
+                self.assertEqual(response.json()['matrix'][0][3], distance)
+
+                body = io.BytesIO()
+                np.save(body, matrix)
+                response = self.client.post(f'/api/matrix_demoucron/?trace=summary&node_names=A,B,C,D&method={method}',
+                                            body.getvalue(), content_type='application/x-npy')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['paths'], {'A-D': path})
+                self.assertEqual(response.json()['matrix'][0][3], distance)
+
+    def test_invalid_method_rejected(self):
+        matrix = [[0, 1], [None, 0]]
+        response = self.client.post('/api/matrix_demoucron/', {'matrix': matrix, 'node_names': ['A', 'B'], 'method': 'foo'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        # Dans un lot, seul l'élément concerné est en erreur
+        items = [{'matrix': matrix, 'node_names': ['A', 'B'], 'method': 'foo'},
+                 {'matrix': matrix, 'node_names': ['A', 'B'], 'method': 'max'}]
+        response = self.client.post('/api/matrix_demoucron/batch/', {'items': items}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(results[0], {'error': 'Invalid method'})
+        self.assertEqual(results[1]['paths'], {'A-B': ['A', 'B']})
+
+    def test_add_arc_updates_existing_pair(self):
+        graph_id = self.create_graph([('A', 'initial'), ('B', 'normal'), ('C', 'final')], [('A', 'B', 3), ('B', 'C', 4)])
+        self.assertEqual(self.client.get(f'/api/graphs/{graph_id}/paths/?pairs=A-C').json()['distances'], {'A-C': 7})
+        response = self.add_arc(graph_id, 'A', 'B', 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Arc.objects.filter(graph_id=graph_id).count(), 2)
+        self.assertEqual(self.client.get(f'/api/graphs/{graph_id}/paths/?pairs=A-C').json()['distances'], {'A-C': 5})
+        # Poids augmenté : l'état est recalculé entièrement
+        self.assertEqual(self.add_arc(graph_id, 'A', 'B', 6).status_code, 200)
+        self.assertEqual(self.client.get(f'/api/graphs/{graph_id}/paths/?pairs=A-C').json()['distances'], {'A-C': 10})
+
+        self.assertEqual(self.add_sommet(graph_id, 'D', 'initial').status_code, 400)
+
+    def test_urlconf_does_not_load_schema_validator(self):
+        # Seule la consultation de docs/ charge drf_yasg.views et le validateur de schémas
+        code = ("import sys, django; django.setup(); import config.urls; "
+                "print(','.join(sorted(name for name in ('drf_yasg.views', 'jsonschema', 'swagger_spec_validator') "
+                "if name in sys.modules)))")
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=settings.BASE_DIR, env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'config.settings'})
+        self.assertEqual(result.stdout.strip(), '')
+
+    def test_openapi_schema_file_is_opt_in(self):
+        with override_settings(DEMOUCRON_OPENAPI_FILE=None):
+            response = self.client.get('/api/docs/openapi.json')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('/graphs/', response.json()['paths'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'openapi.json')
+            with open(path, 'w') as schema_file:
+                json.dump({'swagger': '2.0', 'paths': {}}, schema_file)
+            with override_settings(DEMOUCRON_OPENAPI_FILE=path):
+                response = self.client.get('/api/docs/openapi.json')
+                self.assertEqual(json.loads(b''.join(response.streaming_content)), {'swagger': '2.0', 'paths': {}})
+                response.close()
+
+    def read_ndjson(self, response):
+        # Une ligne = un objet JSON complet, terminé par un saut de ligne
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        body = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(body.endswith('\n'))
+        lines = [json.loads(line) for line in body.split('\n')[:-1]]
+        self.assertTrue(all(isinstance(line, dict) for line in lines))
+        return lines
+
+    def test_ndjson_stream_matches_buffered_response(self):
+        matrix = [[0, 4, 1, None], [None, 0, None, 2], [None, 2, 0, 6], [None, None, None, 0]]
+        body = {'matrix': matrix, 'node_names': ['A', 'B', 'C', 'D'], 'method': 'min'}
+        for trace, encoding in (('full', 'full'), ('steps', 'delta'), ('summary', 'full')):
+            query = f'trace={trace}&encoding={encoding}&engine=matrix'
+            buffered = self.client.post(f'/api/matrix_demoucron/?{query}&format=json', body,
+                                        content_type='application/json').json()
+            lines = self.read_ndjson(self.client.post(f'/api/matrix_demoucron/?{query}&format=ndjson', body,
+                                                      content_type='application/json'))
+            self.assertEqual([line['type'] for line in lines], ['start'] + ['step'] * len(buffered['steps']) + ['result'])
+            self.assertEqual(lines[0]['trace'], trace)
+            self.assertEqual([{key: value for key, value in line.items() if key != 'type'} for line in lines[1:-1]],
+                             buffered['steps'])
+            self.assertEqual(lines[-1]['paths'], buffered['paths'])
+            self.assertEqual(lines[-1]['matrix'], buffered['matrix'])
+
+        # Exécution d'un graphe enregistré
+        graph_id = self.create_graph([('A', 'initial'), ('B', 'normal'), ('C', 'final')], [('A', 'B', 3), ('B', 'C', 4)])
+        url = f'/api/graphs/{graph_id}/run_demoucron/?engine=matrix&trace=summary'
+        buffered = self.client.get(f'{url}&format=json').json()
+        lines = self.read_ndjson(self.client.get(f'{url}&format=ndjson'))
+        self.assertEqual([line['changed'] for line in lines[1:-1]], [step['changed'] for step in buffered['steps']])
+        self.assertEqual(lines[-1]['matrix'], buffered['matrix'])
+
+    def test_delta_steps_decode_after_json(self):
+        # Même aller-retour après sérialisation JSON (cases infinies transmises comme null)
+        for method, matrix in (('min', [[0, -1, None], [None, 0, 4], [2, None, 0]]),
+                               ('max', [[0, 3, 1], [None, 0, -2], [None, None, 0]])):
+            body = {'matrix': matrix, 'node_names': ['A', 'B', 'C'], 'method': method}
+            full = self.client.post('/api/matrix_demoucron/?trace=full&engine=matrix', body,
+                                    content_type='application/json').json()
+            delta = self.client.post('/api/matrix_demoucron/?trace=full&encoding=delta&engine=matrix', body,
+                                     content_type='application/json').json()
+            self.assertIn('changes', delta['steps'][1])
+            self.assertEqual(list(decode_delta_steps(delta['steps'], ['A', 'B', 'C'])), full['steps'])
+
+    def test_etags_follow_graph_changes(self):
+        graph_id = self.create_graph([('A', 'initial'), ('B', 'normal'), ('C', 'final')], [('A', 'B', 3), ('B', 'C', 4)])
+        urls = [f'/api/graphs/{graph_id}/', f'/api/graphs/{graph_id}/run_demoucron/?engine=matrix&trace=summary',
+                f'/api/graphs/{graph_id}/paths/?pairs=A-C']
+
+        def etags():
+            tags = []
+            for url in urls:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                # Requête conditionnelle avec l'ETag courant : 304 sans corps
+                conditional = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(conditional.status_code, 304)
+                self.assertEqual(conditional.content, b'')
+                tags.append(response['ETag'])
+            return tags
+
+        seen = [etags()]
+        # Options différentes : réponses différentes, ETags différents
+        self.assertNotEqual(self.client.get(f'{urls[1]}&encoding=delta')['ETag'], seen[0][1])
+        self.assertNotEqual(self.client.get(f'/api/graphs/{graph_id}/paths/?pairs=A-B')['ETag'], seen[0][2])
+
+        changes = [
+            lambda: self.add_sommet(graph_id, 'D', 'normal'),
+            lambda: self.add_arc(graph_id, 'A', 'D', 1),
+            lambda: self.add_arc(graph_id, 'A', 'D', 2),
+            lambda: self.client.delete(f'/api/graphs/{graph_id}/delete_arc/A/D/'),
+            lambda: self.client.delete(f'/api/graphs/{graph_id}/delete_sommet/D/'),
+        ]
+        for change in changes:
+            self.assertLess(change().status_code, 300)
+            tags = etags()
+            for previous in seen:
+                self.assertTrue(all(tag != old for tag, old in zip(tags, previous)))
+            # Un ancien ETag ne donne plus 304
+            for url, old in zip(urls, seen[-1]):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=old).status_code, 200)
+            seen.append(tags)
+
+    def test_engines_agree_on_negative_cycles(self):
+        nodes = [('A', 'initial'), ('B', 'normal'), ('C', 'normal'), ('D', 'final')]
+        for name, arcs, expected in (
+            # Circuit B <-> C hors de tout chemin vers D : même chemin pour les deux moteurs
+            ('hors', [('A', 'B', 1), ('B', 'C', 1), ('C', 'B', -3), ('A', 'D', 5)], 200),
+            # Circuit B <-> C sur le chemin A -> D : 400 pour les deux moteurs
+            ('sur', [('A', 'B', 1), ('B', 'C', 1), ('C', 'B', -3), ('B', 'D', 2)], 400),
+        ):
+            graph_id = self.create_graph(nodes, arcs, name)
+            responses = [self.client.get(f'/api/graphs/{graph_id}/run_demoucron/?engine={engine}&trace={trace}')
+                         for engine, trace in (('sparse', 'none'), ('matrix', 'none'), ('matrix', 'summary'))]
+            self.assertEqual([response.status_code for response in responses], [expected] * 3)
+            if expected == 200:
+                self.assertEqual([response.json()['paths'] for response in responses], [{'A-D': ['A', 'D']}] * 3)
+                self.assertEqual(responses[0].json()['distance'], responses[1].json()['matrix'][0][3])
+            else:
+                self.assertEqual(len({response.content for response in responses}), 1)
+            Graph.objects.filter(pk=graph_id).delete()
+
+    def test_add_arc_errors(self):
+        graph_id = self.create_graph([('A', 'initial'), ('B', 'final')], [])
+        self.assertEqual(self.add_arc(graph_id, 'A', 'Z', 1).status_code, 400)
+        self.assertEqual(self.add_arc(graph_id, 'B', 'A', 1).status_code, 400)
+        self.assertEqual(self.add_arc(999999, 'A', 'B', 1).status_code, 404)
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        jobs.job_cache().clear()
+
+    def submit(self, matrix, query='trace=summary'):
+        body = {'matrix': matrix, 'node_names': [f'N{i}' for i in range(len(matrix))], 'method': 'min'}
+        response = self.client.post(f'/api/matrix_demoucron/jobs/?{query}', body, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Location'], response.json()['url'])
+        return response.json()
+
+    def wait(self, url, limit=60):
+        deadline = time.monotonic() + limit
+        while time.monotonic() < deadline:
+            data = self.client.get(url).json()
+            if data['status'] not in ('queued', 'running', 'cancelling'):
+                return data
+            time.sleep(0.05)
+        self.fail(f'Tâche non terminée après {limit} s')
+
+    def test_submit_and_poll(self):
+        matrix = [[0, 3, 2, None], [None, 0, None, 5], [None, 2, 0, 1], [None, None, None, 0]]
+        job = self.submit(matrix)
+        self.assertEqual(job['status'], 'queued')
+        # L'état vit dans le cache partagé, pas dans le processus qui a reçu la tâche
+        self.assertIsNotNone(jobs.job_cache().get(jobs.job_key(job['id'])))
+        data = self.wait(job['url'])
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual(data['progress'], {'step': 4, 'total': 4})
+        body = {'matrix': matrix, 'node_names': ['N0', 'N1', 'N2', 'N3'], 'method': 'min'}
+        expected = self.client.post('/api/matrix_demoucron/?trace=summary&engine=matrix', body,
+                                    content_type='application/json').json()
+        self.assertEqual(data['result']['matrix'], expected['matrix'])
+        self.assertEqual(data['result']['paths'], expected['paths'])
+
+        # Un résultat supprimé n'est plus accessible ; une tâche inconnue renvoie 404
+        self.assertEqual(self.client.delete(job['url']).status_code, 202)
+        self.assertEqual(self.client.get(job['url']).status_code, 404)
+        self.assertEqual(self.client.delete(job['url']).status_code, 404)
+
+    @override_settings(DEMOUCRON_JOB_TIMEOUT=0)
+    def test_timeout_enforced_while_running(self):
+        # Le délai est imposé par le fil de surveillance, sans attendre la fin du calcul
+        matrix = random_matrix(np.random.default_rng(14), 600, low=1)
+        job = self.submit(matrix)
+        data = self.wait(job['url'], limit=10)
+        self.assertEqual(data['status'], 'timeout')
+        self.assertIn('Durée maximale dépassée', data['error'])
+        self.assertLess(data['progress']['step'], 600)
+        self.assertNotIn('result', data)
+
+    def test_cancel_from_any_worker(self):
+        # Une demande d'annulation déposée dans le cache est relayée par le processus qui exécute la tâche
+        matrix = random_matrix(np.random.default_rng(15), 600, low=1)
+        job = self.submit(matrix)
+        jobs.job_cache().set(jobs.cancel_key(job['id']), True)
+        self.assertIn(self.client.get(job['url']).json()['status'], ('cancelling', 'cancelled'))
+        self.assertEqual(self.wait(job['url'], limit=10)['status'], 'cancelled')
+
+
+class TimingTests(TestCase):
+    body = {'matrix': [[0, 1, None], [None, 0, 2], [None, None, 0]], 'node_names': ['A', 'B', 'C'], 'method': 'min'}
+
+    def setUp(self):
+        result_cache().clear()
+
+    def metric(self, line_prefix):
+        # Valeur d'une ligne de metrics/ (0 si la série n'existe pas encore)
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        for line in response.content.decode('utf-8').splitlines():
+            if line.startswith(line_prefix + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        return 0
+
+    def test_server_timing_on_normal_responses(self):
+        response = self.client.post('/api/matrix_demoucron/?trace=summary&engine=matrix', self.body,
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        phases = dict(entry.split(';dur=') for entry in response['Server-Timing'].split(', '))
+        self.assertIn('relax', phases)
+        self.assertIn('render', phases)
+        self.assertGreaterEqual(float(phases['total']), float(phases['relax']))
+        self.assertEqual(response['X-Query-Count'], '0')
+
+        graph_id = self.client.post('/api/graphs/create/', {'name': 'g'}, content_type='application/json').json()['id']
+        response = self.client.get(f'/api/graphs/{graph_id}/')
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertGreater(int(response['X-Query-Count']), 0)
+
+    def test_metrics_count_requests_and_phases(self):
+        count = 'demoucron_request_duration_seconds_count{endpoint="matrix-demoucron",method="POST",status="200"}'
+        relax = 'demoucron_phase_duration_seconds_count{endpoint="matrix-demoucron",phase="relax"}'
+        nodes = 'demoucron_graph_nodes_count{endpoint="run-demoucron"}'
+        before = [self.metric(name) for name in (count, relax, nodes)]
+        # La seconde requête identique est servie par le cache : pas de relaxation
+        for _ in range(2):
+            self.client.post('/api/matrix_demoucron/?trace=summary&engine=matrix', self.body,
+                             content_type='application/json')
+        graph_id = self.client.post('/api/graphs/create/', {'name': 'g'}, content_type='application/json').json()['id']
+        self.client.post(f'/api/graphs/{graph_id}/add_sommet/', {'name': 'A', 'type': 'initial'},
+                         content_type='application/json')
+        self.client.post(f'/api/graphs/{graph_id}/add_sommet/', {'name': 'B', 'type': 'final'},
+                         content_type='application/json')
+        self.client.get(f'/api/graphs/{graph_id}/run_demoucron/?trace=summary')
+        self.assertEqual([self.metric(name) for name in (count, relax, nodes)],
+                         [before[0] + 2, before[1] + 1, before[2] + 1])
+        self.assertIn('# TYPE demoucron_request_queries histogram', self.client.get('/api/metrics/').content.decode())
+
+    def test_streaming_responses_recorded_when_body_ends(self):
+        # Pas de Server-Timing sur un flux (les en-têtes partent avant le corps) ; la requête est comptée à la fin
+        count = 'demoucron_request_duration_seconds_count{endpoint="matrix-demoucron",method="POST",status="200"}'
+        relax = 'demoucron_phase_duration_seconds_count{endpoint="matrix-demoucron",phase="relax"}'
+        before = [self.metric(name) for name in (count, relax)]
+        response = self.client.post('/api/matrix_demoucron/?trace=summary&engine=matrix&format=ndjson', self.body,
+                                    content_type='application/json')
+        self.assertTrue(response.streaming)
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('X-Query-Count', response)
+        self.assertEqual([self.metric(name) for name in (count, relax)], before)
+        b''.join(response.streaming_content)
+        response.close()
+        self.assertEqual([self.metric(name) for name in (count, relax)], [before[0] + 1, before[1] + 1])
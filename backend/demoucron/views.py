@@ -1,13 +1,513 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.db import transaction
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from .models import Graph, Sommet, Arc
-from .serializers import GraphSerializer, SommetSerializer, ArcSerializer
-from helper import build_adjacency_matrix, demoucron_algorithm
+from .serializers import GraphSerializer, GraphSummarySerializer, SommetSerializer, ArcSerializer, GraphBulkSerializer
+from .pagination import GraphPagination
+from .renderers import NDJSONRenderer, NPZRenderer, ndjson_line
+from .parsers import NPZParser, NPYParser
+from . import jobs
+from . import admission
+from .batch import run_batch
+from .metrics import render_prometheus
+from .cache import result_key, graph_result_key, graph_state_key, is_cacheable, get_cached, set_cached, cache_stats
+from helper import (
+    build_adjacency_matrix, load_arcs, arcs_to_matrix, arcs_to_adjacency_lists, is_sparse_graph, shortest_path,
+    NegativeCycleError, topological_levels, dag_paths, dag_all_pairs, matrix_to_arcs, all_pairs, has_negative_cycle,
+    paths_between, has_negative_cycle_between, insert_arc, initial_final_paths, to_working_matrix,
+    demoucron_algorithm, demoucron_arrays, iter_demoucron, TRACE_LEVELS, STEP_ENCODINGS
+)
+import hashlib
+
 import numpy as np
 
+from timing import phase, record_graph_size
+
+trace_parameter = openapi.Parameter(
+    'trace',
+    openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    enum=list(TRACE_LEVELS),
+    default='full',
+    description="Niveau de détail : 'none' (matrice finale et chemin), 'summary' (+ nombre de cases modifiées par étape), "
+                "'steps' (+ matrice et arcs de chaque étape), 'full' (+ détail des calculs)"
+)
+
+encoding_parameter = openapi.Parameter(
+    'encoding',
+    openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    enum=list(STEP_ENCODINGS),
+    default='full',
+    description="Encodage des étapes (trace 'steps' ou 'full') : 'full' (matrice complète à chaque étape) ou "
+                "'delta' (matrice de base à l'étape 0, puis seulement les cases [i, j, ancienne, nouvelle] et arcs modifiés)"
+)
+
+ENGINES = ('auto', 'matrix', 'sparse', 'dag')
+MATRIX_ENGINES = ('auto', 'matrix', 'dag')
+
+engine_parameter = openapi.Parameter(
+    'engine',
+    openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    enum=list(ENGINES),
+    default='auto',
+    description="Moteur de calcul : 'matrix' (Demoucron, toutes les paires en O(n³)), 'sparse' (Dijkstra ou Bellman-Ford "
+                "sur les listes d'adjacence, uniquement le couple initial -> final, sans étapes), 'dag' (graphe sans "
+                "circuit : niveaux, dates au plus tôt / au plus tard et chemin initial -> final en O(V + E), sans étapes) "
+                "ou 'auto' ('dag' si le graphe est sans circuit, sinon 'sparse', lorsque trace='none' ou qu'aucune trace "
+                "n'est demandée pour un graphe grand et creux)"
+)
+
+DTYPES = ('float64', 'float32')
+
+dtype_parameter = openapi.Parameter(
+    'dtype',
+    openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    enum=list(DTYPES),
+    default='float64',
+    description="Précision du calcul sans trace (noyau par tuiles) : 'float32' divise par deux la mémoire et le trafic "
+                "mémoire, au prix d'environ 7 chiffres significatifs ; uniquement avec trace='none'"
+)
+
+matrix_engine_parameter = openapi.Parameter(
+    'engine',
+    openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    enum=list(MATRIX_ENGINES),
+    default='auto',
+    description="Moteur de calcul : 'matrix' (Demoucron, toutes les paires en O(n³)), 'dag' (graphe sans circuit : "
+                "niveaux, dates au plus tôt / au plus tard et chemin du premier au dernier nœud en O(V + E), matrice finale "
+                "en O(n·E), sans étapes) ou 'auto' ('dag' si trace='none', en JSON, et que la matrice est sans circuit)"
+)
+
+ON_LIMIT = ('auto', 'downgrade', 'reject')
+
+on_limit_parameter = openapi.Parameter(
+    'on_limit',
+    openapi.IN_QUERY,
+    type=openapi.TYPE_STRING,
+    enum=list(ON_LIMIT),
+    default='auto',
+    description="Réponse estimée trop volumineuse : 'downgrade' (trace allégée, signalée par 'downgraded_from'), "
+                "'reject' (413 avec la trace suggérée) ou 'auto' ('downgrade' si aucune trace n'est demandée, sinon 'reject')"
+)
+
+def get_run_options(request):
+    # Renvoie les options d'exécution (trace, encoding) ou une réponse d'erreur
+    options = {
+        'trace': request.query_params.get('trace', 'full'),
+        'encoding': request.query_params.get('encoding', 'full'),
+    }
+    if options['trace'] not in TRACE_LEVELS:
+        return None, Response(
+            {'error': f"Niveau de trace invalide (valeurs possibles : {', '.join(TRACE_LEVELS)})"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if options['encoding'] not in STEP_ENCODINGS:
+        return None, Response(
+            {'error': f"Encodage invalide (valeurs possibles : {', '.join(STEP_ENCODINGS)})"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return options, None
+
+def get_engine(request, options, n, arc_count):
+    # Renvoie le moteur retenu ('matrix', 'sparse' ou 'dag') ou une réponse d'erreur ; en 'auto', 'dag' est
+    # provisoire : il devient 'sparse' si le graphe chargé a un circuit
+    engine = request.query_params.get('engine', 'auto')
+    if engine not in ENGINES:
+        return None, Response(
+            {'error': f"Moteur invalide (valeurs possibles : {', '.join(ENGINES)})"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if engine == 'auto':
+        # Sans trace demandée, un graphe trop grand pour un calcul synchrone en O(n³) passe aussi en 'sparse'
+        trace_requested = 'trace' in request.query_params
+        if options['trace'] == 'none' or (not trace_requested and (is_sparse_graph(
+                n, arc_count, settings.DEMOUCRON_SPARSE_MIN_NODES, settings.DEMOUCRON_SPARSE_MAX_DENSITY)
+                or admission.relax_ops(n, arc_count) > settings.DEMOUCRON_MAX_RELAX_OPS)):
+            engine = 'dag'
+        else:
+            engine = 'matrix'
+    if engine in ('sparse', 'dag') and 'trace' in request.query_params and options['trace'] != 'none':
+        return None, Response(
+            {'error': f"Le moteur '{engine}' ne produit pas d'étapes : utilisez trace='none'"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return engine, None
+
+def get_matrix_engine(request, options, binary):
+    # Moteur de matrix_demoucron/ ('matrix' ou 'dag') ; en 'auto', 'dag' est provisoire : il devient 'matrix'
+    # si la matrice a un circuit
+    engine = request.query_params.get('engine', 'auto')
+    if engine not in MATRIX_ENGINES:
+        return None, Response(
+            {'error': f"Moteur invalide (valeurs possibles : {', '.join(MATRIX_ENGINES)})"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if engine == 'auto':
+        return 'dag' if options['trace'] == 'none' and not binary else 'matrix', None
+    if engine == 'dag' and (binary or ('trace' in request.query_params and options['trace'] != 'none')):
+        return None, Response(
+            {'error': "Le moteur 'dag' ne produit pas d'étapes : utilisez trace='none' en JSON"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return engine, None
+
+def get_dtype(request, trace):
+    # Précision du noyau par tuiles ; float32 (moitié moins de mémoire et de trafic) seulement sans trace
+    dtype = request.query_params.get('dtype', 'float64')
+    if dtype not in DTYPES:
+        return None, Response(
+            {'error': f"Précision invalide (valeurs possibles : {', '.join(DTYPES)})"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if dtype != 'float64' and trace != 'none':
+        return None, Response(
+            {'error': f"dtype={dtype} n'est disponible qu'avec trace='none'"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return dtype, None
+
+def dag_levels(engine_requested, adjacency):
+    # Niveaux du graphe pour le moteur 'dag', ou None s'il a un circuit ; un circuit n'est une erreur
+    # que si le moteur 'dag' a été demandé explicitement
+    levels = topological_levels(adjacency)
+    if levels is None and engine_requested == 'dag':
+        return None, Response(
+            {'error': "Le graphe contient un circuit : le moteur 'dag' ne s'applique qu'aux graphes sans circuit"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return levels, None
+
+def dag_fields(matrix, node_names, method, final_matrix):
+    # Moteur 'matrix' sans trace : mêmes clés que le moteur 'dag' ; niveaux et dates à null si la matrice a un circuit
+    distance = final_matrix[0, -1]
+    fields = {'distance': float(distance) if np.isfinite(distance) else None, 'levels': None, 'earliest': None,
+              'latest': None}
+    adjacency = arcs_to_adjacency_lists(len(node_names), matrix_to_arcs(matrix))
+    levels = topological_levels(adjacency)
+    if levels is not None:
+        analysis = dag_paths(adjacency, node_names, levels, method)
+        fields.update(levels=analysis['levels'], earliest=analysis['earliest'], latest=analysis['latest'])
+    return fields
+
+def admission_error(exc):
+    # Réponse d'erreur correspondant à un refus du contrôle d'admission
+    if isinstance(exc, admission.RunTooExpensive):
+        return Response(
+            {'error': "Calcul trop coûteux pour une requête synchrone : utilisez le moteur 'sparse' ou une tâche asynchrone",
+             'estimated_relax_ops': exc.relax_ops, 'max_relax_ops': exc.max_relax_ops},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    if isinstance(exc, admission.ResponseTooLarge):
+        return Response(
+            {'error': 'Réponse estimée trop volumineuse : choisissez une trace plus légère',
+             'estimated_bytes': exc.estimated_bytes, 'max_bytes': exc.max_bytes, 'suggested': exc.suggestion},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+    return Response(
+        {'error': 'Trop de calculs lourds en cours, réessayez plus tard'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(max(1, round(settings.DEMOUCRON_HEAVY_RUN_WAIT)))}
+    )
+
+def admit_run(request, n, arc_count, engine, options, binary=False, synchronous=True, all_pairs=False):
+    # Renvoie (options retenues, estimation, options demandées si elles ont été allégées, réponse d'erreur) ;
+    # all_pairs : le moteur 'dag' calcule aussi la matrice de toutes les paires (matrix_demoucron/)
+    on_limit = request.query_params.get('on_limit', 'auto')
+    if on_limit not in ON_LIMIT:
+        return None, None, None, Response(
+            {'error': f"Valeur de on_limit invalide (valeurs possibles : {', '.join(ON_LIMIT)})"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    downgrade = on_limit == 'downgrade' or (on_limit == 'auto' and 'trace' not in request.query_params)
+    try:
+        admitted, run_estimate = admission.admit(n, arc_count, engine, options, downgrade,
+                                                 streaming=synchronous and wants_stream(request),
+                                                 binary=binary, synchronous=synchronous, all_pairs=all_pairs)
+    except (admission.RunTooExpensive, admission.ResponseTooLarge) as exc:
+        return None, None, None, admission_error(exc)
+    downgraded_from = dict(options) if admitted != options else None
+    return admitted, run_estimate, downgraded_from, None
+
+def graph_etag(request, graph_id):
+    # L'ETag ne dépend que de la révision du graphe : une requête conditionnelle coûte une seule lecture
+    revision = Graph.objects.filter(pk=graph_id).values_list('revision', flat=True).first()
+    if revision is None:
+        return None
+    return f'graph-{graph_id}-r{revision}'
+
+def demoucron_etag(request, graph_id):
+    options, error = get_run_options(request)
+    if error:
+        return None
+    etag = graph_etag(request, graph_id)
+    if etag is None:
+        return None
+    # La trace absente et la trace 'full' ne donnent pas la même réponse en moteur 'auto'
+    trace = request.query_params.get('trace', 'default')
+    engine = request.query_params.get('engine', 'auto')
+    on_limit = request.query_params.get('on_limit', 'auto')
+    return f"{etag}-{trace}-{options['encoding']}-{engine}-{on_limit}-{request.accepted_renderer.format}"
+
+def wants_stream(request):
+    return request.accepted_renderer.format == NDJSONRenderer.format
+
+def stream_demoucron(runner, start):
+    # Une ligne JSON par objet : l'en-tête, chaque étape dès qu'elle est calculée, puis le résultat
+    yield ndjson_line({'type': 'start', **start})
+    while True:
+        try:
+            step = next(runner)
+        except StopIteration as stop:
+            paths, matrix = stop.value
+            break
+        yield ndjson_line({'type': 'step', **step})
+    yield ndjson_line({'type': 'result', 'paths': paths, 'matrix': matrix})
+
+def stream_result(start, result):
+    # Moteur sans étapes : l'en-tête puis directement le résultat
+    yield ndjson_line({'type': 'start', **start})
+    yield ndjson_line({'type': 'result', **result})
+
+def streaming_response(lines):
+    return StreamingHttpResponse(lines, content_type=NDJSONRenderer.media_type)
+
+def graph_nodes_and_edges(graph):
+    with phase('serialize'):
+        return {
+            'nodes': SommetSerializer(graph.sommets.all(), many=True).data,
+            'edges': ArcSerializer(graph.arcs.select_related('source', 'target'), many=True).data,
+        }
+
+def negative_cycle_response():
+    return Response({'error': 'Le graphe contient un circuit de poids négatif'}, status=status.HTTP_400_BAD_REQUEST)
+
+def with_downgrade(data, downgraded_from):
+    return {**data, 'downgraded_from': downgraded_from} if downgraded_from else data
+
+def run_demoucron_cached(matrix, node_names, method, options, run_estimate=None):
+    # Résultat de l'algorithme, partagé entre toutes les requêtes portant sur la même matrice ;
+    # un calcul lourd (run_estimate) attend une place libre, un résultat déjà en cache non
+    key = result_key(matrix, node_names, method, options)
+    result = get_cached(key, 'result')
+    if result is None:
+        with admission.heavy_slot(run_estimate):
+            steps, paths, final_matrix = demoucron_algorithm(
+                matrix, node_names, method=method, workers=admission.relax_workers(len(node_names)), **options
+            )
+        result = {'steps': steps, 'paths': paths, 'matrix': final_matrix}
+        if is_cacheable(len(node_names), options):
+            set_cached(key, result)
+    return result['steps'], result['paths'], result['matrix']
+
+def get_graph_state(graph, loaded=None, run_estimate=None):
+    # Distances (float64) et prédécesseurs (int32) de toutes les paires, calculés une fois par révision du graphe ;
+    # loaded : (node_names, arcs) déjà chargés par load_arcs, pour éviter de relire le graphe
+    key = graph_state_key(graph.id, graph.revision)
+    state = get_cached(key, 'state')
+    if state is None:
+        if loaded is None:
+            node_names, _, arcs, _ = load_arcs(graph)
+        else:
+            node_names, arcs = loaded
+        with admission.heavy_slot(run_estimate):
+            distances, predecessors = all_pairs(
+                arcs_to_matrix(len(node_names), arcs), workers=admission.relax_workers(len(node_names))
+            )
+        state = {'node_names': node_names, 'distances': distances, 'predecessors': predecessors}
+        if revision_unchanged(graph):
+            set_cached(key, state)
+    return state
+
+def revision_unchanged(graph):
+    # Relu après le chargement du graphe : un résultat n'est enregistré sous graph.revision que si aucune
+    # modification n'a eu lieu entre-temps (sinon il correspondrait à une autre révision)
+    return Graph.objects.filter(pk=graph.id, revision=graph.revision).exists()
+
+def update_graph_state_on_arc(graph_id, revision, source_name, target_name, weight, previous_weight):
+    # Nouvel arc ou poids diminué : l'état de la révision précédente est mis à jour en O(n²) et enregistré
+    # pour la nouvelle révision. Poids augmenté, circuit absorbant ou état absent : rien n'est enregistré,
+    # l'état sera recalculé entièrement à la prochaine requête
+    if previous_weight is not None and weight > previous_weight:
+        return False
+    state = get_cached(graph_state_key(graph_id, revision), 'state')
+    if state is None:
+        return False
+    new_revision = Graph.objects.filter(pk=graph_id).values_list('revision', flat=True).first()
+    if new_revision != revision + 1:
+        # Une autre modification a eu lieu entre-temps
+        return False
+    index = {name: i for i, name in enumerate(state['node_names'])}
+    if not insert_arc(state['distances'], state['predecessors'], index[source_name], index[target_name], weight):
+        return False
+    set_cached(graph_state_key(graph_id, new_revision), state)
+    return True
+
+def parse_pairs(raw, node_names):
+    # 'A-B,C-D' -> [('A', 'B'), ('C', 'D')] ; un nom pouvant contenir '-', on essaie chaque position de coupure
+    names = set(node_names)
+    pairs = []
+    for item in filter(None, (part.strip() for part in raw.split(','))):
+        for position in (i for i, char in enumerate(item) if char == '-'):
+            source, target = item[:position], item[position + 1:]
+            if source in names and target in names:
+                pairs.append((source, target))
+                break
+        else:
+            raise ValueError(item)
+    return pairs
+
+def paths_etag(request, graph_id):
+    etag = graph_etag(request, graph_id)
+    if etag is None:
+        return None
+    digest = hashlib.sha1(request.query_params.get('pairs', '').encode('utf-8')).hexdigest()[:16]
+    return f'{etag}-paths-{digest}'
+
+def run_demoucron_arrays_cached(matrix, node_names, method, trace, run_estimate=None, dtype='float64'):
+    # Résultat sous forme de tableaux numpy pour les réponses binaires (.npz), sans passer par des listes
+    key = result_key(matrix, node_names, method, {'trace': trace, 'format': NPZRenderer.format, 'dtype': dtype})
+    arrays = get_cached(key, 'result')
+    if arrays is None:
+        with admission.heavy_slot(run_estimate):
+            final_matrix, predecessors, changed, steps = demoucron_arrays(
+                matrix, method, trace, dtype, workers=admission.relax_workers(len(node_names))
+            )
+        paths = initial_final_paths(final_matrix, predecessors, node_names)
+        arrays = {
+            'matrix': final_matrix,
+            'node_names': np.array(node_names, dtype=str),
+            'path': np.array(next(iter(paths.values()), []), dtype=str),
+        }
+        if trace == 'summary':
+            arrays['changed'] = changed
+        elif trace == 'steps':
+            arrays['steps'] = steps
+        if is_cacheable(len(node_names), {'trace': trace}, binary=True):
+            set_cached(key, arrays)
+    return arrays
+
+def parse_matrix_input(data):
+    # Renvoie (matrice, noms des nœuds, méthode, message d'erreur) à partir d'un corps JSON, .npz ou .npy
+    matrix = data.get('matrix')
+    node_names = data.get('node_names')
+    method = data.get('method', 'min')
+    if matrix is None or not node_names or len(matrix) != len(node_names):
+        return None, None, None, 'Invalid input'
+    if method not in ('min', 'max'):
+        return None, None, None, 'Invalid method'
+    try:
+        # Cases absentes (None, NaN, ±inf) remplacées par l'absence d'arc de la méthode
+        matrix = to_working_matrix(matrix, method)
+    except:
+        return None, None, None, 'Invalid matrix format'
+    if matrix.shape != (len(node_names), len(node_names)):
+        return None, None, None, 'Invalid matrix format'
+    return matrix, node_names, method, None
+
+def get_matrix_input(request):
+    # Renvoie (matrice, noms des nœuds, méthode, nombre d'arcs, réponse d'erreur)
+    with phase('parse'):
+        matrix, node_names, method, error = parse_matrix_input(request.data)
+    if error:
+        return None, None, None, None, Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+    # Nombre d'arcs : cases finies hors diagonale
+    arc_count = int(np.count_nonzero(np.isfinite(matrix)) - np.count_nonzero(np.isfinite(np.diagonal(matrix))))
+    record_graph_size(len(node_names), arc_count)
+    return matrix, node_names, method, arc_count, None
+
+def load_runnable_graph(graph):
+    # Sommets et arcs du graphe (nombre de requêtes constant), ou une réponse d'erreur s'il ne peut pas être traité
+    node_names, node_types, arcs, arc_count = load_arcs(graph)
+
+    if not node_names or not arc_count:
+        return None, None, Response(
+            {'error': 'Le graphe doit contenir des sommets et des arcs'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Vérifier la présence d'un nœud initial et final
+    if 'initial' not in node_types or 'final' not in node_types:
+        return None, None, Response(
+            {'error': 'Le graphe doit avoir un nœud initial et un nœud final'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return node_names, arcs, None
+
+def submit_job(matrix, node_names, method, options, extra):
+    try:
+        job_id = jobs.submit(matrix, node_names, method, options, extra)
+    except jobs.QueueFull:
+        return Response(
+            {'error': f"Trop de calculs en attente (maximum {settings.DEMOUCRON_JOB_MAX_QUEUE}), réessayez plus tard"},
+            status=status.HTTP_429_TOO_MANY_REQUESTS
+        )
+    url = reverse('job-detail', kwargs={'job_id': job_id})
+    return Response({'id': job_id, 'status': 'queued', 'url': url},
+                    status=status.HTTP_202_ACCEPTED, headers={'Location': url})
+
+job_submit_responses = {
+    202: openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'id': openapi.Schema(type=openapi.TYPE_STRING),
+            'status': openapi.Schema(type=openapi.TYPE_STRING),
+            'url': openapi.Schema(type=openapi.TYPE_STRING, description="Adresse à interroger pour suivre la tâche"),
+        }
+    ),
+    400: openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={'error': openapi.Schema(type=openapi.TYPE_STRING)}
+    ),
+    413: openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={'error': openapi.Schema(type=openapi.TYPE_STRING)},
+        description="Résultat estimé trop volumineux pour la trace demandée"
+    ),
+    429: openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={'error': openapi.Schema(type=openapi.TYPE_STRING)}
+    ),
+}
+
+admission_responses = {
+    413: openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'error': openapi.Schema(type=openapi.TYPE_STRING),
+            'estimated_bytes': openapi.Schema(type=openapi.TYPE_INTEGER),
+            'max_bytes': openapi.Schema(type=openapi.TYPE_INTEGER),
+            'suggested': openapi.Schema(type=openapi.TYPE_OBJECT, nullable=True,
+                                        description="Trace et encodage les plus détaillés qui respectent le budget"),
+        }
+    ),
+    422: openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'error': openapi.Schema(type=openapi.TYPE_STRING),
+            'estimated_relax_ops': openapi.Schema(type=openapi.TYPE_INTEGER),
+            'max_relax_ops': openapi.Schema(type=openapi.TYPE_INTEGER),
+        }
+    ),
+    503: openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={'error': openapi.Schema(type=openapi.TYPE_STRING)}
+    ),
+}
+
 class GraphCreateView(APIView):
     @swagger_auto_schema(
         operation_description="Crée un nouveau graphe avec un nom unique.",
@@ -35,17 +535,33 @@ class GraphCreateView(APIView):
 
 class GraphListView(APIView):
     @swagger_auto_schema(
-        operation_description="Liste tous les graphes existants.",
-        responses={200: GraphSerializer(many=True)}
+        operation_description="Liste paginée des graphes existants (id, nom, nombre de sommets et d'arcs). "
+                              "Avec 'expand', chaque graphe est renvoyé avec ses sommets et ses arcs.",
+        manual_parameters=[
+            openapi.Parameter('page', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Numéro de page"),
+            openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description=f"Nombre de graphes par page (max. {GraphPagination.max_page_size})"),
+            openapi.Parameter('expand', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+                              description="Inclure les sommets et les arcs de chaque graphe"),
+        ],
+        responses={200: GraphSummarySerializer(many=True)}
     )
     def get(self, request):
-        graphs = Graph.objects.all()
-        serializer = GraphSerializer(graphs, many=True)
-        return Response(serializer.data)
+        expand = request.query_params.get('expand', '').lower() in ('1', 'true', 'yes')
+        graphs = Graph.objects.with_counts().order_by('id')
+        paginator = GraphPagination()
+        page = paginator.paginate_queryset(graphs, request, view=self)
+        if expand:
+            page = Graph.objects.with_contents().filter(pk__in=[graph.pk for graph in page]).order_by('id')
+            serializer = GraphSerializer(page, many=True)
+        else:
+            serializer = GraphSummarySerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 class GraphDetailView(APIView):
     @swagger_auto_schema(
-        operation_description="Récupère les détails d'un graphe spécifique par son ID, incluant la matrice initiale (D1) et les noms des nœuds.",
+        operation_description="Récupère les détails d'un graphe spécifique par son ID, incluant la matrice initiale (D1) et les noms des nœuds. "
+                              "La réponse porte un ETag dérivé de la révision du graphe ; avec 'If-None-Match', renvoie 304 si rien n'a changé.",
         responses={
             200: openapi.Schema(
                 type=openapi.TYPE_OBJECT,
@@ -83,9 +599,10 @@ class GraphDetailView(APIView):
             )
         }
     )
+    @method_decorator(condition(etag_func=graph_etag))
     def get(self, request, graph_id):
         try:
-            graph = Graph.objects.get(pk=graph_id)
+            graph = Graph.objects.with_contents().get(pk=graph_id)
             serializer = GraphSerializer(graph)
             
             # Construire la matrice initiale (D1) et les noms des nœuds
@@ -158,7 +675,10 @@ class AddSommetView(APIView):
             graph = Graph.objects.get(pk=graph_id)
             serializer = SommetSerializer(data=request.data)
             if serializer.is_valid():
-                serializer.save(graph=graph)
+                try:
+                    serializer.save(graph=graph)
+                except ValidationError as exc:
+                    return Response({'error': ' '.join(exc.messages)}, status=status.HTTP_400_BAD_REQUEST)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Graph.DoesNotExist:
@@ -166,7 +686,10 @@ class AddSommetView(APIView):
 
 class AddArcView(APIView):
     @swagger_auto_schema(
-        operation_description="Ajoute un arc à un graphe spécifié par son ID.",
+        operation_description="Ajoute un arc à un graphe spécifié par son ID. "
+                              "Un seul arc relie deux sommets donnés : s'il existe déjà, son poids est remplacé (200). "
+                              "Si les plus courts chemins de la révision précédente sont en cache et que l'arc est nouveau ou moins lourd, "
+                              "ils sont mis à jour en O(n²) au lieu d'être recalculés.",
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
             required=['source', 'target', 'weight'],
@@ -177,6 +700,7 @@ class AddArcView(APIView):
             },
         ),
         responses={
+            200: ArcSerializer,
             201: ArcSerializer,
             400: openapi.Schema(
                 type=openapi.TYPE_OBJECT,
@@ -198,22 +722,113 @@ class AddArcView(APIView):
                 try:
                     source = graph.sommets.get(name=source_name)
                     target = graph.sommets.get(name=target_name)
-                    arc = Arc.objects.create(
-                        graph=graph,
-                        source=source,
-                        target=target,
-                        weight=serializer.validated_data['weight']
+                    # Arc existant (au plus un par couple) : son poids est remplacé
+                    arc = graph.arcs.filter(source=source, target=target).first()
+                    previous_weight = arc.weight if arc is not None else None
+                    if arc is None:
+                        arc = Arc(graph=graph, source=source, target=target)
+                    arc.weight = serializer.validated_data['weight']
+                    arc.save()
+                    update_graph_state_on_arc(graph.id, graph.revision, source_name, target_name, arc.weight, previous_weight)
+                    return Response(
+                        ArcSerializer(arc).data,
+                        status=status.HTTP_201_CREATED if previous_weight is None else status.HTTP_200_OK
                     )
-                    return Response(ArcSerializer(arc).data, status=status.HTTP_201_CREATED)
                 except Sommet.DoesNotExist:
                     return Response({'error': 'Sommet source ou cible introuvable'}, status=status.HTTP_400_BAD_REQUEST)
+                except ValidationError as exc:
+                    return Response({'error': ' '.join(exc.messages)}, status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Graph.DoesNotExist:
             return Response({'error': 'Graphe introuvable'}, status=status.HTTP_404_NOT_FOUND)
 
+class GraphBulkImportView(APIView):
+    @swagger_auto_schema(
+        operation_description="Ajoute en une seule requête tous les sommets et arcs d'un graphe. Les règles des sommets "
+                              "(unicité des noms, un seul nœud initial et un seul final) et des arcs sont vérifiées en mémoire, "
+                              "puis l'insertion se fait par lots dans une seule transaction. Avec 'replace', le contenu actuel est d'abord supprimé. "
+                              "Un sommet déjà présent avec le même type est conservé (coordonnées mises à jour). "
+                              "Un seul arc relie deux sommets : le dernier du lot l'emporte et un arc existant voit son poids remplacé. "
+                              "Réimporter le même contenu ne crée donc aucun doublon.",
+        request_body=GraphBulkSerializer,
+        responses={
+            201: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'sommets': openapi.Schema(type=openapi.TYPE_INTEGER, description="Nombre de sommets créés ou mis à jour"),
+                    'arcs': openapi.Schema(type=openapi.TYPE_INTEGER, description="Nombre d'arcs créés ou mis à jour"),
+                    'revision': openapi.Schema(type=openapi.TYPE_INTEGER, description="Nouvelle révision du graphe"),
+                }
+            ),
+            400: openapi.Schema(type=openapi.TYPE_OBJECT),
+            404: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={'error': openapi.Schema(type=openapi.TYPE_STRING)}
+            )
+        }
+    )
+    def post(self, request, graph_id):
+        try:
+            graph = Graph.objects.get(pk=graph_id)
+        except Graph.DoesNotExist:
+            return Response({'error': 'Graphe introuvable'}, status=status.HTTP_404_NOT_FOUND)
+
+        existing = dict(graph.sommets.values_list('name', 'type'))
+        serializer = GraphBulkSerializer(data=request.data, context={'existing': existing})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        with transaction.atomic():
+            if data['replace']:
+                graph.arcs.all().delete()
+                graph.sommets.all().delete()
+                existing = {}
+            sommets = Sommet.objects.bulk_create(
+                [Sommet(graph=graph, **sommet) for sommet in data['sommets'] if sommet['name'] not in existing],
+                batch_size=500
+            )
+            ids = dict(graph.sommets.filter(name__in=existing).values_list('name', 'id')) if existing else {}
+            Sommet.objects.bulk_update(
+                [Sommet(pk=ids[sommet['name']], x=sommet['x'], y=sommet['y'])
+                 for sommet in data['sommets'] if sommet['name'] in existing],
+                ['x', 'y'],
+                batch_size=500
+            )
+            if any(sommet.pk is None for sommet in sommets):
+                # Certaines bases ne renvoient pas les clés créées par bulk_create
+                ids.update(graph.sommets.filter(name__in=[sommet.name for sommet in sommets]).values_list('name', 'id'))
+            else:
+                ids.update((sommet.name, sommet.pk) for sommet in sommets)
+            # Un arc par couple : dans le lot, le dernier l'emporte ; un arc déjà présent voit son poids remplacé
+            weights = {(arc['source'], arc['target']): arc['weight'] for arc in data['arcs']}
+            arcs = Arc.objects.bulk_create(
+                [Arc(graph=graph, source_id=ids[source], target_id=ids[target], weight=weight)
+                 for (source, target), weight in weights.items()],
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['graph', 'source', 'target'],
+                update_fields=['weight']
+            )
+            Graph.bump_revision(graph.id)
+
+        graph.refresh_from_db(fields=['revision'])
+        return Response(
+            {'sommets': len(data['sommets']), 'arcs': len(arcs), 'revision': graph.revision},
+            status=status.HTTP_201_CREATED
+        )
+
 class RunDemoucronView(APIView):
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer]
+
     @swagger_auto_schema(
-        operation_description="Exécute l'algorithme de Demoucron sur un graphe spécifié pour calculer le chemin optimal du nœud initial au nœud final.",
+        operation_description="Exécute l'algorithme de Demoucron sur un graphe spécifié pour calculer le chemin optimal du nœud initial au nœud final. "
+                              "Avec 'Accept: application/x-ndjson', les étapes sont envoyées en flux, une ligne JSON par étape dès qu'elle est calculée. "
+                              "La réponse porte un ETag dérivé de la révision du graphe ; avec 'If-None-Match', renvoie 304 si rien n'a changé. "
+                              "Les moteurs 'dag' (graphe sans circuit) et 'sparse', choisis automatiquement avec trace='none' ou pour "
+                              "un grand graphe creux, ne calculent que le chemin initial -> final et renvoient 'distance' au lieu de "
+                              "la matrice finale ; 'dag' y ajoute les niveaux et les dates au plus tôt / au plus tard.",
+        manual_parameters=[trace_parameter, encoding_parameter, engine_parameter, on_limit_parameter],
         responses={
             200: openapi.Schema(
                 type=openapi.TYPE_OBJECT,
@@ -263,8 +878,25 @@ class RunDemoucronView(APIView):
                         )
                     ),
                     'paths': openapi.Schema(type=openapi.TYPE_OBJECT),
+                    'matrix': openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Items(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Items(type=openapi.TYPE_NUMBER, nullable=True)
+                        ),
+                        description="Matrice finale"
+                    ),
                     'nodes': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_OBJECT)),
                     'edges': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_OBJECT)),
+                    'distance': openapi.Schema(type=openapi.TYPE_NUMBER, nullable=True, description="Moteurs 'sparse' et 'dag' : longueur du chemin initial -> final"),
+                    'algorithm': openapi.Schema(type=openapi.TYPE_STRING, enum=['dijkstra', 'bellman-ford', 'topological'], description="Moteurs 'sparse' et 'dag' : algorithme utilisé"),
+                    'levels': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_STRING)), description="Moteur 'dag' : niveaux de Demoucron (noms des sommets par niveau)"),
+                    'earliest': openapi.Schema(type=openapi.TYPE_OBJECT, description="Moteur 'dag' : date au plus tôt de chaque sommet (plus long chemin depuis le nœud initial)"),
+                    'latest': openapi.Schema(type=openapi.TYPE_OBJECT, description="Moteur 'dag' : date au plus tard de chaque sommet (sans retarder le nœud final)"),
+                    'engine': openapi.Schema(type=openapi.TYPE_STRING, enum=['matrix', 'sparse', 'dag']),
+                    'trace': openapi.Schema(type=openapi.TYPE_STRING, enum=list(TRACE_LEVELS)),
+                    'encoding': openapi.Schema(type=openapi.TYPE_STRING, enum=list(STEP_ENCODINGS)),
+                    'downgraded_from': openapi.Schema(type=openapi.TYPE_OBJECT, description="Trace et encodage demandés, si la trace a été allégée"),
                 }
             ),
             400: openapi.Schema(
@@ -274,44 +906,136 @@ class RunDemoucronView(APIView):
             404: openapi.Schema(
                 type=openapi.TYPE_OBJECT,
                 properties={'error': openapi.Schema(type=openapi.TYPE_STRING)}
-            )
+            ),
+            **admission_responses
         }
     )
+    @method_decorator(condition(etag_func=demoucron_etag))
     def get(self, request, graph_id):
+        options, error = get_run_options(request)
+        if error:
+            return error
+        streaming = wants_stream(request)
         try:
-            graph = Graph.objects.get(pk=graph_id)
-            nodes = list(graph.sommets.all())
-            edges = list(graph.arcs.all())
-
-            if not nodes or not edges:
-                return Response(
-                    {'error': 'Le graphe doit contenir des sommets et des arcs'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Vérifier la présence d'un nœud initial et final
-            if not graph.sommets.filter(type='initial').exists() or not graph.sommets.filter(type='final').exists():
-                return Response(
-                    {'error': 'Le graphe doit avoir un nœud initial et un nœud final'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Construire la matrice et les noms des nœuds
-            initial_matrix, node_names = build_adjacency_matrix(graph)
-            steps, paths = demoucron_algorithm(initial_matrix, node_names)
+            graph = Graph.objects.with_counts().get(pk=graph_id)
+            engine, error = get_engine(request, options, graph.sommet_count, graph.arc_count)
+            if error:
+                return error
+            engine_requested = request.query_params.get('engine', 'auto')
+            if engine in ('sparse', 'dag'):
+                options['trace'] = 'none'
+            # Estimation avant tout chargement : trace allégée ou refus si la réponse ou le calcul dépasse les budgets
+            options, run_estimate, downgraded_from, error = admit_run(
+                request, graph.sommet_count, graph.arc_count, engine, options
+            )
+            if error:
+                return error
+            trace = options['trace']
+            # Cache par révision réservé aux réponses sans étapes : les étapes d'une trace ne sont gardées qu'une
+            # fois, dans le cache des résultats (run_demoucron_cached)
+            if trace == 'none' and not streaming:
+                graph_key = graph_result_key(graph.id, graph.revision,
+                                             {**options, 'engine': engine, 'engine_requested': engine_requested})
+                cached = get_cached(graph_key, 'graph')
+                if cached is not None:
+                    return Response(with_downgrade(cached, downgraded_from))
+            node_names, arcs, error = load_runnable_graph(graph)
+            if error:
+                return error
+
+            if engine in ('sparse', 'dag'):
+                # Sans étapes : listes d'adjacence, sans matrice n × n
+                adjacency = arcs_to_adjacency_lists(len(node_names), arcs)
+                levels = None
+                if engine == 'dag':
+                    levels, error = dag_levels(engine_requested, adjacency)
+                    if error:
+                        return error
+                    if levels is None:
+                        engine = 'sparse'
+                if levels is not None:
+                    # Graphe sans circuit : niveaux et ordre topologique, en temps linéaire
+                    result = {**dag_paths(adjacency, node_names, levels), 'algorithm': 'topological'}
+                else:
+                    # Un seul couple (initial -> final) : Dijkstra ou Bellman-Ford
+                    try:
+                        with admission.heavy_slot(run_estimate):
+                            paths, distance, algorithm = shortest_path(adjacency, node_names)
+                    except NegativeCycleError:
+                        return negative_cycle_response()
+                    result = {'paths': paths, 'distance': distance, 'algorithm': algorithm}
+                if streaming:
+                    start = with_downgrade({'engine': engine, **options}, downgraded_from)
+                    return streaming_response(stream_result(start, result))
+                response_data = {**result, 'engine': engine, **options}
+                if revision_unchanged(graph):
+                    set_cached(graph_key, response_data)
+                return Response(with_downgrade(response_data, downgraded_from))
+
+            if trace == 'none' and not streaming:
+                # Ni étapes ni flux : la matrice finale et le chemin viennent de l'état conservé pour cette révision
+                # (mis à jour en O(n²) par les ajouts d'arcs), sans relancer l'algorithme
+                state = get_graph_state(graph, (node_names, arcs), run_estimate)
+                # Même règle que le moteur creux : 400 si un circuit absorbant se trouve entre initial et final
+                if has_negative_cycle_between(state['distances'], 0, len(node_names) - 1):
+                    return negative_cycle_response()
+                response_data = {
+                    'paths': initial_final_paths(state['distances'], state['predecessors'], node_names),
+                    'matrix': state['distances'],
+                    'engine': engine,
+                    **options
+                }
+                if revision_unchanged(graph):
+                    set_cached(graph_key, response_data)
+                return Response(with_downgrade(response_data, downgraded_from))
+
+            initial_matrix = arcs_to_matrix(len(node_names), arcs)
+            if streaming:
+                start = with_downgrade({'engine': engine, **options}, downgraded_from)
+                if trace != 'none':
+                    start.update(graph_nodes_and_edges(graph))
+                # Le calcul a lieu pendant l'envoi : la place est rendue à la fermeture du flux
+                release = admission.acquire(run_estimate)
+                runner = iter_demoucron(initial_matrix, node_names, workers=admission.relax_workers(len(node_names)),
+                                        **options)
+                lines = stream_demoucron(runner, start)
+                return streaming_response(admission.HeldStream(lines, release))
 
-            return Response({
+            steps, paths, matrix = run_demoucron_cached(initial_matrix, node_names, 'min', options, run_estimate)
+            if has_negative_cycle_between(matrix, 0, len(node_names) - 1):
+                return negative_cycle_response()
+
+            response_data = {
                 'steps': steps,
                 'paths': paths,
-                'nodes': SommetSerializer(nodes, many=True).data,
-                'edges': ArcSerializer(edges, many=True).data
-            })
+                'matrix': matrix,
+                **graph_nodes_and_edges(graph),
+                'engine': engine,
+                **options
+            }
+            return Response(with_downgrade(response_data, downgraded_from))
         except Graph.DoesNotExist:
             return Response({'error': 'Graphe introuvable'}, status=status.HTTP_404_NOT_FOUND)
+        except admission.Busy as exc:
+            return admission_error(exc)
 
 class MatrixDemoucronView(APIView):
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer, NPZRenderer]
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES + [NPZParser, NPYParser]
+
     @swagger_auto_schema(
-        operation_description="Exécute l'algorithme de Demoucron sur une matrice fournie avec la méthode spécifiée (min ou max).",
+        operation_description="Exécute l'algorithme de Demoucron sur une matrice fournie avec la méthode spécifiée (min ou max). "
+                              "Avec 'Accept: application/x-ndjson', les étapes sont envoyées en flux, une ligne JSON par étape dès qu'elle est calculée. "
+                              "Formats binaires (NaN ou inf pour l'absence d'arc) : le corps peut être une archive .npz "
+                              "('Content-Type: application/x-npz', tableaux 'matrix', 'node_names' et 'method' facultatif) ou un "
+                              "tableau .npy ('Content-Type: application/x-npy', noms et méthode dans l'URL : node_names=A,B,C&method=min). "
+                              "Avec 'Accept: application/x-npz', la réponse est une archive .npz : 'matrix', 'node_names', 'path' "
+                              "et, selon la trace, 'changed' ('summary') ou 'steps' ('steps', pile des matrices d'étape). "
+                              "Avec trace='none' en JSON, une matrice sans circuit (ordonnancement, chemin critique avec 'max') "
+                              "est traitée par le moteur 'dag' (niveaux, puis matrice finale en O(n·E), dans le dtype demandé). "
+                              "Sans trace, la réponse a les mêmes clés quel que soit le moteur : chemin, 'matrix', 'distance', "
+                              "niveaux et dates au plus tôt / au plus tard (null si la matrice a un circuit).",
+        manual_parameters=[trace_parameter, encoding_parameter, matrix_engine_parameter, dtype_parameter, on_limit_parameter],
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
             required=['matrix', 'node_names', 'method'],
@@ -325,32 +1049,366 @@ class MatrixDemoucronView(APIView):
             200: openapi.Schema(type=openapi.TYPE_OBJECT, properties={
                 'steps': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_OBJECT)),
                 'paths': openapi.Schema(type=openapi.TYPE_OBJECT),
+                'matrix': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_NUMBER, nullable=True))),
                 'nodes': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_OBJECT)),
                 'edges': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_OBJECT)),
+                'distance': openapi.Schema(type=openapi.TYPE_NUMBER, nullable=True, description="Sans trace : longueur du chemin"),
+                'algorithm': openapi.Schema(type=openapi.TYPE_STRING, enum=['topological', 'demoucron'], description="Sans trace : algorithme utilisé"),
+                'levels': openapi.Schema(type=openapi.TYPE_ARRAY, nullable=True, items=openapi.Items(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_STRING)), description="Sans trace : niveaux de Demoucron (null si la matrice a un circuit)"),
+                'earliest': openapi.Schema(type=openapi.TYPE_OBJECT, nullable=True, description="Sans trace : date au plus tôt de chaque nœud (null si la matrice a un circuit)"),
+                'latest': openapi.Schema(type=openapi.TYPE_OBJECT, nullable=True, description="Sans trace : date au plus tard de chaque nœud (null si la matrice a un circuit)"),
+                'engine': openapi.Schema(type=openapi.TYPE_STRING, enum=['matrix', 'dag']),
+                'dtype': openapi.Schema(type=openapi.TYPE_STRING, enum=list(DTYPES), description="Présent si dtype a été demandé"),
+                'methode': openapi.Schema(type=openapi.TYPE_STRING),
+                'trace': openapi.Schema(type=openapi.TYPE_STRING, enum=list(TRACE_LEVELS)),
+                'encoding': openapi.Schema(type=openapi.TYPE_STRING, enum=list(STEP_ENCODINGS)),
+                'downgraded_from': openapi.Schema(type=openapi.TYPE_OBJECT, description="Trace et encodage demandés, si la trace a été allégée"),
             }),
-            400: openapi.Schema(type=openapi.TYPE_OBJECT, properties={'error': openapi.Schema(type=openapi.TYPE_STRING)})
+            400: openapi.Schema(type=openapi.TYPE_OBJECT, properties={'error': openapi.Schema(type=openapi.TYPE_STRING)}),
+            **admission_responses
         }
     )
     def post(self, request):
-        matrix = request.data.get('matrix')
-        node_names = request.data.get('node_names')
-        method = request.data.get('method', 'min')
-        if not matrix or not node_names or len(matrix) != len(node_names):
-            return Response({'error': 'Invalid input'}, status=status.HTTP_400_BAD_REQUEST)
+        options, error = get_run_options(request)
+        if error:
+            return error
+        trace = options['trace']
+        matrix, node_names, method, arc_count, error = get_matrix_input(request)
+        if error:
+            return error
+        binary = request.accepted_renderer.format == NPZRenderer.format
+        if binary and trace == 'full':
+            return Response(
+                {'error': "Le détail des calculs (trace='full') n'est disponible qu'en JSON"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        engine, error = get_matrix_engine(request, options, binary)
+        if error:
+            return error
+        if engine == 'dag':
+            # Détection des circuits avant l'estimation : une matrice avec circuit repasse par Demoucron en 'auto'
+            adjacency = arcs_to_adjacency_lists(len(node_names), matrix_to_arcs(matrix))
+            levels, error = dag_levels(request.query_params.get('engine', 'auto'), adjacency)
+            if error:
+                return error
+            if levels is None:
+                engine = 'matrix'
+            else:
+                options['trace'] = 'none'
+        options, run_estimate, downgraded_from, error = admit_run(
+            request, len(node_names), arc_count, engine, options, binary=binary, all_pairs=True
+        )
+        if error:
+            return error
+        trace = options['trace']
+        dtype, error = get_dtype(request, trace)
+        if error:
+            return error
+        if dtype != 'float64':
+            options = {**options, 'dtype': dtype}
+        if engine == 'dag':
+            # Mêmes clés que le moteur 'matrix' sans trace, dont la matrice de toutes les paires (dans le dtype demandé)
+            with admission.heavy_slot(run_estimate):
+                result = {
+                    **dag_paths(adjacency, node_names, levels, method),
+                    'matrix': dag_all_pairs(adjacency, levels, method, np.dtype(dtype)),
+                    'algorithm': 'topological',
+                }
+            if wants_stream(request):
+                start = with_downgrade({'engine': engine, 'methode': method, **options}, downgraded_from)
+                return streaming_response(stream_result(start, result))
+            return Response(with_downgrade({**result, 'engine': engine, 'methode': method, **options}, downgraded_from))
         try:
-            matrix = np.array(matrix, dtype=float)
-            matrix = np.where(matrix == None, np.inf if method == 'min' else -np.inf, matrix)
-        except:
-            return Response({'error': 'Invalid matrix format'}, status=status.HTTP_400_BAD_REQUEST)
-        steps, paths = demoucron_algorithm(matrix, node_names, method=method)
-        return Response({
+            if binary:
+                arrays = run_demoucron_arrays_cached(matrix, node_names, method, trace, run_estimate, dtype)
+                return Response(with_downgrade({**arrays, 'methode': method, 'trace': trace}, downgraded_from))
+            if wants_stream(request) and trace != 'none':
+                start = with_downgrade({'engine': engine, 'methode': method, **options}, downgraded_from)
+                if trace != 'none':
+                    start['nodes'] = [{'name': name} for name in node_names]
+                    start['edges'] = []
+                release = admission.acquire(run_estimate)
+                runner = iter_demoucron(matrix, node_names, method=method,
+                                        workers=admission.relax_workers(len(node_names)), **options)
+                lines = stream_demoucron(runner, start)
+                return streaming_response(admission.HeldStream(lines, release))
+
+            steps, paths, final_matrix = run_demoucron_cached(matrix, node_names, method, options, run_estimate)
+        except admission.Busy as exc:
+            return admission_error(exc)
+        if trace == 'none':
+            # Sans trace, rien à envoyer au fil du calcul : un flux ne contient que l'en-tête et le résultat
+            result = {'paths': paths, 'matrix': final_matrix, **dag_fields(matrix, node_names, method, final_matrix),
+                      'algorithm': 'demoucron'}
+            if wants_stream(request):
+                start = with_downgrade({'engine': engine, 'methode': method, **options}, downgraded_from)
+                return streaming_response(stream_result(start, result))
+            return Response(with_downgrade({**result, 'engine': engine, 'methode': method, **options}, downgraded_from))
+        return Response(with_downgrade({
             'steps': steps,
             'paths': paths,
+            'matrix': final_matrix,
             'nodes': [{'name': name} for name in node_names],
             'edges': [],
-            'methode': method
-        })
+            'engine': engine,
+            'methode': method,
+            **options
+        }, downgraded_from))
+
+
+class RunDemoucronJobView(APIView):
+    @swagger_auto_schema(
+        operation_description="Soumet l'exécution de l'algorithme de Demoucron sur un graphe comme tâche asynchrone "
+                              "(moteur 'matrix'). Renvoie immédiatement l'identifiant de la tâche, à suivre avec GET jobs/<id>/.",
+        manual_parameters=[trace_parameter, encoding_parameter, on_limit_parameter],
+        responses={**job_submit_responses, 404: openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={'error': openapi.Schema(type=openapi.TYPE_STRING)}
+        )}
+    )
+    def post(self, request, graph_id):
+        options, error = get_run_options(request)
+        if error:
+            return error
+        try:
+            graph = Graph.objects.get(pk=graph_id)
+        except Graph.DoesNotExist:
+            return Response({'error': 'Graphe introuvable'}, status=status.HTTP_404_NOT_FOUND)
+        node_names, arcs, error = load_runnable_graph(graph)
+        if error:
+            return error
+        # Pas de budget de calcul pour une tâche asynchrone, mais son résultat est conservé en mémoire
+        options, _, downgraded_from, error = admit_run(
+            request, len(node_names), len(arcs[0]), 'matrix', options, synchronous=False
+        )
+        if error:
+            return error
+        extra = with_downgrade({'engine': 'matrix', **options}, downgraded_from)
+        if options['trace'] != 'none':
+            extra.update(graph_nodes_and_edges(graph))
+        return submit_job(arcs_to_matrix(len(node_names), arcs), node_names, 'min', options, extra)
+
+class MatrixDemoucronJobView(APIView):
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES + [NPZParser, NPYParser]
+
+    @swagger_auto_schema(
+        operation_description="Soumet l'exécution de l'algorithme de Demoucron sur une matrice fournie comme tâche asynchrone. "
+                              "Même corps que matrix_demoucron/ ; renvoie immédiatement l'identifiant de la tâche.",
+        manual_parameters=[trace_parameter, encoding_parameter, on_limit_parameter],
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['matrix', 'node_names', 'method'],
+            properties={
+                'matrix': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_NUMBER, nullable=True))),
+                'node_names': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_STRING)),
+                'method': openapi.Schema(type=openapi.TYPE_STRING, enum=['min', 'max'], description="Méthode de calcul (min ou max)"),
+            },
+        ),
+        responses=job_submit_responses
+    )
+    def post(self, request):
+        options, error = get_run_options(request)
+        if error:
+            return error
+        matrix, node_names, method, arc_count, error = get_matrix_input(request)
+        if error:
+            return error
+        options, _, downgraded_from, error = admit_run(
+            request, len(node_names), arc_count, 'matrix', options, synchronous=False
+        )
+        if error:
+            return error
+        extra = with_downgrade({'methode': method, **options}, downgraded_from)
+        if options['trace'] != 'none':
+            extra['nodes'] = [{'name': name} for name in node_names]
+            extra['edges'] = []
+        return submit_job(matrix, node_names, method, options, extra)
+
+class MatrixDemoucronBatchView(APIView):
+    @swagger_auto_schema(
+        operation_description="Exécute l'algorithme de Demoucron sur une liste de matrices en une seule requête. "
+                              "Les matrices de même taille et de même méthode sont relaxées ensemble (pile 3-D) et les lots "
+                              "volumineux sont répartis sur plusieurs processus. Les résultats ('paths', 'matrix', 'methode', "
+                              "comme avec trace='none') sont renvoyés dans l'ordre des éléments ; un élément invalide "
+                              "donne {'error': ...} à sa place sans interrompre les autres.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['items'],
+            properties={
+                'items': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Items(
+                        type=openapi.TYPE_OBJECT,
+                        properties={
+                            'matrix': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_NUMBER, nullable=True))),
+                            'node_names': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_STRING)),
+                            'method': openapi.Schema(type=openapi.TYPE_STRING, enum=['min', 'max']),
+                        }
+                    )
+                ),
+            },
+        ),
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'results': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_OBJECT)),
+                    'count': openapi.Schema(type=openapi.TYPE_INTEGER),
+                }
+            ),
+            400: openapi.Schema(type=openapi.TYPE_OBJECT, properties={'error': openapi.Schema(type=openapi.TYPE_STRING)}),
+            **admission_responses
+        }
+    )
+    def post(self, request):
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
+            return Response({'error': "'items' doit être une liste non vide"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.DEMOUCRON_BATCH_MAX_ITEMS:
+            return Response(
+                {'error': f"Trop d'éléments (maximum {settings.DEMOUCRON_BATCH_MAX_ITEMS})"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
+        results = [None] * len(items)
+        valid_indices = []
+        valid_items = []
+        for index, item in enumerate(items):
+            matrix, node_names, method, error = parse_matrix_input(item if isinstance(item, dict) else {})
+            if error:
+                results[index] = {'error': error}
+            else:
+                valid_indices.append(index)
+                valid_items.append((matrix, node_names, method))
+        if valid_items:
+            try:
+                run_estimate = admission.admit_batch([len(node_names) for _, node_names, _ in valid_items])
+                with admission.heavy_slot(run_estimate):
+                    batch_results = run_batch(valid_items)
+            except (admission.RunTooExpensive, admission.ResponseTooLarge, admission.Busy) as exc:
+                return admission_error(exc)
+            for index, result in zip(valid_indices, batch_results):
+                results[index] = result
+        return Response({'results': results, 'count': len(results)})
+
+class JobDetailView(APIView):
+    @swagger_auto_schema(
+        operation_description="État d'une tâche asynchrone : 'queued', 'running', 'cancelling', 'done', 'failed', "
+                              "'cancelled' ou 'timeout', avec la progression (étape k sur n) et le résultat une fois terminée. "
+                              "Les résultats sont conservés DEMOUCRON_JOB_RESULT_TTL secondes.",
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'id': openapi.Schema(type=openapi.TYPE_STRING),
+                    'status': openapi.Schema(type=openapi.TYPE_STRING),
+                    'progress': openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        properties={
+                            'step': openapi.Schema(type=openapi.TYPE_INTEGER),
+                            'total': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        }
+                    ),
+                    'result': openapi.Schema(type=openapi.TYPE_OBJECT, description="Même contenu que la réponse synchrone"),
+                    'error': openapi.Schema(type=openapi.TYPE_STRING),
+                }
+            ),
+            404: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={'error': openapi.Schema(type=openapi.TYPE_STRING)}
+            )
+        }
+    )
+    def get(self, request, job_id):
+        job = jobs.get(job_id)
+        if job is None:
+            return Response({'error': 'Tâche introuvable'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job)
+
+    @swagger_auto_schema(
+        operation_description="Annule une tâche asynchrone (retirée de la file, ou arrêtée à la fin de l'étape en cours), "
+                              "ou oublie le résultat d'une tâche terminée.",
+        responses={
+            202: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={'message': openapi.Schema(type=openapi.TYPE_STRING)}
+            ),
+            404: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={'error': openapi.Schema(type=openapi.TYPE_STRING)}
+            )
+        }
+    )
+    def delete(self, request, job_id):
+        if not jobs.cancel(job_id):
+            return Response({'error': 'Tâche introuvable'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'message': 'Annulation demandée'}, status=status.HTTP_202_ACCEPTED)
+
+class GraphPathsView(APIView):
+    @swagger_auto_schema(
+        operation_description="Renvoie les plus courts chemins de plusieurs couples de sommets ('pairs=A-B,C-D'). "
+                              "Les distances et prédécesseurs de toutes les paires sont calculés une seule fois par révision "
+                              "du graphe ; chaque chemin est ensuite reconstruit en O(longueur du chemin).",
+        manual_parameters=[
+            openapi.Parameter(
+                'pairs',
+                openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                required=True,
+                description="Couples 'source-cible' séparés par des virgules, par exemple 'A-B,C-D'"
+            ),
+        ],
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'paths': openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        description="Chemin (liste de noms, vide si la cible est inaccessible) par couple 'source-cible'"
+                    ),
+                    'distances': openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        description="Longueur du chemin (null si la cible est inaccessible) par couple 'source-cible'"
+                    ),
+                    'revision': openapi.Schema(type=openapi.TYPE_INTEGER),
+                }
+            ),
+            400: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={'error': openapi.Schema(type=openapi.TYPE_STRING)}
+            ),
+            404: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={'error': openapi.Schema(type=openapi.TYPE_STRING)}
+            ),
+            **admission_responses
+        }
+    )
+    @method_decorator(condition(etag_func=paths_etag))
+    def get(self, request, graph_id):
+        raw_pairs = request.query_params.get('pairs', '')
+        if not raw_pairs.strip():
+            return Response({'error': "Le paramètre 'pairs' est requis (par exemple 'A-B,C-D')"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            graph = Graph.objects.with_counts().get(pk=graph_id)
+            try:
+                _, run_estimate = admission.admit(graph.sommet_count, graph.arc_count, 'matrix',
+                                                  {'trace': 'none', 'encoding': 'full'}, downgrade=False)
+                state = get_graph_state(graph, run_estimate=run_estimate)
+            except (admission.RunTooExpensive, admission.ResponseTooLarge, admission.Busy) as exc:
+                return admission_error(exc)
+            try:
+                pairs = parse_pairs(raw_pairs, state['node_names'])
+            except ValueError as exc:
+                return Response({'error': f"Couple invalide ou sommet introuvable : {exc}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if has_negative_cycle(state['distances']):
+                return negative_cycle_response()
+            paths, distances = paths_between(state['distances'], state['predecessors'], state['node_names'], pairs)
+            return Response({'paths': paths, 'distances': distances, 'revision': graph.revision})
+        except Graph.DoesNotExist:
+            return Response({'error': 'Graphe introuvable'}, status=status.HTTP_404_NOT_FOUND)
 
 class DeleteSommetView(APIView):
     @swagger_auto_schema(
@@ -421,8 +1479,44 @@ class GraphClearView(APIView):
     def delete(self, request, graph_id):
         try:
             graph = Graph.objects.get(pk=graph_id)
-            graph.arcs.all().delete()
-            graph.sommets.all().delete()
+            with transaction.atomic():
+                graph.arcs.all().delete()
+                graph.sommets.all().delete()
+                Graph.bump_revision(graph.id)
             return Response({"message": "Graphe vidé avec succès"}, status=status.HTTP_200_OK)
         except Graph.DoesNotExist:
-            return Response({'error': 'Graphe introuvable'}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            return Response({'error': 'Graphe introuvable'}, status=status.HTTP_404_NOT_FOUND)
+
+class CacheStatsView(APIView):
+    @swagger_auto_schema(
+        operation_description="Compteurs de succès et d'échecs du cache des résultats de Demoucron "
+                              "('graph' : réponses par graphe, 'result' : résultats par contenu de matrice, "
+                              "'state' : distances et prédécesseurs par graphe pour les requêtes de chemins).",
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    kind: openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        properties={
+                            'hits': openapi.Schema(type=openapi.TYPE_INTEGER),
+                            'misses': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        }
+                    )
+                    for kind in ('graph', 'result', 'state')
+                }
+            )
+        }
+    )
+    def get(self, request):
+        return Response(cache_stats())
+
+class MetricsView(APIView):
+    @swagger_auto_schema(
+        operation_description="Métriques au format texte Prometheus : histogrammes de durée par point d'accès et par phase "
+                              "(orm, matrix, relax, snapshot, render...), nombre de requêtes SQL et taille des graphes traités "
+                              "(n, E). Les valeurs sont agrégées par processus serveur depuis son démarrage.",
+        responses={200: openapi.Response('Texte au format d\'exposition Prometheus 0.0.4')}
+    )
+    def get(self, request):
+        return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,112 +1,867 @@
+import heapq
+import json
+import os
+import struct
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
-def build_adjacency_matrix(graph):
-    nodes = list(graph.sommets.all())
-    
-    initial = [node for node in nodes if node.type == 'initial']
-    normal = [node for node in nodes if node.type == 'normal']
-    final = [node for node in nodes if node.type == 'final']
-    
-    ordered_nodes = initial + normal + final
-    node_names = [node.name for node in ordered_nodes]
+from timing import phase, record_graph_size
+
+NODE_TYPE_ORDER = {'initial': 0, 'normal': 1, 'final': 2}
+
+# Instantané binaire d'un graphe : en-tête (SNAPSHOT_HEADER), poids float64, offsets CSR int32 (n + 1), cibles int32,
+# types int8, puis la liste JSON des noms. Les poids viennent juste après l'en-tête de 24 octets pour rester alignés
+SNAPSHOT_MAGIC = b'DMS1'
+SNAPSHOT_HEADER = struct.Struct('<4sIIIII')
+NODE_TYPES = ('initial', 'normal', 'final')
+
+def encode_snapshot(node_names, node_types, arcs, arc_count):
+    # arcs : (sources, targets, weights) sans arcs parallèles, tels que renvoyés par load_arcs
+    sources, targets, weights = arcs
     n = len(node_names)
+    order = np.argsort(sources, kind='stable')
+    offsets = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+    types = np.array([NODE_TYPE_ORDER.get(node_type, 1) for node_type in node_types], dtype=np.int8)
+    names = json.dumps(node_names, ensure_ascii=False).encode('utf-8')
+    return b''.join((
+        SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, n, len(targets), arc_count, len(names), 0),
+        np.ascontiguousarray(weights[order], dtype=np.float64).tobytes(),
+        offsets.tobytes(),
+        np.ascontiguousarray(targets[order], dtype=np.int32).tobytes(),
+        types.tobytes(),
+        names,
+    ))
+
+def decode_snapshot(data):
+    # Sans copie : poids et cibles sont des vues en lecture seule sur `data` (bytes ou memoryview)
+    magic, n, edge_count, arc_count, names_length, _ = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Instantané de graphe illisible")
+    offset = SNAPSHOT_HEADER.size
+    weights = np.frombuffer(data, dtype=np.float64, count=edge_count, offset=offset)
+    offset += weights.nbytes
+    offsets = np.frombuffer(data, dtype=np.int32, count=n + 1, offset=offset)
+    offset += offsets.nbytes
+    targets = np.frombuffer(data, dtype=np.int32, count=edge_count, offset=offset)
+    offset += targets.nbytes
+    types = np.frombuffer(data, dtype=np.int8, count=n, offset=offset)
+    offset += types.nbytes
+    node_names = json.loads(bytes(data[offset:offset + names_length]).decode('utf-8'))
+    node_types = [NODE_TYPES[code] for code in types.tolist()]
+    sources = np.repeat(np.arange(n, dtype=np.int64), np.diff(offsets))
+    return node_names, node_types, (sources, targets, weights), arc_count
 
-    matrix = np.full((n, n), np.inf)
-    np.fill_diagonal(matrix, 0)
+def load_arcs(graph):
+    # Depuis l'instantané binaire du graphe quand il est à jour (une requête, sans conversion ligne à ligne) ;
+    # sinon depuis les tables (query_arcs). Lecture seule : l'instantané est reconstruit à chaque modification
+    # du graphe (Graph.bump_revision), jamais par une lecture
+    with phase('orm'):
+        snapshot = graph.read_snapshot()
+    if snapshot is not None:
+        with phase('snapshot_load'):
+            loaded = decode_snapshot(snapshot)
+    else:
+        loaded = query_arcs(graph)
+    record_graph_size(len(loaded[0]), loaded[3])
+    return loaded
 
-    for edge in graph.arcs.all():
-        source_idx = node_names.index(edge.source.name)
-        target_idx = node_names.index(edge.target.name)
-        matrix[source_idx, target_idx] = edge.weight
+def query_arcs(graph):
+    # Deux requêtes quelle que soit la taille du graphe : les sommets (id, nom, type) puis les arcs
+    # (source_id, target_id, poids), convertis en indices de sommets par une indexation vectorisée
+    with phase('orm'):
+        nodes = sorted(graph.sommets.order_by('id').values_list('id', 'name', 'type'),
+                       key=lambda node: NODE_TYPE_ORDER.get(node[2], 1))
+        rows = list(graph.arcs.order_by('id').values_list('source_id', 'target_id', 'weight'))
+    node_names = [name for _, name, _ in nodes]
+    node_types = [node_type for _, _, node_type in nodes]
+    n = len(nodes)
 
-    matrix = np.where(np.isinf(matrix), None, matrix)
-    
-    matrix = matrix.tolist()
+    sources = targets = np.empty(0, dtype=np.int64)
+    weights = np.empty(0)
+    if n and rows:
+        # Identifiants (entiers) et poids (flottants) dans des tableaux séparés ; les identifiants sont convertis en
+        # indices de sommets par recherche dichotomique dans les identifiants triés du graphe (mémoire en O(n),
+        # quelle que soit la taille de la table des sommets)
+        source_ids, target_ids, arc_weights = zip(*rows)
+        node_ids = np.array([node_id for node_id, _, _ in nodes], dtype=np.int64)
+        order = np.argsort(node_ids)
+        sorted_ids = node_ids[order]
+        sources = order[np.searchsorted(sorted_ids, np.array(source_ids, dtype=np.int64))]
+        targets = order[np.searchsorted(sorted_ids, np.array(target_ids, dtype=np.int64))]
+        weights = np.array(arc_weights, dtype=float)
+        # En cas d'arcs parallèles, le dernier créé l'emporte
+        cells = sources * n + targets
+        _, last = np.unique(cells[::-1], return_index=True)
+        keep = np.sort(len(cells) - 1 - last)
+        sources, targets, weights = sources[keep], targets[keep], weights[keep]
+    return node_names, node_types, (sources, targets, weights), len(rows)
+
+def arcs_to_matrix(n, arcs):
+    sources, targets, weights = arcs
+    with phase('matrix'):
+        matrix = np.full((n, n), np.inf)
+        np.fill_diagonal(matrix, 0)
+        matrix[sources, targets] = weights
+    return matrix
+
+def load_adjacency(graph):
+    node_names, node_types, arcs, arc_count = load_arcs(graph)
+    return arcs_to_matrix(len(node_names), arcs), node_names, node_types, arc_count
+
+def build_adjacency_matrix(graph):
+    # Matrice numpy (inf pour l'absence d'arc) : la conversion en JSON est laissée au renderer
+    matrix, node_names, _, _ = load_adjacency(graph)
     return matrix, node_names
 
-def demoucron_algorithm(matrix, node_names, method='min'):
-    n = len(matrix)
+def to_working_matrix(matrix, method='min'):
     current_matrix = np.array(matrix, dtype=float)
-    current_matrix = np.where(current_matrix == None, np.inf if method == 'min' else -np.inf, current_matrix)
-    predecessors = np.full((n, n), -1, dtype=int)
-    
-    # Initialisation des prédécesseurs pour les arêtes directes
+    # Les cases None deviennent NaN lors de la conversion ; NaN et ±inf hors diagonale (marqueurs d'absence des
+    # corps .npy / .npz, quel que soit leur signe) deviennent l'absence d'arc de la méthode
+    missing = ~np.isfinite(current_matrix)
+    np.fill_diagonal(missing, np.isnan(np.diagonal(current_matrix)))
+    current_matrix[missing] = np.inf if method == 'min' else -np.inf
+    return current_matrix
+
+def matrix_to_list(matrix):
+    return np.where(np.isinf(matrix) | np.isnan(matrix), None, matrix).tolist()
+
+def _finite_or_none(values):
+    return np.where(np.isfinite(values), values, None).tolist()
+
+def _matrix_edges(matrix, node_names):
+    # Arcs présents (valeur != inf) hors diagonale, dans l'ordre ligne par ligne
+    mask = matrix != np.inf
+    np.fill_diagonal(mask, False)
+    rows, cols = np.nonzero(mask)
+    weights = matrix[rows, cols]
+    weights = np.where(np.isinf(weights), None, weights).tolist()
+    return [{'source': node_names[i], 'target': node_names[j], 'weight': weight}
+            for i, j, weight in zip(rows.tolist(), cols.tolist(), weights)]
+
+def _is_neutral_diagonal(value, method):
+    # Si V_kk ne peut pas améliorer la ligne/colonne k, celles-ci restent fixes pendant l'étape k
+    # et toute l'étape peut être calculée en une seule diffusion
+    if method == 'min':
+        return not value < 0
+    return not (value > 0 and value != np.inf)
+
+def _relax_step_scalar(current_matrix, predecessors, k, method, calculations=None):
+    # Version élément par élément, utilisée seulement quand V_kk modifie la ligne/colonne k
+    n = len(current_matrix)
+    changed = ([], [], [])
     for i in range(n):
         for j in range(n):
-            if current_matrix[i][j] != np.inf and i != j:
-                predecessors[i][j] = i
+            if i != j and current_matrix[i][k] != np.inf and current_matrix[k][j] != np.inf:
+                W_ij = current_matrix[i][k] + current_matrix[k][j]
+                V_ik = current_matrix[i][k]
+                V_kj = current_matrix[k][j]
+                V_ij_prev = current_matrix[i][j]
+                new_V_ij = V_ij_prev
+
+                if method == 'min':
+                    improved = W_ij < V_ij_prev
+                else:
+                    improved = W_ij > V_ij_prev and W_ij != np.inf
+                if improved:
+                    new_V_ij = W_ij
+                    current_matrix[i][j] = W_ij
+                    predecessors[i][j] = predecessors[k][j]
+                    changed[0].append(i)
+                    changed[1].append(j)
+                    changed[2].append(V_ij_prev)
+
+                if calculations is None:
+                    continue
+                calculations.append({
+                    'i': i + 1,
+                    'j': j + 1,
+                    'k': k + 1,
+                    'W_ij': W_ij if np.isfinite(W_ij) else None,
+                    'V_ik': V_ik if np.isfinite(V_ik) else None,
+                    'V_kj': V_kj if np.isfinite(V_kj) else None,
+                    'V_ij_prev': V_ij_prev if np.isfinite(V_ij_prev) else None,
+                    'new_V_ij': new_V_ij if np.isfinite(new_V_ij) else None
+                })
+    rows, cols, previous = changed
+    return np.array(rows, dtype=int), np.array(cols, dtype=int), np.array(previous, dtype=float)
+
+def _relax_step(current_matrix, predecessors, k, method, calculations=None):
+    # Relaxe l'étape k en place et renvoie les cases modifiées (lignes, colonnes, anciennes valeurs) ;
+    # le détail des calculs n'est construit que si une liste est fournie
+    if not _is_neutral_diagonal(current_matrix[k, k], method):
+        return _relax_step_scalar(current_matrix, predecessors, k, method, calculations)
+
+    column_k = current_matrix[:, k].copy()
+    row_k = current_matrix[k, :].copy()
+    candidates = column_k[:, None] + row_k[None, :]
+
+    valid = (column_k != np.inf)[:, None] & (row_k != np.inf)[None, :]
+    np.fill_diagonal(valid, False)
+    if method == 'min':
+        improved = valid & (candidates < current_matrix)
+    else:
+        improved = valid & (candidates > current_matrix) & (candidates != np.inf)
 
-    steps = [
+    changed_rows, changed_cols = np.nonzero(improved)
+    changed = (changed_rows, changed_cols, current_matrix[changed_rows, changed_cols])
+    if calculations is not None:
+        rows, cols = np.nonzero(valid)
+        previous = current_matrix[rows, cols]
+
+    np.copyto(current_matrix, candidates, where=improved)
+    np.copyto(predecessors, np.broadcast_to(predecessors[k].copy(), predecessors.shape), where=improved)
+
+    if calculations is None:
+        return changed
+
+    calculations.extend(
         {
-            'step': 0,
-            'matrix': np.where(np.isinf(current_matrix) | np.isnan(current_matrix), None, current_matrix).tolist(),
-            'intermediate_node': None,
-            'calculations': [],
-            'edges': [{'source': node_names[i], 'target': node_names[j], 'weight': current_matrix[i][j] if not np.isinf(current_matrix[i][j]) else None}
-                      for i in range(n) for j in range(n) if current_matrix[i][j] != np.inf and i != j]
+            'i': i + 1,
+            'j': j + 1,
+            'k': k + 1,
+            'W_ij': W_ij,
+            'V_ik': V_ik,
+            'V_kj': V_kj,
+            'V_ij_prev': V_ij_prev,
+            'new_V_ij': new_V_ij
         }
-    ]
+        for i, j, W_ij, V_ik, V_kj, V_ij_prev, new_V_ij in zip(
+            rows.tolist(),
+            cols.tolist(),
+            _finite_or_none(candidates[rows, cols]),
+            _finite_or_none(column_k[rows]),
+            _finite_or_none(row_k[cols]),
+            _finite_or_none(previous),
+            _finite_or_none(current_matrix[rows, cols]),
+        )
+    )
+    return changed
 
-    # Algorithme principal
-    for k in range(n):
-        calculations = []
-        for i in range(n):
-            for j in range(n):
-                if i != j and current_matrix[i][k] != np.inf and current_matrix[k][j] != np.inf:
-                    W_ij = current_matrix[i][k] + current_matrix[k][j]
-                    V_ik = current_matrix[i][k]
-                    V_kj = current_matrix[k][j]
-                    V_ij_prev = current_matrix[i][j]
-                    new_V_ij = V_ij_prev
-
-                    if method == 'min' and W_ij < V_ij_prev:
-                        new_V_ij = W_ij
-                        current_matrix[i][j] = W_ij
-                        predecessors[i][j] = predecessors[k][j]
-                    elif method == 'max' and W_ij > V_ij_prev and W_ij != np.inf:
-                        new_V_ij = W_ij
-                        current_matrix[i][j] = W_ij
-                        predecessors[i][j] = predecessors[k][j]
-
-                    calculations.append({
-                        'i': i + 1,
-                        'j': j + 1,
-                        'k': k + 1,
-                        'W_ij': W_ij if np.isfinite(W_ij) else None,
-                        'V_ik': V_ik if np.isfinite(V_ik) else None,
-                        'V_kj': V_kj if np.isfinite(V_kj) else None,
-                        'V_ij_prev': V_ij_prev if np.isfinite(V_ij_prev) else None,
-                        'new_V_ij': new_V_ij if np.isfinite(new_V_ij) else None
-                    })
-
-        steps.append({
-            'step': k + 1,
-            'matrix': np.where(np.isinf(current_matrix) | np.isnan(current_matrix), None, current_matrix).tolist(),
-            'intermediate_node': node_names[k],
-            'calculations': calculations,
-            'edges': [{'source': node_names[i], 'target': node_names[j], 'weight': current_matrix[i][j] if not np.isinf(current_matrix[i][j]) else None}
-                      for i in range(n) for j in range(n) if current_matrix[i][j] != np.inf and i != j]
-        })
+TRACE_LEVELS = ('none', 'summary', 'steps', 'full')
+STEP_ENCODINGS = ('full', 'delta')
 
-    # Construire le chemin optimal (uniquement du nœud initial au nœud final)
-    def get_path(start, end):
-        if current_matrix[start][end] == np.inf or predecessors[start][end] == -1:
+def _step_snapshot(step, current_matrix, intermediate_node, node_names, calculations=None):
+    snapshot = {
+        'step': step,
+        'matrix': current_matrix.copy(),
+        'intermediate_node': intermediate_node,
+    }
+    if calculations is not None:
+        snapshot['calculations'] = calculations
+    snapshot['edges'] = _matrix_edges(current_matrix, node_names)
+    return snapshot
+
+def _step_delta(step, current_matrix, intermediate_node, node_names, changed, calculations=None):
+    # Étape encodée en différence : uniquement les cases modifiées [i, j, ancienne, nouvelle]
+    # (indices à partir de 0) et les arcs ajoutés ou dont le poids a changé
+    rows, cols, previous = changed
+    values = current_matrix[rows, cols]
+    delta = {
+        'step': step,
+        'intermediate_node': intermediate_node,
+    }
+    if calculations is not None:
+        delta['calculations'] = calculations
+    delta['changes'] = [[i, j, old, new] for i, j, old, new in zip(
+        rows.tolist(), cols.tolist(), matrix_to_list(previous), matrix_to_list(values)
+    )]
+    is_edge = values != np.inf
+    weights = np.where(np.isinf(values[is_edge]), None, values[is_edge]).tolist()
+    delta['edges'] = [{'source': node_names[i], 'target': node_names[j], 'weight': weight}
+                      for i, j, weight in zip(rows[is_edge].tolist(), cols[is_edge].tolist(), weights)]
+    return delta
+
+def decode_delta_steps(steps, node_names):
+    # Reconstruit les étapes complètes (matrice et arcs) à partir de l'encodage en différence
+    index = {name: i for i, name in enumerate(node_names)}
+    matrix = None
+    edges = {}
+    for step in steps:
+        if 'matrix' in step:
+            matrix = matrix_to_list(np.asarray(step['matrix'], dtype=float))
+            edges = {(index[edge['source']], index[edge['target']]): edge['weight'] for edge in step['edges']}
+        else:
+            for i, j, old, new in step['changes']:
+                matrix[i][j] = new
+            for edge in step['edges']:
+                edges[(index[edge['source']], index[edge['target']])] = edge['weight']
+        decoded = {
+            'step': step['step'],
+            'matrix': [list(row) for row in matrix],
+            'intermediate_node': step['intermediate_node'],
+        }
+        if 'calculations' in step:
+            decoded['calculations'] = step['calculations']
+        decoded['edges'] = [{'source': node_names[i], 'target': node_names[j], 'weight': edges[(i, j)]}
+                            for i, j in sorted(edges)]
+        yield decoded
+
+def _initial_predecessors(current_matrix):
+    # Prédécesseurs pour les arêtes directes (int32 : la moitié de la mémoire d'un tableau d'entiers par défaut)
+    n = len(current_matrix)
+    predecessors = np.where(current_matrix != np.inf, np.arange(n, dtype=np.int32)[:, None], np.int32(-1))
+    np.fill_diagonal(predecessors, -1)
+    return predecessors
+
+def _get_path(current_matrix, predecessors, node_names, start, end):
+    # Remonte les prédécesseurs en O(longueur du chemin) ; au plus n sauts, ce qui protège
+    # des boucles de prédécesseurs laissées par un circuit de poids négatif
+    if current_matrix[start][end] == np.inf or predecessors[start][end] == -1:
+        return []
+    path = []
+    current = end
+    for _ in range(len(node_names)):
+        path.append(node_names[current])
+        if current == start:
+            path.reverse()
+            return path
+        current = predecessors[start][current]
+        if current == -1:
             return []
-        path = []
-        current = end
-        while current != start:
-            path.insert(0, node_names[current])
-            current = predecessors[start][current]
-            if current == -1:
-                return []
-        path.insert(0, node_names[start])
-        return path
+    return []
 
+def initial_final_paths(current_matrix, predecessors, node_names):
     paths = {}
     start_idx = 0  # Nœud initial (premier dans node_names)
-    end_idx = n - 1  # Nœud final (dernier dans node_names)
-    path = get_path(start_idx, end_idx)
+    end_idx = len(node_names) - 1  # Nœud final (dernier dans node_names)
+    path = _get_path(current_matrix, predecessors, node_names, start_idx, end_idx)
     if path:
         paths[f"{node_names[start_idx]}-{node_names[end_idx]}"] = path
+    return paths
+
+def insert_arc(distances, predecessors, u, v, weight):
+    # Mise à jour en O(n²), en place, des plus courts chemins après l'ajout de l'arc u -> v ou la baisse
+    # de son poids : d(i, j) = min(d(i, j), d(i, u) + w + d(v, j)). Renvoie False (état inutilisable)
+    # si l'arc crée un circuit de poids négatif
+    column_u = distances[:, u].copy()
+    row_v = distances[v, :].copy()
+    candidates = column_u[:, None] + weight + row_v[None, :]
+    if (np.diagonal(candidates) < 0).any():
+        return False
+    improved = candidates < distances
+    np.fill_diagonal(improved, False)
+    # Sur le nouveau chemin i -> u -> v -> j, le prédécesseur de j est celui du chemin v -> j (u pour j = v)
+    successor_predecessors = predecessors[v].copy()
+    successor_predecessors[v] = u
+    np.copyto(distances, candidates, where=improved)
+    np.copyto(predecessors, np.broadcast_to(successor_predecessors, predecessors.shape), where=improved)
+    return True
+
+# Noyau par tuiles : nombre d'étapes k traitées ensemble, et volume de données (bande de lignes des distances,
+# tampon et prédécesseurs) qui doit tenir dans le cache L2 pendant ces étapes
+TILE_BLOCK = 64
+TILE_CACHE_BYTES = 1 << 20
+
+# Pools de threads de relaxation, un par nombre de threads, créés à la demande. Après un fork (processus de calcul
+# des tâches asynchrones et des lots), les threads du parent n'existent plus : les pools hérités sont oubliés
+_relax_pools = {}
+_relax_pools_lock = threading.Lock()
+os.register_at_fork(after_in_child=_relax_pools.clear)
+
+def _relax_pool(workers):
+    with _relax_pools_lock:
+        pool = _relax_pools.get(workers)
+        if pool is None:
+            pool = _relax_pools[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='relax')
+        return pool
+
+def blocked_all_pairs(matrix, method='min', dtype=np.float64, on_step=None, block=TILE_BLOCK, cache_bytes=TILE_CACHE_BYTES,
+                      workers=1):
+    # Floyd–Warshall par blocs : pour chaque bloc K de `block` étapes, les lignes de K sont relaxées par les k de K,
+    # puis chaque bande de lignes, dimensionnée pour rester dans le cache, est relaxée par ces mêmes étapes avant de
+    # passer à la suivante ; la matrice ne traverse plus la mémoire n fois mais n / block fois. dtype=np.float32
+    # divise encore par deux le trafic mémoire. La méthode 'max' est traitée comme 'min' sur la matrice opposée.
+    # Avec workers > 1, les bandes d'un même bloc sont réparties sur autant de threads (NumPy relâche le GIL) :
+    # une fois les lignes de K relaxées, elles ne sont plus que lues et chaque case n'est modifiée que par un thread,
+    # dans le même ordre des k, d'où un résultat identique au calcul sur un seul thread.
+    # L'ordre des relaxations diffère de la boucle de référence : le résultat n'est identique qu'en l'absence de
+    # circuit absorbant, de diagonale non neutre et d'arcs infinis de signe opposé à l'absence d'arc ; dans ces cas,
+    # renvoie None et l'appelant se rabat sur la boucle de référence
+    working = to_working_matrix(matrix, method)
+    distances = (working if method == 'min' else -working).astype(dtype)
+    diagonal = distances.diagonal().copy()
+    if (diagonal < 0).any() or np.isneginf(distances).any():
+        return None
+    predecessors = _initial_predecessors(working)
+    n = len(distances)
+
+    workers = max(1, min(workers, n // max(1, block)))
+    rows = min(n, max(1, cache_bytes // max(1, n * (2 * distances.itemsize + predecessors.itemsize + 1))))
+    # Au moins une bande par thread
+    rows = min(rows, -(-n // workers))
+    buffer_rows = max(rows, min(block, n))
+    # Tampons propres à chaque thread
+    buffers = threading.local()
+
+    def relax(start, stop, k_start, k_stop):
+        if stop <= start:
+            return
+        if getattr(buffers, 'candidates', None) is None:
+            buffers.candidates = np.empty((buffer_rows, n), dtype=dtype)
+            buffers.improved = np.empty((buffer_rows, n), dtype=bool)
+        band, band_predecessors = distances[start:stop], predecessors[start:stop]
+        candidates, mask = buffers.candidates[:stop - start], buffers.improved[:stop - start]
+        for k in range(k_start, k_stop):
+            np.add(band[:, k, None], distances[k], out=candidates)
+            np.less(candidates, band, out=mask)
+            np.copyto(band, candidates, where=mask)
+            np.copyto(band_predecessors, predecessors[k], where=mask)
+
+    def relax_bands(bands, k_start, k_stop):
+        for start, stop in bands:
+            relax(start, stop, k_start, k_stop)
+
+    pool = _relax_pool(workers) if workers > 1 else None
+    with phase('relax'):
+        for k_start in range(0, n, block):
+            k_stop = min(k_start + block, n)
+            # Les lignes du bloc d'abord, ensemble : chaque ligne k doit être relaxée par les k' < k du bloc avant
+            # de servir aux autres
+            relax(k_start, k_stop, k_start, k_stop)
+            bands = []
+            for start in range(0, n, rows):
+                stop = min(start + rows, n)
+                if stop <= k_start or start >= k_stop:
+                    bands.append((start, stop))
+                else:
+                    bands.extend(band for band in ((start, k_start), (k_stop, stop)) if band[0] < band[1])
+            if pool is None:
+                relax_bands(bands, k_start, k_stop)
+            else:
+                # Bandes contiguës réparties en parts égales, une par thread
+                size = -(-len(bands) // workers)
+                futures = [pool.submit(relax_bands, bands[first:first + size], k_start, k_stop)
+                           for first in range(0, len(bands), size)]
+                for future in futures:
+                    future.result()
+            if on_step is not None:
+                on_step(k_stop, n)
+
+    if (distances + distances.T < 0).any():
+        return None
+    # La diagonale n'est jamais relaxée par la boucle de référence
+    np.fill_diagonal(distances, diagonal)
+    np.fill_diagonal(predecessors, -1)
+    if method == 'max':
+        np.negative(distances, out=distances)
+    return distances, predecessors
 
-    return steps, paths
\ No newline at end of file
+def demoucron_arrays(matrix, method='min', trace='none', dtype=np.float64, workers=1):
+    # Variante sans conversion en listes, pour les formats binaires : matrice finale, prédécesseurs (int32),
+    # nombre de cases modifiées par étape et, avec trace='steps', la pile (n + 1, n, n) des matrices d'étape ;
+    # sans trace, le noyau par tuiles (dtype float64 ou float32) remplace la boucle de référence quand il s'applique
+    if trace == 'none':
+        result = blocked_all_pairs(matrix, method, dtype, workers=workers)
+        if result is not None:
+            return result[0], result[1], np.zeros(len(result[0]), dtype=np.int64), None
+    current_matrix = to_working_matrix(matrix, method)
+    predecessors = _initial_predecessors(current_matrix)
+    n = len(current_matrix)
+    changed = np.zeros(n, dtype=np.int64)
+    steps = None
+    if trace == 'steps':
+        steps = np.empty((n + 1, n, n))
+        steps[0] = current_matrix
+    with phase('relax'):
+        for k in range(n):
+            changed[k] = len(_relax_step(current_matrix, predecessors, k, method)[0])
+            if steps is not None:
+                steps[k + 1] = current_matrix
+    return current_matrix, predecessors, changed, steps
+
+def _relax_stacked_step(current, predecessors, k, method, off_diagonal):
+    # Étape k sur toute la pile ; une matrice dont V_kk n'est pas neutre passe par _relax_step
+    diagonal = current[:, k, k]
+    if method == 'min':
+        neutral = ~(diagonal < 0)
+    else:
+        neutral = ~((diagonal > 0) & (diagonal != np.inf))
+    for b in np.nonzero(~neutral)[0]:
+        _relax_step(current[b], predecessors[b], k, method)
+    if neutral.all():
+        stack, stack_predecessors = current, predecessors
+    elif neutral.any():
+        stack, stack_predecessors = current[neutral], predecessors[neutral]
+    else:
+        return
+
+    column_k = stack[:, :, k].copy()
+    row_k = stack[:, k, :].copy()
+    candidates = column_k[:, :, None] + row_k[:, None, :]
+    valid = (column_k != np.inf)[:, :, None] & (row_k != np.inf)[:, None, :] & off_diagonal
+    if method == 'min':
+        improved = valid & (candidates < stack)
+    else:
+        improved = valid & (candidates > stack) & (candidates != np.inf)
+    np.copyto(stack, candidates, where=improved)
+    np.copyto(stack_predecessors, np.broadcast_to(stack_predecessors[:, k, None, :].copy(), stack_predecessors.shape),
+              where=improved)
+
+    if stack is not current:
+        current[neutral] = stack
+        predecessors[neutral] = stack_predecessors
+
+def stacked_all_pairs(matrices, method='min'):
+    # Relaxation simultanée d'une pile (B, n, n) de matrices de même taille : une seule diffusion par étape k
+    current = np.stack([to_working_matrix(matrix, method) for matrix in matrices])
+    n = current.shape[1]
+    predecessors = np.where(current != np.inf, np.arange(n, dtype=np.int32)[None, :, None], np.int32(-1))
+    predecessors[:, np.arange(n), np.arange(n)] = -1
+    off_diagonal = ~np.eye(n, dtype=bool)
+    with phase('relax'):
+        for k in range(n):
+            _relax_stacked_step(current, predecessors, k, method, off_diagonal)
+    return current, predecessors
+
+def batch_demoucron(matrices, node_names_list, method='min', stack_max_nodes=64):
+    # Matrices de même taille et même méthode : empilées jusqu'à stack_max_nodes nœuds, traitées une à une au-delà ;
+    # renvoie pour chacune le chemin initial -> final et la matrice finale (comme trace='none')
+    if len(node_names_list[0]) <= stack_max_nodes:
+        distances, predecessors = stacked_all_pairs(matrices, method)
+    else:
+        distances, predecessors = zip(*(all_pairs(matrix, method) for matrix in matrices))
+    return [
+        {'paths': initial_final_paths(item_distances, item_predecessors, node_names),
+         'matrix': item_distances}
+        for item_distances, item_predecessors, node_names in zip(distances, predecessors, node_names_list)
+    ]
+
+def all_pairs(matrix, method='min', dtype=np.float64, workers=1):
+    # Distances et prédécesseurs (int32) de toutes les paires, sans trace,
+    # pour répondre ensuite à des requêtes de chemins sans relancer l'algorithme
+    current_matrix, predecessors, _, _ = demoucron_arrays(matrix, method, dtype=dtype, workers=workers)
+    return current_matrix, predecessors
+
+def has_negative_cycle(distances):
+    # La diagonale n'est jamais relaxée : un circuit absorbant se voit à d(i, k) + d(k, i) < 0
+    return bool((distances + distances.T < 0).any())
+
+def has_negative_cycle_between(distances, start, end):
+    # Circuit absorbant accessible depuis start et menant à end : seul ce cas rend d(start, end) indéfini
+    # (même règle que le moteur creux)
+    on_cycle = (distances + distances.T < 0).any(axis=1)
+    from_start = distances[start] != np.inf
+    from_start[start] = True
+    to_end = distances[:, end] != np.inf
+    to_end[end] = True
+    return bool((on_cycle & from_start & to_end).any())
+
+def paths_between(distances, predecessors, node_names, pairs):
+    # pairs : couples (source, cible) de noms de nœuds ; renvoie chemins et longueurs indexés par 'source-cible'
+    index = {name: i for i, name in enumerate(node_names)}
+    paths = {}
+    lengths = {}
+    for source, target in pairs:
+        i, j = index[source], index[target]
+        key = f"{source}-{target}"
+        paths[key] = _get_path(distances, predecessors, node_names, i, j)
+        lengths[key] = float(distances[i, j]) if np.isfinite(distances[i, j]) else None
+    return paths, lengths
+
+def iter_demoucron(matrix, node_names, method='min', trace='full', encoding='full', on_step=None, dtype=np.float64,
+                   workers=1):
+    # Générateur : produit chaque étape dès qu'elle est calculée, puis renvoie (paths, matrice finale numpy)
+    # on_step(k, n) est appelé après chaque étape k, quelle que soit la trace (progression, annulation)
+    # trace : 'none' (matrice finale et chemin), 'summary' (+ nombre de cases modifiées par étape),
+    # 'steps' (+ matrices et arcs de chaque étape), 'full' (+ détail des calculs)
+    # encoding : 'full' (matrice complète à chaque étape) ou 'delta' (matrice de base puis cases modifiées)
+    # dtype : précision du noyau par tuiles, utilisé sans trace (on_step est alors appelé après chaque bloc) ;
+    # workers : nombre de threads de ce noyau
+    n = len(matrix)
+    if trace == 'none':
+        result = blocked_all_pairs(matrix, method, dtype, on_step, workers=workers)
+        if result is not None:
+            with phase('result'):
+                return initial_final_paths(result[0], result[1], node_names), result[0]
+
+    current_matrix = to_working_matrix(matrix, method)
+
+    # Initialisation des prédécesseurs pour les arêtes directes
+    predecessors = _initial_predecessors(current_matrix)
+
+    with_matrices = trace in ('steps', 'full')
+    with_calculations = trace == 'full'
+
+    if with_matrices:
+        with phase('snapshot'):
+            step = _step_snapshot(0, current_matrix, None, node_names, [] if with_calculations else None)
+        yield step
+
+    # Algorithme principal : chaque étape k est une relaxation vectorisée de toute la matrice
+    # (le détail des calculs, construit pendant la relaxation, est compté dans la phase 'relax')
+    for k in range(n):
+        calculations = [] if with_calculations else None
+        with phase('relax'):
+            changed = _relax_step(current_matrix, predecessors, k, method, calculations)
+        if on_step is not None:
+            on_step(k + 1, n)
+
+        if trace == 'summary':
+            yield {
+                'step': k + 1,
+                'intermediate_node': node_names[k],
+                'changed': len(changed[0])
+            }
+        elif with_matrices:
+            with phase('snapshot'):
+                if encoding == 'delta':
+                    step = _step_delta(k + 1, current_matrix, node_names[k], node_names, changed, calculations)
+                else:
+                    step = _step_snapshot(k + 1, current_matrix, node_names[k], node_names, calculations)
+            yield step
+
+    # Construire le chemin optimal (uniquement du nœud initial au nœud final)
+    with phase('result'):
+        return initial_final_paths(current_matrix, predecessors, node_names), current_matrix
+
+def demoucron_algorithm(matrix, node_names, method='min', trace='full', encoding='full', on_step=None, dtype=np.float64,
+                        workers=1):
+    steps = []
+    runner = iter_demoucron(matrix, node_names, method=method, trace=trace, encoding=encoding, on_step=on_step,
+                            dtype=dtype, workers=workers)
+    while True:
+        try:
+            steps.append(next(runner))
+        except StopIteration as result:
+            paths, final_matrix = result.value
+            return steps, paths, final_matrix
+
+def arcs_to_adjacency_lists(n, arcs):
+    # Listes d'adjacence au format CSR : les successeurs de i sont targets[offsets[i]:offsets[i + 1]]
+    sources, targets, weights = arcs
+    order = np.argsort(sources, kind='stable')
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+    return offsets, targets[order], weights[order]
+
+def is_sparse_graph(n, arc_count, min_nodes, max_density):
+    return n >= min_nodes and arc_count <= max_density * n * n
+
+class NegativeCycleError(ValueError):
+    pass
+
+def _dijkstra(adjacency, start, end):
+    offsets, targets, weights = adjacency
+    n = len(offsets) - 1
+    distances = [np.inf] * n
+    predecessors = [-1] * n
+    distances[start] = 0.0
+    heap = [(0.0, start)]
+    while heap:
+        distance, node = heapq.heappop(heap)
+        if distance > distances[node]:
+            continue
+        if node == end:
+            break
+        for position in range(offsets[node], offsets[node + 1]):
+            target = int(targets[position])
+            candidate = distance + float(weights[position])
+            if candidate < distances[target]:
+                distances[target] = candidate
+                predecessors[target] = node
+                heapq.heappush(heap, (candidate, target))
+    return distances, predecessors
+
+def _reaching(adjacency, end):
+    # Sommets depuis lesquels end est accessible (parcours des arcs à l'envers)
+    offsets, targets, weights = adjacency
+    n = len(offsets) - 1
+    sources = np.repeat(np.arange(n, dtype=np.int64), np.diff(offsets))
+    reverse_offsets, reverse_targets, _ = arcs_to_adjacency_lists(n, (targets, sources, weights))
+    reached = np.zeros(n, dtype=bool)
+    reached[end] = True
+    stack = [end]
+    while stack:
+        node = stack.pop()
+        for source in reverse_targets[reverse_offsets[node]:reverse_offsets[node + 1]].tolist():
+            if not reached[source]:
+                reached[source] = True
+                stack.append(source)
+    return reached
+
+def _spfa(adjacency, start, end):
+    # Bellman-Ford avec file (SPFA) : un sommet relâché n fois signale un circuit absorbant. Seuls les sommets
+    # menant à end sont relâchés : un circuit qui ne peut pas atteindre end ne change pas d(start, end)
+    # et n'est pas signalé
+    offsets, targets, weights = adjacency
+    n = len(offsets) - 1
+    useful = _reaching(adjacency, end).tolist()
+    distances = [np.inf] * n
+    predecessors = [-1] * n
+    relaxations = [0] * n
+    in_queue = [False] * n
+    distances[start] = 0.0
+    queue = deque([start])
+    in_queue[start] = True
+    while queue:
+        node = queue.popleft()
+        in_queue[node] = False
+        distance = distances[node]
+        for position in range(offsets[node], offsets[node + 1]):
+            target = int(targets[position])
+            if not useful[target]:
+                continue
+            candidate = distance + float(weights[position])
+            if candidate < distances[target]:
+                distances[target] = candidate
+                predecessors[target] = node
+                if not in_queue[target]:
+                    relaxations[target] += 1
+                    if relaxations[target] >= n:
+                        raise NegativeCycleError(target)
+                    queue.append(target)
+                    in_queue[target] = True
+    return distances, predecessors
+
+def shortest_path(adjacency, node_names, start=0, end=None):
+    # Plus court chemin d'un seul couple (par défaut nœud initial -> nœud final) sur les listes d'adjacence :
+    # Dijkstra en O(E log V) si tous les poids sont positifs, Bellman-Ford (SPFA) sinon
+    _, _, weights = adjacency
+    if end is None:
+        end = len(node_names) - 1
+    with phase('sparse'):
+        if len(weights) == 0 or weights.min() >= 0:
+            algorithm = 'dijkstra'
+            distances, predecessors = _dijkstra(adjacency, start, end)
+        else:
+            algorithm = 'bellman-ford'
+            distances, predecessors = _spfa(adjacency, start, end)
+
+    paths = {}
+    distance = distances[end]
+    if start != end and distance != np.inf:
+        path = [end]
+        while path[-1] != start:
+            path.append(predecessors[path[-1]])
+        paths[f"{node_names[start]}-{node_names[end]}"] = [node_names[i] for i in reversed(path)]
+    return paths, (distance if np.isfinite(distance) else None), algorithm
+
+def matrix_to_arcs(matrix):
+    # Arcs (sources, cibles, poids) d'une matrice : cases finies, sauf les diagonales nulles ;
+    # une diagonale non nulle est une boucle, donc un circuit
+    matrix = np.asarray(matrix, dtype=float)
+    present = np.isfinite(matrix)
+    np.fill_diagonal(present, np.diagonal(present) & (np.diagonal(matrix) != 0))
+    sources, targets = np.nonzero(present)
+    return sources, targets, matrix[sources, targets]
+
+def _level_arcs(offsets, level):
+    # Positions (dans les tableaux CSR) des arcs sortant des sommets d'un niveau, et leur source
+    starts = offsets[level]
+    counts = offsets[level + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    shifts = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return shifts + np.arange(total), np.repeat(level, counts)
+
+def topological_levels(adjacency):
+    # Niveaux de Demoucron en O(V + E) : le niveau 0 regroupe les sommets sans prédécesseur, chaque niveau suivant
+    # les sommets dont tous les prédécesseurs sont dans les niveaux précédents. None si le graphe a un circuit
+    offsets, targets, _ = adjacency
+    n = len(offsets) - 1
+    in_degree = np.bincount(targets, minlength=n)
+    levels = []
+    level = np.flatnonzero(in_degree == 0)
+    placed = 0
+    while len(level):
+        levels.append(level)
+        placed += len(level)
+        positions, _ = _level_arcs(offsets, level)
+        successors = targets[positions]
+        np.subtract.at(in_degree, successors, 1)
+        candidates = np.unique(successors)
+        level = candidates[in_degree[candidates] == 0]
+    return levels if placed == n else None
+
+def _dag_relax(adjacency, level_arcs, start, method):
+    # Plus courts (ou plus longs) chemins depuis start, niveau par niveau : quand un niveau est traité,
+    # les valeurs de ses sommets sont définitives
+    offsets, targets, weights = adjacency
+    n = len(offsets) - 1
+    unreachable = np.inf if method == 'min' else -np.inf
+    distances = np.full(n, unreachable)
+    predecessors = np.full(n, -1, dtype=np.int32)
+    distances[start] = 0.0
+    better = np.minimum if method == 'min' else np.maximum
+    for positions, sources in level_arcs:
+        reached = distances[sources] != unreachable
+        positions, sources = positions[reached], sources[reached]
+        if not len(positions):
+            continue
+        level_targets = targets[positions]
+        candidates = distances[sources] + weights[positions]
+        better.at(distances, level_targets, candidates)
+        best = candidates == distances[level_targets]
+        predecessors[level_targets[best]] = sources[best]
+    return distances, predecessors
+
+def _dag_latest(adjacency, level_arcs, end, horizon):
+    # Dates au plus tard : latest(v) = min sur les successeurs s de latest(s) - w(v, s), en remontant les niveaux
+    offsets, targets, weights = adjacency
+    latest = np.full(len(offsets) - 1, np.inf)
+    latest[end] = horizon
+    for positions, sources in reversed(level_arcs):
+        if len(positions):
+            np.minimum.at(latest, sources, latest[targets[positions]] - weights[positions])
+    return latest
+
+def dag_all_pairs(adjacency, levels, method='min', dtype=np.float64):
+    # Matrice de toutes les paires d'un graphe sans circuit, colonne par colonne dans l'ordre des niveaux :
+    # d(., v) = meilleur des d(., u) + w(u, v) sur les arcs u -> v entrant dans v. Les sources d'un niveau sont
+    # toutes dans les niveaux précédents : un appel numpy par niveau, O(n·E) opérations au lieu de O(n³)
+    offsets, targets, weights = adjacency
+    n = len(offsets) - 1
+    # incoming[v, i] = d(i, v) : chaque colonne de la matrice est une ligne contiguë
+    incoming = np.full((n, n), np.inf if method == 'min' else -np.inf, dtype=dtype)
+    np.fill_diagonal(incoming, 0)
+    sources = np.repeat(np.arange(n, dtype=np.int64), np.diff(offsets))
+    level_of = np.empty(n, dtype=np.int64)
+    for depth, level in enumerate(levels):
+        level_of[level] = depth
+    order = np.argsort(level_of[targets], kind='stable')
+    bounds = np.searchsorted(level_of[targets][order], np.arange(len(levels) + 1))
+    better = np.minimum if method == 'min' else np.maximum
+    with phase('dag'):
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            if first == last:
+                continue
+            arcs = order[first:last]
+            candidates = incoming[sources[arcs]] + weights[arcs].astype(dtype)[:, None]
+            better.at(incoming, targets[arcs], candidates)
+    return np.ascontiguousarray(incoming.T)
+
+def dag_paths(adjacency, node_names, levels, method='min', start=0, end=None):
+    # Moteur DAG en O(V + E) : chemin optimal initial -> final (plus court ou plus long selon method), niveaux
+    # de Demoucron et dates au plus tôt / au plus tard des sommets (plus longs chemins, méthode MPM)
+    if end is None:
+        end = len(node_names) - 1
+    with phase('dag'):
+        # Arcs sortants de chaque niveau, partagés par les trois parcours
+        level_arcs = [_level_arcs(adjacency[0], level) for level in levels]
+        distances, predecessors = _dag_relax(adjacency, level_arcs, start, method)
+        earliest = distances if method == 'max' else _dag_relax(adjacency, level_arcs, start, 'max')[0]
+        horizon = earliest[end]
+        if np.isfinite(horizon):
+            latest = _dag_latest(adjacency, level_arcs, end, horizon)
+        else:
+            latest = np.full(len(node_names), np.inf)
+
+    paths = {}
+    distance = distances[end]
+    if start != end and np.isfinite(distance):
+        path = [end]
+        while path[-1] != start:
+            path.append(int(predecessors[path[-1]]))
+        paths[f"{node_names[start]}-{node_names[end]}"] = [node_names[i] for i in reversed(path)]
+    return {
+        'paths': paths,
+        'distance': float(distance) if np.isfinite(distance) else None,
+        'levels': [[node_names[i] for i in level.tolist()] for level in levels],
+        'earliest': dict(zip(node_names, _finite_or_none(earliest))),
+        'latest': dict(zip(node_names, _finite_or_none(latest))),
+    }
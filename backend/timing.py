@@ -0,0 +1,43 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Chronométrage par phase d'une requête (chargement ORM, construction de la matrice, relaxation, étapes, rendu...).
+# Hors d'une requête instrumentée (processus de calcul, commandes), phase() ne fait rien.
+
+_current = ContextVar('demoucron_timings', default=None)
+
+class Timings:
+    def __init__(self):
+        self.phases = {}
+        self.nodes = None
+        self.arcs = None
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+def resume(timings):
+    # Active les mesures d'une requête ; appelée aussi pour chaque morceau d'une réponse en flux, produit après la vue
+    return _current.set(timings)
+
+def stop(token):
+    _current.reset(token)
+
+@contextmanager
+def phase(name):
+    # Les durées d'une même phase s'additionnent (par exemple la relaxation des n étapes)
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+def record_graph_size(nodes, arcs):
+    timings = _current.get()
+    if timings is not None:
+        timings.nodes = nodes
+        timings.arcs = arcs
@@ -21,7 +21,7 @@ function GraphEditor({ onUpdate, theme }) {
     setLoading(true);
     try {
       const response = await axios.get("http://localhost:8000/api/graphs/");
-      setGraphs(response.data);
+      setGraphs(response.data.results);
       setNotification({ show: true, message: "Liste des graphes chargée avec succès", type: "success" });
     } catch (error) {
       setNotification({ show: true, message: `Erreur de chargement: ${error.message}`, type: "error" });
@@ -0,0 +1,42 @@
+// Reconstruit les étapes complètes renvoyées par l'API avec ?encoding=delta :
+// l'étape 0 contient la matrice de base et ses arcs, les suivantes seulement
+// les cases modifiées [i, j, ancienne, nouvelle] et les arcs ajoutés ou modifiés.
+export function decodeDeltaSteps(steps, nodeNames) {
+  const index = new Map(nodeNames.map((name, i) => [name, i]));
+  const n = nodeNames.length;
+  let matrix = [];
+  let edges = new Map();
+
+  const edgeKey = (edge) => index.get(edge.source) * n + index.get(edge.target);
+
+  return steps.map((step) => {
+    if (step.matrix) {
+      matrix = step.matrix.map(row => [...row]);
+      edges = new Map(step.edges.map(edge => [edgeKey(edge), edge.weight]));
+    } else {
+      for (const [i, j, , value] of step.changes) {
+        matrix[i][j] = value;
+      }
+      for (const edge of step.edges) {
+        edges.set(edgeKey(edge), edge.weight);
+      }
+    }
+
+    const decoded = {
+      step: step.step,
+      matrix: matrix.map(row => [...row]),
+      intermediate_node: step.intermediate_node,
+    };
+    if (step.calculations) {
+      decoded.calculations = step.calculations;
+    }
+    decoded.edges = [...edges.keys()]
+      .sort((a, b) => a - b)
+      .map(key => ({
+        source: nodeNames[Math.floor(key / n)],
+        target: nodeNames[key % n],
+        weight: edges.get(key),
+      }));
+    return decoded;
+  });
+}
@@ -18,7 +18,7 @@ const BackendGraphManager = ({ isEditMode, onGraphSelected, selectedGraph }) =>
     setLoading(true);
     try {
       const response = await axios.get('http://localhost:8000/api/graphs/');
-      setGraphs(response.data);
+      setGraphs(response.data.results);
       showNotification('Liste des graphes chargée avec succès', 'success');
     } catch (error) {
       showNotification(`Erreur de chargement: ${error.message}`, 'error');
@@ -148,7 +148,7 @@ const BackendGraphManager = ({ isEditMode, onGraphSelected, selectedGraph }) =>
                 <option value="">-- Choisir un graphe --</option>
                 {graphs.map(graph => (
                   <option key={graph.id} value={graph.id}>
-                    {graph.name} ({graph.sommets?.length || 0} sommets, {graph.arcs?.length || 0} arcs)
+                    {graph.name} ({graph.sommet_count ?? 0} sommets, {graph.arc_count ?? 0} arcs)
                   </option>
                 ))}
               </select>
@@ -197,8 +197,8 @@ const BackendGraphManager = ({ isEditMode, onGraphSelected, selectedGraph }) =>
                   <div className="graph-info">
                     <h4>{graph.name}</h4>
                     <div className="graph-stats">
-                      <span>📊 {graph.sommets?.length || 0} sommets</span>
-                      <span>🔗 {graph.arcs?.length || 0} arcs</span>
+                      <span>📊 {graph.sommet_count ?? 0} sommets</span>
+                      <span>🔗 {graph.arc_count ?? 0} arcs</span>
                     </div>
                   </div>
                   <div className="graph-actions">